@@ -1,9 +1,16 @@
 import json
+from time import perf_counter
 
-from flask import Flask, jsonify, request, Response
+from flask import Flask, g, jsonify, request, Response
 from flask_cors import CORS
-from scraper.database import DatabaseManager
-import sqlite3
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from scraper import metrics
+from scraper.archive import ArchiveReader
+from scraper.database import DatabaseManager, PRODUCT_COLUMNS
+from api.cache import ResponseCache
+from api.export import EXPORT_FORMATS, stream_export
+from scraper.utils import product_key, product_url
 import sys
 import os
 
@@ -11,55 +18,245 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 app = Flask(__name__)
 CORS(app)
 db = DatabaseManager()  # Используем существующий DatabaseManager
+# Данные меняются только с новым сбором: ответы кэшируются до смены версии данных
+cache = ResponseCache(lambda: db.data_version())
+db.add_commit_listener(cache.clear)
+
+
+class _StateCollector:
+    """Метрики, которые читаются в момент запроса /metrics: кэш ответов
+    и время этапов последнего сбора (пишет flow в scrape_timings)"""
+
+    def describe(self):
+        return []
+
+    def collect(self):
+        stats = cache.stats()
+        requests = CounterMetricFamily("mvideo_api_cache_requests", "Обращения к кэшу ответов API",
+                                       labels=["result"])
+        requests.add_metric(["hit"], stats["hits"])
+        requests.add_metric(["miss"], stats["misses"])
+        yield requests
+        yield GaugeMetricFamily("mvideo_api_cache_entries", "Ответов в кэше", value=stats["size"])
+
+        stages = GaugeMetricFamily("mvideo_last_scrape_stage_seconds",
+                                   "Время этапов последнего сбора", labels=["stage"])
+        scrape_id = db.get_last_scrape_id()
+        for stage, timing in (db.get_stage_timings(scrape_id) if scrape_id else {}).items():
+            stages.add_metric([stage], timing["seconds"])
+        yield stages
+
+
+metrics.REGISTRY.register(_StateCollector())
+
+
+@app.before_request
+def _start_timer():
+    if metrics.is_enabled():
+        g.started = perf_counter()
+
+
+@app.after_request
+def _observe_request(response):
+    started = g.pop("started", None)
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.observe(metrics.HTTP_SECONDS, perf_counter() - started,
+                        endpoint, request.method, str(response.status_code))
+    return response
 
 
 @app.route('/api/products', methods=['GET'])
+@cache.cached
 def get_products():
+    """
+    Товары сбора (по умолчанию последнего) с фильтрами.
+    Пагинация: курсор next_cursor из предыдущего ответа (keyset по (sort, id)),
+    для совместимости поддерживается и page/OFFSET. scrape_id=all - вся история
+    в порядке записи, без sort
+    """
     try:
         # Валидация параметров
         page = max(int(request.args.get('page', 1)), 1)
-        per_page = min(int(request.args.get('per_page', 10)), 100)
+        per_page = min(max(int(request.args.get('per_page', 10)), 1), 100)
+        sort = request.args.get('sort') or None
+        descending = request.args.get('order', 'asc') == 'desc'
+        cursor = request.args.get('cursor') or None
+        fields = [f for f in request.args.get('fields', '').split(',') if f] or None
+
+        # Сбор: явный scrape_id, 'all' - вся история, по умолчанию последний
+        scrape_id = request.args.get('scrape_id') or db.get_last_scrape_id()
+        if scrape_id == 'all':
+            scrape_id = None
 
         # Фильтры
         filters = {
-            'min_price': request.args.get('min_price'),
-            'max_price': request.args.get('max_price'),
-            'brand': request.args.get('brand')
+            'min_price': int(request.args['min_price']) if request.args.get('min_price') else None,
+            'max_price': int(request.args['max_price']) if request.args.get('max_price') else None,
+            'brand': db.resolve_brand(request.args['brand']) if request.args.get('brand') else None
         }
 
-        # Безопасный SQL-запрос через DatabaseManager
-        with db.get_connection() as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-
-            # Динамическое построение запроса
-            query = "SELECT * FROM products WHERE 1=1"
-            params = []
-            if filters['min_price']:
-                query += " AND price >= ?"
-                params.append(int(filters['min_price']))
-            if filters['max_price']:
-                query += " AND price <= ?"
-                params.append(int(filters['max_price']))
-            if filters['brand']:
-                query += " AND brand = ?"
-                params.append(filters['brand'])
-
-            # Пагинация
-            query += " LIMIT ? OFFSET ?"
-            params.extend([per_page, (page - 1) * per_page])
-
-            cursor.execute(query, params)
-            products = [dict(row) for row in cursor.fetchall()]
+        result = db.query_products(
+            scrape_id=scrape_id, sort=sort, descending=descending, cursor=cursor,
+            limit=per_page, offset=(page - 1) * per_page, fields=fields, **filters
+        )
+        result.update({
+            "page": page,
+            "per_page": per_page,
+            "scrape_id": scrape_id,
+            "total": db.count_products(scrape_id=scrape_id, **filters)
+        })
+
+        return Response(
+            json.dumps(result, ensure_ascii=False),
+            mimetype='application/json; charset=utf-8'
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@app.route('/api/products/<key>/history', methods=['GET'])
+@cache.cached
+def get_product_history(key):
+    """
+    История цены одного товара: ряд (timestamp, price, scrape_id) по всем сборам,
+    включая архивированные в Parquet (scraper.archive). Ключ товара - последний
+    сегмент его URL на mvideo.ru. Фильтры: date_from, date_to
+    """
+    try:
+        url = product_url(key)
+        history = ArchiveReader(db).price_history(
+            [url],
+            date_from=request.args.get('date_from') or None,
+            date_to=request.args.get('date_to') or None
+        )[url]
+        if not history:
+            return jsonify({"error": f"Товар не найден: {key}"}), 404
+        return Response(
+            json.dumps({"key": key, "url": url, "data": history}, ensure_ascii=False),
+            mimetype='application/json; charset=utf-8'
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@app.route('/api/products/history', methods=['GET'])
+@cache.cached
+def get_products_history():
+    """
+    Пакетный вариант истории цен: keys=ключ1,ключ2,... (до 100 товаров)
+    одним запросом к БД. Для неизвестных ключей - пустой ряд
+    """
+    try:
+        keys = list(dict.fromkeys(k for k in request.args.get('keys', '').split(',') if k))
+        if not keys:
+            raise ValueError("Не переданы ключи товаров (keys)")
+        if len(keys) > 100:
+            raise ValueError("Не более 100 товаров за запрос")
+        urls = [product_url(key) for key in keys]
+        history = ArchiveReader(db).price_history(
+            urls,
+            date_from=request.args.get('date_from') or None,
+            date_to=request.args.get('date_to') or None
+        )
+        result = {"data": {product_key(url): points for url, points in history.items()}}
+        return Response(
+            json.dumps(result, ensure_ascii=False),
+            mimetype='application/json; charset=utf-8'
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
 
+@app.route('/api/scrapes', methods=['GET'])
+@cache.cached
+def get_scrapes():
+    """Список сборов данных от новых к старым (из таблицы scrapes)"""
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), 1000)
+        scrapes = db.list_scrapes(limit=limit, status=request.args.get('status'))
         return Response(
-            json.dumps({"data": products, "page": page}, ensure_ascii=False),
+            json.dumps({"data": scrapes, "latest": db.get_last_scrape_id()}, ensure_ascii=False),
             mimetype='application/json; charset=utf-8'
         )
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
 
+@app.route('/api/scrapes/<scrape_id>/timings', methods=['GET'])
+@cache.cached
+def get_scrape_timings(scrape_id):
+    """Время этапов сбора (page_load, readiness, parse, save, diff, analysis, ...)"""
+    try:
+        return jsonify({"scrape_id": scrape_id, "stages": db.get_stage_timings(scrape_id)})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@app.route('/api/search', methods=['GET'])
+@cache.cached
+def search_products():
+    """
+    Полнотекстовый поиск по названиям товаров сбора (по умолчанию последнего)
+    с ранжированием и префиксным поиском, плюс фасеты по брендам сбора
+    """
+    try:
+        text = request.args.get('q', '')
+        limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+        scrape_id = request.args.get('scrape_id') or db.get_last_scrape_id()
+        result = {
+            "data": db.search_products(text, scrape_id, limit=limit) if scrape_id else [],
+            "facets": db.get_brand_facets(scrape_id) if scrape_id else {},
+            "scrape_id": scrape_id
+        }
+        return Response(
+            json.dumps(result, ensure_ascii=False),
+            mimetype='application/json; charset=utf-8'
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@app.route('/api/export', methods=['GET'])
+def export_products():
+    """
+    Потоковая выгрузка истории товаров в NDJSON или CSV (format=ndjson|csv),
+    compress=gzip - сжатие на лету. Фильтры: scrape_id, date_from, date_to, brand.
+    Строки идут из курсора SQLite пачками, память не растет с объемом выгрузки
+    """
+    try:
+        fmt = request.args.get('format', 'ndjson')
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Неподдерживаемый формат выгрузки: {fmt}")
+        compress = request.args.get('compress') == 'gzip'
+        batches = db.iter_products(
+            scrape_id=request.args.get('scrape_id') or None,
+            date_from=request.args.get('date_from') or None,
+            date_to=request.args.get('date_to') or None,
+            brand=request.args.get('brand') or None
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+    filename = f"products.{fmt}" + (".gz" if compress else "")
+    return Response(
+        stream_export(batches, PRODUCT_COLUMNS, fmt=fmt, compress=compress),
+        content_type='application/gzip' if compress else f'{EXPORT_FORMATS[fmt]}; charset=utf-8',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Счетчики попаданий/промахов кэша ответов"""
+    return jsonify(cache.stats())
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Метрики в формате Prometheus: время ответов API, операций с БД и этапов"""
+    return Response(generate_latest(metrics.REGISTRY), content_type=CONTENT_TYPE_LATEST)
+
 
 if __name__ == '__main__':
     app.run(port=5000, debug=True)  # Убедитесь, что эта строка присутствует
\ No newline at end of file
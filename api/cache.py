@@ -0,0 +1,70 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+from typing import Callable
+
+from flask import Response, request
+
+
+class ResponseCache:
+    """
+    LRU-кэш JSON-ответов API в памяти процесса.
+    Ключ - путь, нормализованные параметры запроса и версия данных
+    (последний сбор), поэтому новый сбор сам делает старые записи недостижимыми.
+    Отдает ETag и 304 на If-None-Match
+    """
+
+    def __init__(self, version_func: Callable[[], str], max_entries: int = 512):
+        self.version_func = version_func
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def clear(self, *args) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+    def _key(self) -> tuple:
+        # Пустые параметры (min_price= из веб-формы) равнозначны отсутствующим
+        params = tuple(sorted((k, v) for k, v in request.args.items(multi=True) if v != ''))
+        return request.path, params, self.version_func()
+
+    def cached(self, view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = self._key()
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                else:
+                    self.misses += 1
+
+            if entry is None:
+                response = view(*args, **kwargs)
+                if not isinstance(response, Response) or response.status_code != 200:
+                    return response
+                body = response.get_data()
+                entry = (hashlib.sha1(body).hexdigest(), body, response.content_type)
+                with self._lock:
+                    self._entries[key] = entry
+                    if len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+
+            etag, body, content_type = entry
+            if etag in request.if_none_match:
+                response = Response(status=304)
+            else:
+                response = Response(body, content_type=content_type)
+            response.set_etag(etag)
+            return response
+
+        return wrapper
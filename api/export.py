@@ -0,0 +1,50 @@
+import csv
+import io
+import json
+import zlib
+from typing import Iterable, Iterator, List, Sequence
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _ndjson_chunks(batches: Iterable[List[tuple]], columns: Sequence[str]) -> Iterator[bytes]:
+    for rows in batches:
+        yield "".join(
+            json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n" for row in rows
+        ).encode("utf-8")
+
+
+def _csv_chunks(batches: Iterable[List[tuple]], columns: Sequence[str]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    # wbits=31 - формат gzip (заголовок и CRC), сжатие потоковое
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def stream_export(batches: Iterable[List[tuple]], columns: Sequence[str],
+                  fmt: str = "ndjson", compress: bool = False) -> Iterator[bytes]:
+    """Превращает пачки строк из DatabaseManager.iter_products в поток байтов
+    NDJSON или CSV, при необходимости сжатый gzip. В памяти только одна пачка"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Неподдерживаемый формат выгрузки: {fmt}")
+    chunks = _ndjson_chunks(batches, columns) if fmt == "ndjson" else _csv_chunks(batches, columns)
+    return _gzip_chunks(chunks) if compress else chunks
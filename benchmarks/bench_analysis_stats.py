@@ -0,0 +1,53 @@
+"""
+Статистика по сборам: SQL-агрегаты (один GROUP BY) против pandas
+(DataFrame на каждый сбор). Заодно проверяет, что оба пути дают
+одинаковые числа.
+
+Запуск:
+    python -m benchmarks.bench_analysis_stats --skus 1000 --months 1
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.bench_delta_storage import fill_history
+from scraper.analyzedata import DataAnalyzer
+from scraper.database import DatabaseManager
+
+COMPARED_FIELDS = ("total_products", "min_price", "max_price", "avg_price", "unique_brands")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--skus", type=int, default=1000)
+    parser.add_argument("--months", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(str(Path(tmp) / "bench.db"))
+        fill_history(db, args.skus, args.months)
+        analyzer = DataAnalyzer(db)
+        scrape_ids = [scrape["scrape_id"] for scrape in db.list_scrapes()]
+
+        start = time.perf_counter()
+        sql_stats = analyzer.compute_stats_sql()
+        sql_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        pandas_stats = {scrape_id: analyzer._analyze_with_pandas(scrape_id) for scrape_id in scrape_ids}
+        pandas_time = time.perf_counter() - start
+
+    for scrape_id in scrape_ids:
+        for field in COMPARED_FIELDS:
+            assert sql_stats[scrape_id][field] == pandas_stats[scrape_id][field], \
+                f"{scrape_id}.{field}: SQL {sql_stats[scrape_id][field]} != pandas {pandas_stats[scrape_id][field]}"
+
+    print(f"Сборов: {len(scrape_ids)}, результаты SQL и pandas совпадают")
+    print(f"SQL (один GROUP BY):   {sql_time * 1000:.1f} мс")
+    print(f"pandas (по сбору):     {pandas_time * 1000:.1f} мс")
+    print(f"Ускорение: x{pandas_time / sql_time:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Латентность запроса /api/products под конкурентной нагрузкой:
+новое соединение с PRAGMA на каждый запрос (как было) против пула соединений.
+Если установлен Flask, дополнительно меряется сам эндпоинт через test_client.
+
+Запуск:
+    python -m benchmarks.bench_api_latency --threads 8 --requests 2000
+"""
+import argparse
+import sqlite3
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from benchmarks.bench_delta_storage import fill_history
+from scraper.database import DatabaseManager
+
+QUERY = "SELECT * FROM products WHERE 1=1 AND price >= ? AND brand = ? LIMIT ? OFFSET ?"
+PARAMS = (20000, "Samsung", 10, 0)
+
+
+def legacy_request(db: DatabaseManager) -> None:
+    """Старый get_connection: connect + PRAGMA на каждый вызов"""
+    conn = sqlite3.connect(db.db_path, timeout=30, check_same_thread=False)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        conn.row_factory = sqlite3.Row
+        [dict(row) for row in conn.execute(QUERY, PARAMS).fetchall()]
+    finally:
+        conn.close()
+
+
+def pooled_request(db: DatabaseManager) -> None:
+    with db.read_connection() as conn:
+        [dict(row) for row in conn.execute(QUERY, PARAMS).fetchall()]
+
+
+def run(func, threads: int, requests: int) -> dict:
+    def timed(_):
+        start = time.perf_counter()
+        func()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies = sorted(executor.map(timed, range(requests)))
+    total = time.perf_counter() - start
+    return {
+        "rps": requests / total,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+    }
+
+
+def report(title: str, result: dict) -> None:
+    print(f"{title:<28} {result['rps']:>8,.0f} req/s   p50 {result['p50_ms']:.2f} мс   p95 {result['p95_ms']:.2f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(str(Path(tmp) / "bench.db"), readers=args.threads)
+        fill_history(db, 1000, 1)
+
+        report("Соединение на запрос:", run(lambda: legacy_request(db), args.threads, args.requests))
+        report("Пул соединений:", run(lambda: pooled_request(db), args.threads, args.requests))
+
+        try:
+            import api.app as api_app
+        except ImportError as e:
+            print(f"Flask API пропущен: {e}")
+        else:
+            api_app.db = db
+            client = api_app.app.test_client()
+            url = "/api/products?min_price=20000&brand=Samsung"
+            report("Flask /api/products:", run(lambda: client.get(url), args.threads, args.requests))
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
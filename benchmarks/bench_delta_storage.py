@@ -0,0 +1,96 @@
+"""
+Сравнение размера БД: полные снимки в products против дельта-режима
+(каталог + история цен) на синтетической истории за несколько месяцев.
+Размер считается вместе с файлом журнала -wal: VACUUM в режиме WAL
+уменьшает основной файл только после checkpoint.
+
+Запуск:
+    python -m benchmarks.bench_delta_storage --skus 2000 --months 3
+"""
+import argparse
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from scraper.database import DatabaseManager
+
+def disk_size(path: Path) -> int:
+    """Основной файл БД плюс журнал -wal"""
+    wal = Path(f"{path}-wal")
+    return path.stat().st_size + (wal.stat().st_size if wal.exists() else 0)
+
+
+BRANDS = ["Apple", "Samsung", "Xiaomi", "realme", "HONOR", "POCO", "Tecno", "Infinix"]
+
+
+def fill_history(db: DatabaseManager, skus: int, months: int, seed: int = 7) -> int:
+    """Сборы каждые 5 часов: ~3% товаров меняют цену, ~1% пропадают из выдачи"""
+    rnd = random.Random(seed)
+    catalog = []
+    for i in range(skus):
+        brand = rnd.choices(BRANDS, weights=[20, 25, 25, 8, 8, 6, 4, 4])[0]
+        catalog.append({
+            "name": f"Смартфон {brand} Model {i} 8/256GB",
+            "price": rnd.randint(5000, 200000),
+            "url": f"https://www.mvideo.ru/products/smartfon-{brand.lower()}-model-{i}-{400000000 + i}",
+            "brand": brand,
+        })
+
+    scrapes = months * 30 * 24 // 5
+    start = datetime(2025, 1, 1)
+    for n in range(scrapes):
+        timestamp = (start + timedelta(hours=5 * n)).isoformat()
+        batch = []
+        for product in catalog:
+            if rnd.random() < 0.03:
+                product["price"] = max(1000, int(product["price"] * rnd.uniform(0.9, 1.08)))
+            if rnd.random() < 0.01:
+                continue
+            batch.append(dict(product, timestamp=timestamp))
+        db.save_products(batch, f"scrape_{n:05d}")
+    return scrapes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--skus", type=int, default=2000)
+    parser.add_argument("--months", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        full_path = Path(tmp) / "full.db"
+        delta_path = Path(tmp) / "delta.db"
+
+        db = DatabaseManager(str(full_path))
+        scrapes = fill_history(db, args.skus, args.months)
+        with db.get_connection() as conn:
+            conn.execute("VACUUM")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        full_size = disk_size(full_path)
+
+        shutil.copy(full_path, delta_path)
+        delta_db = DatabaseManager(str(delta_path))
+        start = time.perf_counter()
+        delta_db.migrate_to_delta()
+        migrate_time = time.perf_counter() - start
+        delta_size = disk_size(delta_path)
+        assert delta_size < full_size, (f"Дельта-режим не уменьшил БД: {delta_size:,} Б "
+                                        f"против {full_size:,} Б (с учетом -wal)")
+
+        # Контроль: снимок любого сбора восстанавливается без потерь
+        for scrape_id in ("scrape_00000", f"scrape_{scrapes // 2:05d}", f"scrape_{scrapes - 1:05d}"):
+            expected = {(p["url"], p["price"]) for p in db.get_scrape_data(scrape_id)}
+            actual = {(p["url"], p["price"]) for p in delta_db.get_scrape_data(scrape_id)}
+            assert expected == actual, f"Снимок {scrape_id} восстановлен неверно"
+
+    print(f"SKU: {args.skus}, сборов: {scrapes}")
+    print(f"Полные снимки: {full_size / 1024 / 1024:.1f} МБ")
+    print(f"Дельта-режим:  {delta_size / 1024 / 1024:.1f} МБ (миграция {migrate_time:.1f} с)")
+    print(f"Сокращение: x{full_size / delta_size:.1f}")
+
+
+if __name__ == "__main__":
+    main()
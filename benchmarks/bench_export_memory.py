@@ -0,0 +1,61 @@
+"""
+Потоковая выгрузка /api/export на многомиллионной синтетической БД:
+проверяет, что пик памяти Python не выходит за заданный потолок.
+
+Запуск:
+    python -m benchmarks.bench_export_memory --rows 2000000 --ceiling-mb 32
+"""
+import argparse
+import logging
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from benchmarks.bench_save_products import make_products
+from scraper.database import DatabaseManager
+
+BATCH = 100_000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--ceiling-mb", type=float, default=32)
+    parser.add_argument("--format", default="ndjson", choices=["ndjson", "csv"])
+    parser.add_argument("--gzip", action="store_true")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    import api.app as api_app
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(str(Path(tmp) / "bench.db"))
+        batch = make_products(BATCH)
+        for n in range(args.rows // BATCH):
+            db.save_products(batch, f"scrape_{n:04d}")
+        api_app.db = db
+        client = api_app.app.test_client()
+
+        url = f"/api/export?format={args.format}" + ("&compress=gzip" if args.gzip else "")
+        tracemalloc.start()
+        start = time.perf_counter()
+        response = client.get(url, buffered=False)
+        size = 0
+        for chunk in response.iter_encoded():
+            size += len(chunk)
+        response.close()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        db.close()
+
+    peak_mb = peak / 1024 / 1024
+    print(f"Строк: {args.rows:,}, формат: {args.format}{' + gzip' if args.gzip else ''}")
+    print(f"Выгружено {size / 1024 / 1024:.1f} МБ за {elapsed:.1f} с ({args.rows / elapsed:,.0f} строк/с)")
+    print(f"Пик памяти Python: {peak_mb:.1f} МБ (потолок {args.ceiling_mb} МБ)")
+    assert peak_mb <= args.ceiling_mb, "Выгрузка вышла за потолок памяти"
+
+
+if __name__ == "__main__":
+    main()
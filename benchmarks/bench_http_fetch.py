@@ -0,0 +1,55 @@
+"""
+HTTP-режим сбора (scraper.http_fetch) против локального сервера с записанными
+страницами: полнота сбора, повторы после 503, изоляция ошибок и время
+при разной степени параллельности.
+
+Запуск:
+    python -m benchmarks.bench_http_fetch --categories 4 --pages 5 --latency 0.2
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from benchmarks.bench_save_products import make_products
+from benchmarks.fixture_driver import make_listing_html
+from benchmarks.stub_server import StubServer
+from scraper.http_fetch import HttpFetcher
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--categories", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--cards", type=int, default=48)
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+
+    responses = {}
+    seed = 0
+    for category in range(args.categories):
+        for page in range(1, args.pages + 1):
+            seed += 1
+            products = [dict(p, url=f"{p['url']}-{seed}") for p in make_products(args.cards, seed=seed)]
+            path = f"/category-{category}" + (f"?page={page}" if page > 1 else "")
+            responses[path] = make_listing_html(products, pages=args.pages)
+    expected = args.categories * args.pages * args.cards
+
+    for concurrency in (1, 4, 8):
+        # Каждая первая страница категории один раз отвечает 503, одна категория битая
+        fail_first = {f"/category-{category}": 1 for category in range(args.categories)}
+        with StubServer(responses, latency=args.latency, fail_first=fail_first) as server:
+            urls = [f"{server.url}/category-{category}" for category in range(args.categories)]
+            fetcher = HttpFetcher(concurrency=concurrency, rate=None, retries=2, backoff=0.05)
+            start = time.perf_counter()
+            result = asyncio.run(fetcher.crawl(urls + [f"{server.url}/missing"]))
+            elapsed = time.perf_counter() - start
+        assert len(result.products) == expected, f"Собрано {len(result.products)} из {expected}"
+        assert [url for url, _ in result.failed] == [f"{server.url}/missing"]
+        print(f"concurrency={concurrency}: {result.pages} страниц, {len(result.products)} товаров "
+              f"за {elapsed:.2f} с, запросов {fetcher.requests}, повторов {fetcher.retried}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Накладные расходы метрик (scraper.metrics): таймер этапа вокруг пустой
+функции (голый вызов, метрики включены, выключены) и разбор страниц
+листинга с метриками и без.
+
+Запуск:
+    python -m benchmarks.bench_metrics --calls 200000 --pages 20 --rounds 5
+"""
+import argparse
+import logging
+import time
+
+from benchmarks.bench_save_products import make_products
+from benchmarks.datagen import CATEGORY_URL, make_snapshot
+from scraper import metrics
+from scraper.metrics import STAGE_SECONDS, timed
+from scraper.parsers import get_parser
+
+
+def _noop():
+    return None
+
+
+def per_call(func, calls: int) -> float:
+    """Среднее время вызова, нс"""
+    started = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - started) / calls * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200_000)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--cards", type=int, default=120)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+
+    decorated = timed(STAGE_SECONDS, "bench")(_noop)
+
+    def context():
+        with timed(STAGE_SECONDS, "bench"):
+            pass
+
+    bare = per_call(_noop, args.calls)
+    for enabled in (True, False):
+        metrics.configure(enabled)
+        state = "вкл" if enabled else "выкл"
+        print(f"Метрики {state}: декоратор +{per_call(decorated, args.calls) - bare:.0f} нс, "
+              f"with +{per_call(context, args.calls) - bare:.0f} нс на вызов")
+
+    snapshots = [make_snapshot(make_products(args.cards, seed=page), pages=args.pages)
+                 for page in range(args.pages)]
+    listing_parser = get_parser("auto")
+    # Чередуем режимы и берем лучший проход, чтобы не мерить прогрев и шум
+    results = {False: float("inf"), True: float("inf")}
+    for _ in range(args.rounds):
+        for enabled in (False, True):
+            metrics.configure(enabled)
+            started = time.perf_counter()
+            for html in snapshots:
+                listing_parser.parse(html, CATEGORY_URL)
+            elapsed = (time.perf_counter() - started) / len(snapshots) * 1000
+            results[enabled] = min(results[enabled], elapsed)
+    metrics.configure(True)
+    print(f"Разбор страницы ({listing_parser.name}, {args.cards} карточек): "
+          f"без метрик {results[False]:.2f} мс, с метриками {results[True]:.2f} мс "
+          f"({(results[True] / results[False] - 1) * 100:+.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
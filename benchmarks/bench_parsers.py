@@ -0,0 +1,80 @@
+"""
+Парсеры листинга (scraper.parsers): совпадение результата lxml с эталонным
+BeautifulSoup на снимках страниц и время разбора страницы каждым бэкендом.
+
+Снимки - сохраненные HTML-страницы листинга (--snapshots DIR, *.html) или,
+по умолчанию, сгенерированные страницы с разметкой, похожей на mvideo.ru:
+вложенные блоки, скрипты, картинки, рейтинги и пограничные карточки
+(без цены, без ссылки, с HTML-сущностями, с лишними параметрами в ссылке).
+
+Запуск:
+    python -m benchmarks.bench_parsers --pages 20 --cards 120
+    python -m benchmarks.bench_parsers --snapshots ./snapshots
+"""
+import argparse
+import logging
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from benchmarks.bench_save_products import make_products
+from benchmarks.datagen import CATEGORY_URL, make_snapshot
+from scraper.parsers import PARSERS, get_parser
+
+
+def load_snapshots(args) -> List[Tuple[str, str]]:
+    if args.snapshots:
+        return [(CATEGORY_URL, path.read_text(encoding="utf-8"))
+                for path in sorted(Path(args.snapshots).glob("*.html"))]
+    return [(CATEGORY_URL, make_snapshot(make_products(args.cards, seed=page), pages=args.pages))
+            for page in range(args.pages)]
+
+
+def _comparable(result: Tuple[List[Dict], int]):
+    products, last_page = result
+    return [{k: v for k, v in product.items() if k != "timestamp"} for product in products], last_page
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--cards", type=int, default=120)
+    parser.add_argument("--snapshots", help="каталог с сохраненными страницами *.html")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+
+    snapshots = load_snapshots(args)
+    if not snapshots:
+        raise SystemExit("Нет снимков страниц")
+    parsers = {name: get_parser(name) for name in PARSERS}
+
+    # Корректность: каждый бэкенд дает ровно то же, что BeautifulSoup
+    reference = parsers["bs4"]
+    total = 0
+    for number, (url, page) in enumerate(snapshots):
+        expected = _comparable(reference.parse(page, url))
+        total += len(expected[0])
+        for name, listing_parser in parsers.items():
+            actual = _comparable(listing_parser.parse(page, url))
+            assert actual == expected, f"{name}: снимок {number} разобран не так, как в bs4"
+    size = sum(len(page) for _, page in snapshots) / len(snapshots)
+    print(f"Снимков: {len(snapshots)}, товаров: {total}, средний размер {size / 1024:.0f} КБ - "
+          f"результаты {', '.join(parsers)} совпадают")
+
+    timings = {}
+    for name, listing_parser in parsers.items():
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            for url, page in snapshots:
+                listing_parser.parse(page, url)
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best / len(snapshots)
+    for name, seconds in timings.items():
+        print(f"{name:>5}: {seconds * 1000:7.1f} мс на страницу "
+              f"(x{timings['bs4'] / seconds:.1f} к bs4)")
+
+
+if __name__ == "__main__":
+    main()
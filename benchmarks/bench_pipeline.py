@@ -0,0 +1,97 @@
+"""
+Потоковый конвейер сбора (scraper.pipeline) против прежнего пути:
+весь список словарей товаров в памяти -> save_products -> повторное
+чтение сбора из БД для анализа. Пиковая память (tracemalloc) и время
+на одинаковом потоке страниц; статистика на лету сверяется с агрегацией по БД.
+
+Запуск:
+    python -m benchmarks.bench_pipeline --rows 100000 --per-page 100
+"""
+import argparse
+import logging
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+from benchmarks.bench_save_products import BRANDS
+from scraper.analyzedata import DataAnalyzer
+from scraper.database import DatabaseManager
+from scraper.pipeline import ScrapePipeline
+from scraper.writer import WriteBehindQueue
+
+
+def iter_pages(rows: int, per_page: int, seed: int = 42) -> Iterator[List[Dict]]:
+    """Страницы в том виде, в каком их отдавал прежний парсер: строка времени на каждую карточку"""
+    rnd = random.Random(seed)
+    for start in range(0, rows, per_page):
+        page = []
+        for i in range(start, min(start + per_page, rows)):
+            brand = rnd.choice(BRANDS)
+            page.append({
+                "name": f"Смартфон {brand} Model {i} 8/256GB",
+                "price": rnd.randint(5000, 200000),
+                "url": f"https://www.mvideo.ru/products/smartfon-{brand.lower()}-model-{i}-{400000000 + i}",
+                "brand": "".join(brand),  # как из разбора HTML: отдельная строка на карточку
+                "timestamp": datetime.now().isoformat()
+            })
+        yield page
+
+
+def legacy(db: DatabaseManager, args) -> Dict:
+    products = []
+    for page in iter_pages(args.rows, args.per_page):
+        products.extend(page)
+    db.save_products(products, "legacy")
+    return DataAnalyzer(db).analyze_by_scrape_id("legacy")
+
+
+def streaming(db: DatabaseManager, args) -> Dict:
+    with WriteBehindQueue(db, max_pending=4) as writer:
+        pipeline = ScrapePipeline(writer, "streaming", chunk_size=args.chunk_size)
+        for page in iter_pages(args.rows, args.per_page):
+            pipeline.add_page(page)
+        return pipeline.close()
+
+
+def measure(name: str, run, args) -> Dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(str(Path(tmp) / "bench.db"))
+        tracemalloc.start()
+        start = time.perf_counter()
+        stats = run(db, args)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        stored = DataAnalyzer(db).analyze_by_scrape_id(name)
+        db.close()
+    print(f"{name:>9}: пик памяти {peak / 2 ** 20:7.1f} МБ, {elapsed:5.2f} с "
+          f"(под tracemalloc), {args.rows / elapsed:,.0f} товаров/с")
+    return {"stats": stats, "stored": stored}
+
+
+def _without_timestamp(stats: Dict) -> Dict:
+    return {k: v for k, v in stats.items() if k != "timestamp"}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--per-page", type=int, default=100)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    old = measure("legacy", legacy, args)
+    new = measure("streaming", streaming, args)
+    assert _without_timestamp(new["stats"]) == _without_timestamp(new["stored"]), \
+        "статистика на лету расходится с агрегацией по БД"
+    assert _without_timestamp(new["stats"]) == _without_timestamp(old["stats"])
+    print(f"Статистика на лету совпадает с БД: {_without_timestamp(new['stats'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Ожидание готовности листинга (scraper.readiness) против прежних фиксированных
+пауз на тестовом драйвере с локальными HTML-страницами. Проверяет, что
+собраны все карточки, и показывает сэкономленное время на страницу.
+--beacons N - страница без конца шлет фоновый запрос раз в N секунд
+(сеть не затихает, готовность определяется по карточкам).
+
+Запуск:
+    python -m benchmarks.bench_readiness --pages 5 --cards 96
+    python -m benchmarks.bench_readiness --pages 5 --beacons 0.2
+"""
+import argparse
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.bench_save_products import make_products
+from benchmarks.fixture_driver import FixtureDriver, make_listing_html
+from scraper.main import load_listing
+from scraper.parsers import get_parser
+from scraper.readiness import ReadinessEngine
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--cards", type=int, default=96)
+    parser.add_argument("--first-paint", type=float, default=1.5)
+    parser.add_argument("--batch-delay", type=float, default=0.5)
+    parser.add_argument("--beacons", type=float, help="интервал фоновых запросов, с")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fixtures = {}
+        for page in range(args.pages):
+            path = Path(tmp) / f"page_{page}.html"
+            path.write_text(make_listing_html(make_products(args.cards, seed=page)), encoding="utf-8")
+            fixtures[f"https://www.mvideo.ru/smartfony-i-svyaz-10/smartfony-205?page={page + 1}"] = str(path)
+
+        driver = FixtureDriver(fixtures, first_paint=args.first_paint, batch_delay=args.batch_delay,
+                               beacon_interval=args.beacons)
+        engine = ReadinessEngine()
+        listing_parser = get_parser()
+        start = time.perf_counter()
+        for url in fixtures:
+            products, _ = listing_parser.parse(load_listing(driver, url, engine), url)
+            assert len(products) == args.cards, f"Собрано {len(products)} из {args.cards} карточек"
+        elapsed = time.perf_counter() - start
+
+    legacy = engine.total_saved + elapsed
+    print(f"Страниц: {args.pages}, карточек на странице: {args.cards} (все собраны)")
+    print(f"Ожидание по событиям: {elapsed / args.pages:.1f} с на страницу")
+    print(f"Фиксированные паузы:  {legacy / args.pages:.1f} с на страницу (оценка)")
+    print(f"Сэкономлено: {engine.total_saved / args.pages:.1f} с на страницу, "
+          f"адаптивный таймаут {engine.timeout:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
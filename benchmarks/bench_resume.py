@@ -0,0 +1,104 @@
+"""
+Продолжение сбора после сбоя (scrape_checkpoints): дочерний процесс собирает
+категории по HTTP с локального сервера и аварийно завершается (os._exit,
+без сброса очереди записи) после заданного числа страниц, затем сбор
+продолжается с отметок. Сколько страниц пришлось собрать заново и совпал ли
+итог (товары без дублей, статистика) с непрерывным сбором.
+
+Запуск:
+    python -m benchmarks.bench_resume --categories 3 --pages 8 --crash-after 10
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import tempfile
+from functools import partial
+from pathlib import Path
+
+from benchmarks.bench_save_products import make_products
+from benchmarks.fixture_driver import make_listing_html
+from benchmarks.stub_server import StubServer
+from scraper.analyzedata import DataAnalyzer
+from scraper.database import DatabaseManager
+from scraper.http_fetch import fetch_categories
+from scraper.pipeline import stream_scrape
+
+
+def _crashing_run(db_path: str, urls, scrape_id: str, crash_after: int) -> None:
+    """Сбор, который падает при получении страницы номер crash_after + 1"""
+    logging.disable(logging.WARNING)
+    pages = 0
+
+    def crawl(sink, progress):
+        def crashing_sink(products, page):
+            nonlocal pages
+            if pages == crash_after:
+                os._exit(1)
+            pages += 1
+            sink(products, page)
+        return fetch_categories(urls, concurrency=1, rate=None, sink=crashing_sink, progress=progress)
+
+    stream_scrape(DatabaseManager(db_path), scrape_id, crawl)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--categories", type=int, default=3)
+    parser.add_argument("--pages", type=int, default=8)
+    parser.add_argument("--cards", type=int, default=48)
+    parser.add_argument("--crash-after", type=int, default=10)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    responses = {}
+    seed = 0
+    for category in range(args.categories):
+        for page in range(1, args.pages + 1):
+            seed += 1
+            products = [dict(p, url=f"{p['url']}-{seed}") for p in make_products(args.cards, seed=seed)]
+            path = f"/category-{category}" + (f"?page={page}" if page > 1 else "")
+            responses[path] = make_listing_html(products, pages=args.pages)
+    total_pages = len(responses)
+
+    with StubServer(responses) as server, tempfile.TemporaryDirectory() as tmp:
+        urls = [f"{server.url}/category-{category}" for category in range(args.categories)]
+        db = DatabaseManager(str(Path(tmp) / "bench.db"))
+        crawl = partial(fetch_categories, urls, concurrency=1, rate=None)
+
+        # Эталон: непрерывный сбор
+        db.start_scrape("reference", ", ".join(urls))
+        _, reference = stream_scrape(db, "reference", crawl)
+        server.hits.clear()
+
+        db.start_scrape("crashed", ", ".join(urls))
+        child = multiprocessing.get_context("fork").Process(
+            target=_crashing_run, args=(db.db_path, urls, "crashed", args.crash_after))
+        child.start()
+        child.join()
+        before = sum(server.hits.values())
+        progress = db.get_checkpoints("crashed")
+        saved = sum(len(category["pages"]) for category in progress.values())
+
+        result, stats = stream_scrape(db, "crashed", crawl)
+        refetched = sum(server.hits.values()) - before
+        stored = DataAnalyzer(db).analyze_by_scrape_id("crashed")
+        duplicates = db.execute_query("""
+            SELECT COUNT(*) - COUNT(DISTINCT url) AS n FROM products WHERE scrape_id = 'crashed'
+        """)[0]["n"]
+        db.close()
+
+    lost = before + refetched - total_pages
+    print(f"Страниц в сборе: {total_pages}, сбой после {args.crash_after} (код {child.exitcode}), "
+          f"отмечено до сбоя: {saved}")
+    print(f"Продолжение: собрано {refetched} страниц вместо {total_pages} "
+          f"(повторно {lost} - страницы, не успевшие закоммититься)")
+    clean = {k: v for k, v in stats.items() if k != "timestamp"}
+    assert clean == {k: v for k, v in reference.items() if k != "timestamp"}, "итог не совпал с эталоном"
+    assert clean == {k: v for k, v in stored.items() if k != "timestamp"}
+    assert duplicates == 0, f"дубли товаров: {duplicates}"
+    print(f"Итог совпадает с непрерывным сбором: {clean}")
+
+
+if __name__ == "__main__":
+    main()
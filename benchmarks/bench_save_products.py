@@ -0,0 +1,105 @@
+"""
+Бенчмарк DatabaseManager.save_products: построчные INSERT (как было раньше)
+против пакетной вставки executemany одной транзакцией.
+
+save_products кроме строк products ведет каталог товаров, полнотекстовый
+индекс и счетчики брендов, а построчный путь пишет только products,
+поэтому сравнение в пользу построчного. Замеры два: первый сбор (все URL
+новые - каталог и FTS заполняются целиком) и повторный сбор тех же товаров
+(обычный режим работы: каталог почти не меняется).
+
+Запуск:
+    python -m benchmarks.bench_save_products --rows 100000
+"""
+import argparse
+import logging
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+from scraper.database import DatabaseManager
+
+BRANDS = ["Apple", "Samsung", "Xiaomi", "realme", "HONOR", "POCO", "Tecno", "Infinix"]
+
+
+def make_products(count: int, seed: int = 42) -> List[Dict]:
+    """Синтетическая партия товаров в формате extract_product_data"""
+    rnd = random.Random(seed)
+    now = datetime.now().isoformat()
+    products = []
+    for i in range(count):
+        brand = rnd.choice(BRANDS)
+        products.append({
+            "name": f"Смартфон {brand} Model {i} 8/256GB",
+            "price": rnd.randint(5000, 200000),
+            "url": f"https://www.mvideo.ru/products/smartfon-{brand.lower()}-model-{i}-{400000000 + i}",
+            "brand": brand,
+            "timestamp": now
+        })
+    return products
+
+
+def legacy_save_products(db: DatabaseManager, products: List[Dict], scrape_id: str) -> None:
+    """Старая реализация: один execute и одна строка debug-лога на товар"""
+    logger = logging.getLogger("legacy")
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        for idx, product in enumerate(products, 1):
+            try:
+                cursor.execute("""
+                    INSERT INTO products (name, price, url, brand, timestamp, scrape_id)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (
+                    product["name"],
+                    product["price"],
+                    product["url"],
+                    product["brand"],
+                    product["timestamp"],
+                    scrape_id
+                ))
+                logger.debug(f"Сохранен товар {idx}/{len(products)}: {product['name']}")
+            except KeyError as e:
+                logger.error(f"Пропущен товар: отсутствует ключ {e}")
+            except sqlite3.Error as e:
+                logger.error(f"Ошибка SQLite: {e}")
+        conn.commit()
+        cursor.close()
+
+
+def measure(save, products: List[Dict], repeat: bool = False) -> float:
+    """Строк в секунду; repeat - замер второго сбора тех же товаров"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(str(Path(tmp) / "bench.db"))
+        if repeat:
+            save(db, products, "warmup")
+        start = time.perf_counter()
+        save(db, products, "bench")
+        elapsed = time.perf_counter() - start
+        db.close()
+    return len(products) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    products = make_products(args.rows)
+    bulk = lambda db, p, sid: db.save_products(p, sid)  # noqa: E731
+    print(f"Строк: {args.rows}")
+    for title, repeat in (("Первый сбор", False), ("Повторный сбор", True)):
+        before = measure(legacy_save_products, products, repeat)
+        after = measure(bulk, products, repeat)
+        print(f"{title}:")
+        print(f"  До (execute на строку):   {before:,.0f} строк/с")
+        print(f"  После (executemany):      {after:,.0f} строк/с")
+        print(f"  Ускорение: x{after / before:.1f}")
+
+
+if __name__ == "__main__":
+    main()
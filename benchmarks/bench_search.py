@@ -0,0 +1,81 @@
+"""
+Латентность полнотекстового поиска (/api/search) и фасетов по брендам
+на многомиллионной истории.
+
+Запуск:
+    python -m benchmarks.bench_search --skus 5000 --scrapes 400
+"""
+import argparse
+import logging
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from scraper.database import DatabaseManager
+
+MODELS = {
+    "Apple": ["iPhone 13", "iPhone 14", "iPhone 15", "iPhone 15 Pro", "iPhone 16 Pro Max"],
+    "Samsung": ["Galaxy A15", "Galaxy A25", "Galaxy A55", "Galaxy S24", "Galaxy S24 Ultra"],
+    "Xiaomi": ["Redmi 13C", "Redmi Note 13", "Redmi Note 13 Pro", "14T Pro"],
+    "POCO": ["X6 Pro", "M6 Pro", "F6"],
+    "HONOR": ["X8b", "90 Lite", "200 Pro"],
+    "realme": ["C67", "12 Pro+", "GT 6"],
+    "Tecno": ["Spark 20", "Camon 30", "Pova 6"],
+    "Infinix": ["Hot 40i", "Note 40", "Zero 30"],
+}
+MEMORY = ["4/128GB", "6/128GB", "8/256GB", "12/256GB", "12/512GB"]
+COLORS = ["Black", "White", "Blue", "Green", "Титан", "Серебристый"]
+QUERIES = ["iphone 15", "galaxy s24", "redmi note", "poc", "12/512", "титан", "iph pro max", "смартфон"]
+
+
+def make_catalog(skus: int, rnd: random.Random) -> list:
+    catalog = []
+    for i in range(skus):
+        brand = rnd.choices(list(MODELS), weights=[20, 25, 25, 8, 8, 6, 4, 4])[0]
+        name = f"Смартфон {brand} {rnd.choice(MODELS[brand])} {rnd.choice(MEMORY)} {rnd.choice(COLORS)}"
+        catalog.append({
+            "name": name,
+            "price": rnd.randint(5000, 200000),
+            "url": f"https://www.mvideo.ru/products/smartfon-{brand.lower()}-{400000000 + i}",
+            "brand": brand,
+        })
+    return catalog
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--skus", type=int, default=5000)
+    parser.add_argument("--scrapes", type=int, default=400)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    rnd = random.Random(11)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(str(Path(tmp) / "bench.db"))
+        catalog = make_catalog(args.skus, rnd)
+        start = time.perf_counter()
+        for n in range(args.scrapes):
+            for product in catalog:
+                if rnd.random() < 0.03:
+                    product["price"] = int(product["price"] * rnd.uniform(0.9, 1.08))
+            db.save_products([dict(p, timestamp=f"2025-01-01T{n:05d}") for p in catalog], f"scrape_{n:05d}")
+        print(f"История: {args.skus * args.scrapes:,} строк, загружена за {time.perf_counter() - start:.0f} с")
+
+        scrape_id = db.get_last_scrape_id()
+        for query in QUERIES:
+            latencies = []
+            for _ in range(args.repeat):
+                t = time.perf_counter()
+                results = db.search_products(query, scrape_id, limit=20)
+                db.get_brand_facets(scrape_id)
+                latencies.append((time.perf_counter() - t) * 1000)
+            print(f"{query!r:<16} найдено {len(results):>2}   p50 {statistics.median(latencies):.2f} мс   "
+                  f"max {max(latencies):.2f} мс")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
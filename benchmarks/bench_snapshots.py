@@ -0,0 +1,115 @@
+"""
+Снимки сбора (scraper.snapshots): прежние писатели JSON против NDJSON через
+orjson без сжатия, с gzip и с zstd. Время записи и чтения, размер файла и
+пиковая память записи (tracemalloc, сверх самого списка товаров);
+прочитанный снимок сверяется с исходными товарами.
+
+Прежние писатели:
+  save_task   - flows.monitoring: рекурсивный ensure_utf8 + json.dump(indent=4)
+  save_to_json - scraper.utils: json.dump(indent=4, default=...)
+
+Запуск:
+    python -m benchmarks.bench_snapshots --rows 200000
+"""
+import argparse
+import json
+import logging
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List
+
+from benchmarks.bench_pipeline import iter_pages
+from scraper.snapshots import iter_snapshot, snapshot_path, write_snapshot, zstandard
+
+
+def ensure_utf8(data: Any) -> Any:
+    """Прежний flows.monitoring.ensure_utf8"""
+    if isinstance(data, bytes):
+        try:
+            return data.decode('utf-8')
+        except UnicodeDecodeError:
+            return data.decode('utf-8', errors='replace')
+    elif isinstance(data, str):
+        return data
+    elif isinstance(data, dict):
+        return {ensure_utf8(k): ensure_utf8(v) for k, v in data.items()}
+    elif isinstance(data, (list, tuple)):
+        return [ensure_utf8(item) for item in data]
+    return data
+
+
+def legacy_save_task(products: List[Dict], path: Path) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(ensure_utf8({"products": products}), f, ensure_ascii=False, indent=4)
+
+
+def legacy_save_to_json(products: List[Dict], path: Path) -> None:
+    def json_serializer(obj):
+        if isinstance(obj, datetime):
+            return obj.isoformat()
+        raise TypeError(f"Type {type(obj)} not serializable")
+
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(products, f, indent=4, ensure_ascii=False, default=json_serializer)
+
+
+def _read_json(path: Path) -> List[Dict]:
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    return data["products"] if isinstance(data, dict) else data
+
+
+def run(name: str, write, read, products: List[Dict], path: Path, repeat: int) -> Dict:
+    best_write = best_read = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        write(products, path)
+        best_write = min(best_write, time.perf_counter() - start)
+        start = time.perf_counter()
+        restored = read(path)
+        best_read = min(best_read, time.perf_counter() - start)
+    assert restored == products, f"{name}: снимок прочитан не так, как записан"
+
+    tracemalloc.start()
+    write(products, path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"name": name, "write": best_write, "read": best_read, "size": path.stat().st_size, "peak": peak}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    products = [product for page in iter_pages(args.rows, 100) for product in page]
+    read_ndjson = lambda path: list(iter_snapshot(path))  # noqa: E731
+    cases = [
+        ("save_task", legacy_save_task, _read_json, "legacy_task.json"),
+        ("save_to_json", legacy_save_to_json, _read_json, "legacy_utils.json"),
+        ("ndjson", write_snapshot, read_ndjson, snapshot_path("bench", compression=None).name),
+        ("ndjson+gzip", write_snapshot, read_ndjson, snapshot_path("bench", compression="gzip").name),
+    ]
+    if zstandard is not None:
+        cases.append(("ndjson+zstd", write_snapshot, read_ndjson, snapshot_path("bench", compression="zstd").name))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = [run(name, write, read, products, Path(tmp) / filename, args.repeat)
+                   for name, write, read, filename in cases]
+
+    base = results[0]
+    print(f"Товаров: {args.rows:,}")
+    print(f"{'писатель':>13} {'запись, с':>10} {'чтение, с':>10} {'размер, МБ':>11} {'пик записи, МБ':>15}")
+    for result in results:
+        print(f"{result['name']:>13} {result['write']:10.2f} {result['read']:10.2f} "
+              f"{result['size'] / 2 ** 20:11.1f} {result['peak'] / 2 ** 20:15.1f}"
+              f"   x{base['write'] / result['write']:.1f} быстрее, x{base['size'] / result['size']:.1f} меньше")
+
+
+if __name__ == "__main__":
+    main()
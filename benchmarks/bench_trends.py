@@ -0,0 +1,85 @@
+"""
+Векторная аналитика динамики цен (scraper.trends) на синтетической истории:
+годы сборов каждые 5 часов. Расчет должен укладываться в секунды.
+
+Запуск:
+    python -m benchmarks.bench_trends --years 3 --skus 1000
+"""
+import argparse
+import logging
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_save_products import BRANDS
+from scraper.database import DatabaseManager
+from scraper.trends import compute_trends, save_trends
+
+SCRAPE_INTERVAL_HOURS = 5
+
+
+def make_history(years: float, skus: int, seed: int = 7) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """История в колоночном виде (как load_history): цена товара - случайное
+    блуждание, меняется примерно в 3% сборов"""
+    rng = np.random.default_rng(seed)
+    scrapes = int(years * 365 * 24 / SCRAPE_INTERVAL_HOURS)
+    start = datetime(2022, 1, 1)
+    timestamps = np.array([(start + timedelta(hours=SCRAPE_INTERVAL_HOURS * n)).isoformat()
+                           for n in range(scrapes)], dtype=object)
+    scrape_ids = np.array([f"scrape_{n:06d}" for n in range(scrapes)], dtype=object)
+    brands = np.array(BRANDS, dtype=object)[rng.integers(0, len(BRANDS), skus)]
+    urls = np.array([f"https://www.mvideo.ru/products/smartfon-{i}-{400000000 + i}" for i in range(skus)],
+                    dtype=object)
+
+    base = rng.integers(5000, 200000, skus).astype(np.float64)
+    steps = np.where(rng.random((scrapes, skus)) < 0.03, rng.normal(0, 0.05, (scrapes, skus)), 0.0)
+    prices = np.round(base * np.exp(np.cumsum(steps, axis=0))).astype(np.int64)
+
+    history = pd.DataFrame({
+        "seq": np.repeat(np.arange(1, scrapes + 1), skus),
+        "url": np.tile(urls, scrapes),
+        "brand": np.tile(brands, scrapes),
+        "price": prices.ravel(),
+    })
+    scrape_frame = pd.DataFrame({"seq": np.arange(1, scrapes + 1), "scrape_id": scrape_ids,
+                                 "started_at": timestamps})
+    return history, scrape_frame
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--skus", type=int, default=1000)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    df, scrapes = make_history(args.years, args.skus)
+    print(f"История: {len(scrapes):,} сборов x {args.skus:,} товаров = {len(df):,} строк")
+
+    start = time.perf_counter()
+    trends = compute_trends(df, scrapes)
+    computed = time.perf_counter() - start
+    print(f"Расчет: {computed:.2f} с "
+          f"({', '.join(f'{name} {len(frame):,}' for name, frame in trends.items())})")
+
+    # Сверка с прямым расчетом для последнего сбора
+    last = scrapes.iloc[-1]
+    expected = df[df["seq"] == last["seq"]].groupby("brand")["price"].median()
+    actual = trends["brand_trends"].query("scrape_id == @last.scrape_id").set_index("brand")["median"]
+    assert np.allclose(expected.sort_index(), actual.sort_index()), "Медианы не совпали"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(str(Path(tmp) / "bench.db"))
+        start = time.perf_counter()
+        save_trends(db, trends)
+        print(f"Запись роллапов: {time.perf_counter() - start:.2f} с")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
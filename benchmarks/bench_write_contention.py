@@ -0,0 +1,105 @@
+"""
+Стресс-тест записи несколькими продюсерами одновременно.
+
+1. Прямая запись: у каждого продюсера свое соединение (как у flow,
+   ручного запуска и анализатора). busy_timeout=0, чтобы посчитать
+   столкновения блокировок - в старом get_connection каждое такое
+   столкновение означало повтор со sleep.
+2. WriteBehindQueue: продюсеры только кладут пачки в очередь,
+   пишет единственный поток групповыми транзакциями.
+
+Запуск:
+    python -m benchmarks.bench_write_contention --producers 6 --batches 50
+"""
+import argparse
+import logging
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from benchmarks.bench_save_products import make_products
+from scraper.database import DatabaseManager
+from scraper.writer import WriteBehindQueue
+
+
+def direct_writes(db_path: str, producers: int, batches: int, batch_size: int) -> dict:
+    collisions = 0
+    lock = threading.Lock()
+
+    def produce(n: int):
+        nonlocal collisions
+        db = DatabaseManager(db_path)
+        with db.get_connection() as conn:
+            conn.execute("PRAGMA busy_timeout=0")
+        for b in range(batches):
+            products = make_products(batch_size, seed=n * batches + b)
+            while True:
+                try:
+                    db.save_products(products, f"producer_{n}")
+                    break
+                except sqlite3.OperationalError as e:
+                    if "locked" not in str(e) and "busy" not in str(e):
+                        raise
+                    with lock:
+                        collisions += 1
+                    time.sleep(0.001)
+        db.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=produce, args=(n,)) for n in range(producers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {"elapsed": time.perf_counter() - start, "collisions": collisions}
+
+
+def queued_writes(db_path: str, producers: int, batches: int, batch_size: int) -> dict:
+    db = DatabaseManager(db_path)
+    writer = WriteBehindQueue(db)
+
+    def produce(n: int):
+        for b in range(batches):
+            writer.submit_products(make_products(batch_size, seed=n * batches + b), f"producer_{n}")
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=produce, args=(n,)) for n in range(producers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writer.close()
+    elapsed = time.perf_counter() - start
+    result = {"elapsed": elapsed, "collisions": 0, "group_commits": writer.group_commits}
+    db.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--producers", type=int, default=6)
+    parser.add_argument("--batches", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=200)
+    args = parser.parse_args()
+    total = args.producers * args.batches
+
+    # Ошибки блокировок при прямой записи ожидаемы и считаются, а не логируются
+    logging.disable(logging.ERROR)
+    with tempfile.TemporaryDirectory() as tmp:
+        DatabaseManager(str(Path(tmp) / "direct.db")).close()
+        direct = direct_writes(str(Path(tmp) / "direct.db"), args.producers, args.batches, args.batch_size)
+        queued = queued_writes(str(Path(tmp) / "queued.db"), args.producers, args.batches, args.batch_size)
+        rows = DatabaseManager(str(Path(tmp) / "queued.db")).execute_query(
+            "SELECT COUNT(*) AS n FROM products")[0]["n"]
+        assert rows == total * args.batch_size, "Очередь потеряла записи"
+
+    print(f"Продюсеров: {args.producers}, пачек: {total} по {args.batch_size} товаров")
+    print(f"Прямая запись:   {direct['elapsed']:.2f} с, столкновений блокировок: {direct['collisions']}")
+    print(f"WriteBehindQueue: {queued['elapsed']:.2f} с, столкновений блокировок: {queued['collisions']}, "
+          f"групповых коммитов: {queued['group_commits']}")
+
+
+if __name__ == "__main__":
+    main()
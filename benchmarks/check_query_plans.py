@@ -0,0 +1,205 @@
+"""
+Проверка планов горячих запросов (EXPLAIN QUERY PLAN): get_last_scrape_id,
+get_scrape_data, DataAnalyzer.compute_stats_sql и запросы /api/products
+(query_products и count_products с фильтрами, keyset-курсор, scrape_id=all).
+
+SQL снимается трассировкой соединений пула во время вызова методов, так что
+проверяется ровно тот запрос, который выполняет код, с подставленными
+параметрами. Запрос не проходит проверку, если в плане есть полный проход
+таблицы (SCAN без индекса) или временное B-дерево для сортировки/группировки.
+Упорядоченный проход по индексу (SCAN ... USING INDEX) разрешен: так
+читаются страницы без фильтров, LIMIT останавливает его на первых строках.
+Разрешено и B-дерево для COUNT(DISTINCT brand) в compute_stats_sql: в нем
+бренды одного сбора (десятки значений), а не строки таблицы.
+
+Глобальных индексов по цене и бренду нет (миграция 7: они замедляют каждую
+запись сбора). Страницы scrape_id=all идут в порядке записи (по id): без
+фильтров разрешен только проход таблицы по rowid (SCAN products), который
+останавливает LIMIT. С фильтрами строки обязаны искаться по индексам сбора
+через skip-scan (ANY(scrape_id)), временное B-дерево тогда сортирует только
+найденные строки - полный проход таблицы запрещен. Счетчики по всей истории
+с фильтрами тоже идут через skip-scan.
+
+Проверяется режим хранения full (таблица products). В дельта-режиме
+цена лежит в price_history, и страница сбора через представление
+products_delta всегда сортируется временным B-деревом по строкам сбора -
+такие планы здесь не проверяются.
+
+Запуск:
+    python -m benchmarks.check_query_plans
+    python -m pytest -q benchmarks/check_query_plans.py
+"""
+import logging
+import sys
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, FrozenSet, Iterator, List, Tuple
+
+from benchmarks.datagen import iter_history, make_catalog
+from scraper.analyzedata import DataAnalyzer
+from scraper.database import DatabaseManager
+
+SKUS = 300
+YEARS = 0.05
+
+
+ROWID_SCAN = "SCAN products"
+SORT_FOUND = "USE TEMP B-TREE FOR ORDER BY"
+
+
+def _bad_steps(plan: List[str], allowed: FrozenSet[str] = frozenset()) -> List[str]:
+    """Шаги плана с полным проходом таблицы или временным B-деревом,
+    кроме явно разрешенных для запроса шагов allowed"""
+    bad = []
+    for step in plan:
+        if step in allowed:
+            continue
+        if step.startswith("SCAN") and "INDEX" not in step and "CONSTANT ROW" not in step:
+            bad.append(step)
+        elif "USE TEMP B-TREE" in step and "count(DISTINCT)" not in step:
+            bad.append(step)
+    return bad
+
+
+@contextmanager
+def traced(db: DatabaseManager) -> Iterator[List[str]]:
+    """SQL всех SELECT, выполненных соединениями пула внутри блока"""
+    statements: List[str] = []
+
+    def trace(sql: str) -> None:
+        if sql.lstrip().upper().startswith(("SELECT", "WITH")):
+            statements.append(sql)
+
+    opened = []
+    original_open = db.pool._open
+
+    def open_traced(read_only: bool):
+        conn = original_open(read_only)
+        conn.set_trace_callback(trace)
+        opened.append(conn)
+        return conn
+
+    # Уже открытые соединения пула закрываем, новые открываются с трассировкой
+    db.pool.close()
+    db.pool._open = open_traced
+    try:
+        yield statements
+    finally:
+        for conn in opened:
+            conn.set_trace_callback(None)
+        db.pool._open = original_open
+
+
+def explain(db: DatabaseManager, sql: str) -> List[str]:
+    with db.read_connection() as conn:
+        return [row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+
+
+def build_db(path: Path) -> DatabaseManager:
+    db = DatabaseManager(str(path))
+    for scrape_id, _, products in iter_history(make_catalog(SKUS, YEARS), YEARS):
+        db.start_scrape(scrape_id)
+        db.save_products(products, scrape_id)
+        db.finish_scrape(scrape_id)
+    with db.get_connection() as conn:
+        conn.execute("ANALYZE")
+    return db
+
+
+def hot_queries(db: DatabaseManager) -> List[Tuple[str, Callable, FrozenSet[str]]]:
+    """[(имя, вызов, разрешенные шаги плана), ...]"""
+    scrape_id = db.get_last_scrape_id()
+    page = db.query_products(scrape_id=scrape_id, limit=20)
+    brand = db.resolve_brand(db.get_scrape_data(scrape_id)[0]["brand"])
+    analyzer = DataAnalyzer(db)
+    queries = [(name, call, frozenset()) for name, call in [
+        ("get_last_scrape_id", db.get_last_scrape_id),
+        ("get_scrape_data", lambda: db.get_scrape_data(scrape_id)),
+        ("compute_stats_sql", lambda: analyzer.compute_stats_sql([scrape_id])),
+        ("api: сбор, страница", lambda: db.query_products(scrape_id=scrape_id, limit=20)),
+        ("api: сбор, курсор", lambda: db.query_products(scrape_id=scrape_id, cursor=page["next_cursor"],
+                                                        limit=20)),
+        ("api: сбор, бренд и цена", lambda: db.query_products(scrape_id=scrape_id, brand=brand,
+                                                              min_price=20000, limit=20)),
+        ("api: сбор, по убыванию цены", lambda: db.query_products(scrape_id=scrape_id, descending=True,
+                                                                  offset=100, limit=20)),
+        ("api: сбор, сортировка по дате", lambda: db.query_products(scrape_id=scrape_id, sort="timestamp",
+                                                                    limit=20)),
+        ("api: сбор, total с фильтрами", lambda: db.count_products(scrape_id=scrape_id, brand=brand,
+                                                                   max_price=60000)),
+        ("api: вся история, total с фильтрами", lambda: db.count_products(brand=brand, max_price=60000)),
+    ]]
+    history = db.query_products(limit=20)
+    return queries + [
+        ("api: вся история, страница", lambda: db.query_products(limit=20), frozenset([ROWID_SCAN])),
+        ("api: вся история, курсор", lambda: db.query_products(cursor=history["next_cursor"], limit=20),
+         frozenset([ROWID_SCAN])),
+        ("api: вся история, новые первыми", lambda: db.query_products(descending=True, limit=20),
+         frozenset([ROWID_SCAN])),
+        ("api: вся история, бренд и цена", lambda: db.query_products(brand=brand, max_price=60000, limit=20),
+         frozenset([SORT_FOUND])),
+    ]
+
+
+def global_indexes(db: DatabaseManager) -> List[str]:
+    """Индексы products, начинающиеся с цены или бренда, а не со сбора"""
+    with db.read_connection() as conn:
+        names = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'products'")]
+        return [name for name in names
+                if conn.execute(f"PRAGMA index_info({name})").fetchone()[2] in ("price", "brand")]
+
+
+def check(db: DatabaseManager) -> Dict[str, List[Tuple[str, List[str]]]]:
+    """{имя запроса: [(SQL, плохие шаги плана), ...]} только для запросов с плохими шагами"""
+    failures = {}
+    extra = global_indexes(db)
+    if extra:
+        failures["глобальные индексы products"] = [(name, ["замедляет запись сбора (см. миграцию 7)"])
+                                                   for name in extra]
+    for name, call, allowed in hot_queries(db):
+        with traced(db) as statements:
+            call()
+        assert statements, f"{name}: не выполнено ни одного SELECT"
+        bad = [(sql, steps) for sql, steps in
+               ((sql, _bad_steps(explain(db, sql), allowed)) for sql in statements) if steps]
+        if bad:
+            failures[name] = bad
+    return failures
+
+
+def _report(failures: Dict) -> str:
+    lines = []
+    for name, bad in failures.items():
+        for sql, steps in bad:
+            lines.append(f"{name}: {' '.join(sql.split())}")
+            lines.extend(f"    {step}" for step in steps)
+    return "\n".join(lines)
+
+
+def run() -> Dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        db = build_db(Path(tmp) / "plans.db")
+        try:
+            return check(db)
+        finally:
+            db.close()
+
+
+def test_query_plans():
+    failures = run()
+    assert not failures, "\n" + _report(failures)
+
+
+def main():
+    logging.disable(logging.WARNING)
+    failures = run()
+    if failures:
+        print(_report(failures))
+        sys.exit(1)
+    print("Планы горячих запросов без полных проходов и временных B-деревьев")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+Детерминированный генератор данных для бенчмарков: каталог смартфонов
+с перекосом по брендам, история сборов каждые 5 часов за годы (тренд
+удешевления моделей, случайные изменения цены, акции, выход и снятие
+моделей, пропуски в выдаче), база SQLite с этой историей и снимки
+страниц листинга с разметкой, похожей на mvideo.ru.
+
+Одинаковые параметры и seed дают побайтно одинаковые товары и страницы.
+Готовый набор кэшируется в каталоге (dataset.json с параметрами) и
+пересобирается, только если параметры изменились.
+
+Запуск:
+    python -m benchmarks.datagen --skus 2000 --years 1 --out benchmarks/.dataset
+"""
+import argparse
+import html
+import json
+import logging
+import shutil
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from scraper.database import DatabaseManager
+
+SCRAPE_INTERVAL_HOURS = 5
+HISTORY_START = datetime(2022, 1, 1)
+CATEGORY_URL = "https://www.mvideo.ru/smartfony-i-svyaz-10/smartfony-205"
+
+# Бренд: (доля каталога, медианная цена модели)
+BRAND_PROFILE = {
+    "Samsung": (0.24, 38000),
+    "Xiaomi": (0.22, 21000),
+    "Apple": (0.16, 95000),
+    "realme": (0.09, 16000),
+    "HONOR": (0.08, 26000),
+    "POCO": (0.07, 23000),
+    "Tecno": (0.05, 12000),
+    "Infinix": (0.04, 11000),
+    "Nothing": (0.03, 42000),
+    "Google": (0.02, 70000),
+}
+MEMORY = ["4/64GB", "6/128GB", "8/128GB", "8/256GB", "12/256GB", "12/512GB"]
+
+# Вероятности на один сбор
+PRICE_CHANGE_P = 0.03
+PROMO_START_P = 0.004
+MISSING_P = 0.01
+
+PRESETS = {
+    "small": {"skus": 300, "years": 0.25},
+    "default": {"skus": 2000, "years": 1},
+    "large": {"skus": 5000, "years": 3},
+}
+
+
+def scrape_count(years: float) -> int:
+    return int(years * 365 * 24 / SCRAPE_INTERVAL_HOURS)
+
+
+def make_catalog(skus: int, years: float, seed: int = 7) -> List[Dict]:
+    """
+    Модели каталога: бренд (по долям BRAND_PROFILE), базовая цена
+    (логнормально вокруг медианы бренда), годовой тренд цены и номера
+    сборов, между которыми модель продается
+    """
+    rng = np.random.default_rng(seed)
+    scrapes = scrape_count(years)
+    brands = list(BRAND_PROFILE)
+    shares = np.array([share for share, _ in BRAND_PROFILE.values()])
+    picked = rng.choice(len(brands), size=skus, p=shares / shares.sum())
+    # Часть моделей уже в продаже на начало истории, остальные выходят по ходу
+    launch = np.where(rng.random(skus) < 0.6, 0, rng.integers(0, max(scrapes, 1), skus))
+    lifetime = rng.integers(scrape_count(0.75), scrape_count(2.5), skus)
+
+    catalog = []
+    for i in range(skus):
+        brand = brands[picked[i]]
+        memory = MEMORY[int(rng.integers(0, len(MEMORY)))]
+        key = f"smartfon-{brand.lower()}-model-{i}-{memory.replace('/', '-').lower()}-{400000000 + i}"
+        catalog.append({
+            "name": f"Смартфон {brand} Model {i} {memory}",
+            "url": f"https://www.mvideo.ru/products/{key}",
+            "brand": brand,
+            "base_price": float(BRAND_PROFILE[brand][1] * rng.lognormal(0, 0.45)),
+            # Модели дешевеют: от -30% до +5% в год
+            "trend": float(rng.uniform(-0.30, 0.05)),
+            "launch": int(launch[i]),
+            "retire": int(launch[i] + lifetime[i]),
+        })
+    return catalog
+
+
+def iter_history(catalog: List[Dict], years: float, seed: int = 7) -> Iterator[Tuple[str, str, List[Dict]]]:
+    """
+    Сборы каждые SCRAPE_INTERVAL_HOURS: (scrape_id, время, товары в формате
+    extract_product_data). Цена модели - базовая с годовым трендом, случайным
+    блужданием (меняется примерно в 3% сборов) и акциями на 1-4 дня
+    """
+    rng = np.random.default_rng(seed + 1)
+    skus = len(catalog)
+    base = np.array([product["base_price"] for product in catalog])
+    trend = np.array([product["trend"] for product in catalog])
+    launch = np.array([product["launch"] for product in catalog])
+    retire = np.array([product["retire"] for product in catalog])
+    walk = np.zeros(skus)
+    promo_left = np.zeros(skus, dtype=np.int64)
+    promo_depth = np.zeros(skus)
+    per_year = scrape_count(1)
+
+    for n in range(scrape_count(years)):
+        changed = rng.random(skus) < PRICE_CHANGE_P
+        walk += np.where(changed, rng.normal(0, 0.04, skus), 0.0)
+        starting = (promo_left == 0) & (rng.random(skus) < PROMO_START_P)
+        promo_left[starting] = rng.integers(5, 20, int(starting.sum()))
+        promo_depth[starting] = rng.uniform(0.10, 0.25, int(starting.sum()))
+        discount = np.where(promo_left > 0, 1 - promo_depth, 1.0)
+        promo_left[promo_left > 0] -= 1
+
+        age = np.maximum(n - launch, 0) / per_year
+        raw = base * np.exp(trend * age + walk) * discount
+        # Цены как на витрине: 12 999, 24 499
+        prices = np.maximum(np.round(raw / 500) * 500 - 1, 999).astype(np.int64)
+        listed = (launch <= n) & (n < retire) & (rng.random(skus) >= MISSING_P)
+
+        timestamp = (HISTORY_START + timedelta(hours=SCRAPE_INTERVAL_HOURS * n)).isoformat()
+        products = [{
+            "name": catalog[i]["name"],
+            "price": int(prices[i]),
+            "url": catalog[i]["url"],
+            "brand": catalog[i]["brand"],
+            "timestamp": timestamp,
+        } for i in np.flatnonzero(listed)]
+        yield f"scrape_{n:06d}", timestamp, products
+
+
+def fill_database(db: DatabaseManager, catalog: List[Dict], years: float,
+                  seed: int = 7) -> Tuple[int, int, List[Dict]]:
+    """
+    Пишет историю через save_products (сбор - одна транзакция, как у flow)
+    и проставляет сборам время по истории.
+    Возвращает (сборов, строк, товары последнего сбора)
+    """
+    scrapes = rows = 0
+    times = []
+    products = []
+    for scrape_id, timestamp, products in iter_history(catalog, years, seed):
+        if not products:
+            continue
+        db.save_products(products, scrape_id)
+        times.append((timestamp, timestamp, scrape_id))
+        scrapes += 1
+        rows += len(products)
+    with db.get_connection() as conn:
+        conn.executemany("UPDATE scrapes SET started_at = ?, finished_at = ? WHERE scrape_id = ?", times)
+        conn.commit()
+    return scrapes, rows, products
+
+
+def _card(product: Dict) -> str:
+    key = product["url"].rsplit("/", 1)[-1]
+    price = f'{product["price"]:,}'.replace(",", "&nbsp;")
+    return (
+        '<div class="product-cards-layout__item product-cards-layout__item--grid">'
+        '<div class="product-card"><div class="product-card__picture">'
+        f'<a href="/products/{key}"><img src="//img.mvideo.ru/{key}.jpg" alt="{html.escape(product["name"])}"></a>'
+        '</div><div class="product-card__title-line-container">'
+        f'<a class="product-title__text product-title--clamp" href="/products/{key}?from=listing">'
+        f' {html.escape(product["name"])} </a></div>'
+        '<div class="product-rating"><span class="value">4.8</span><span class="count">(1 024)</span></div>'
+        '<div class="product-card__price-block"><div class="price price--grid">'
+        f'<span class="price__main-value"> {price}&nbsp;₽ </span>'
+        f'<span class="price__sale-value">{product["price"] + 1000}&nbsp;₽</span>'
+        '</div></div><script>window.__card && window.__card({"id": 1});</script>'
+        '</div></div>'
+    )
+
+
+# Карточки, на которых бэкенды разбора чаще всего расходятся
+EDGE_CARDS = [
+    # нет цены - пропускается
+    '<div class="product-cards-layout__item"><a class="product-title__text" href="/products/no-price-1">'
+    'Смартфон Nokia 3310</a></div>',
+    # нет ссылки - пропускается
+    '<div class="product-cards-layout__item"><a class="product-title__text">Смартфон Nokia 105</a>'
+    '<span class="price__main-value">1 990 ₽</span></div>',
+    # цена без цифр - пропускается
+    '<div class="product-cards-layout__item"><a class="product-title__text" href="/products/soon-2">'
+    'Смартфон Apple iPhone 17</a><span class="price__main-value">Скоро в продаже</span></div>',
+    # сущности, вложенная разметка в названии и ссылка с параметрами
+    '<div class="product-cards-layout__item"><a class="product-title__text" href="/products/'
+    'smartfon-samsung-galaxy-s25-3?utm_source=x&amp;b=1">Смартфон <b>Samsung</b> Galaxy S25 &laquo;Ultra&raquo; '
+    '12/256&nbsp;GB</a><span class="price__main-value">129&#160;999 ₽</span></div>',
+    # название без слова "Смартфон" и некорректная ссылка
+    '<div class="product-cards-layout__item"><a class="product-title__text" href="/products/bad key!">'
+    'Xiaomi Redmi 14C</a><span class="price__main-value">9 999 ₽</span></div>',
+    '<div class="product-cards-layout__item"><a class="product-title__text" href="/products/redmi-14c-4">'
+    'Xiaomi Redmi 14C</a><span class="price__main-value">9 999 ₽</span></div>',
+]
+
+
+def make_snapshot(products: List[Dict], pages: int, edge_cards: bool = True) -> str:
+    """Страница листинга с шумом вокруг карточек и блоком пагинации"""
+    cards = "".join(_card(product) for product in products)
+    if edge_cards:
+        cards += "".join(EDGE_CARDS)
+    pagination = "".join(
+        f'<li class="pagination__item"><a class="pagination__link" href="?page={page}">{page}</a></li>'
+        for page in range(1, pages + 1)
+    )
+    noise = "".join(f'<div class="banner"><img src="/b/{i}.png"><p>Акция {i}</p></div>' for i in range(30))
+    return (
+        '<!DOCTYPE html><html lang="ru"><head><meta charset="utf-8"><title>Смартфоны</title>'
+        '<script>var state = {"products": [1, 2, 3]};</script>'
+        '<style>.product-card{display:block}</style></head><body>'
+        f'<header>{noise}</header><main><div class="product-cards-layout">{cards}</div>'
+        f'<nav class="pagination"><ul class="pagination__list">{pagination}</ul></nav>'
+        '<a href="/smartfony-i-svyaz-10?page=99">Другая категория</a></main>'
+        f'<footer>{noise}</footer></body></html>'
+    )
+
+
+def write_snapshots(directory: Path, products: List[Dict], cards: int = 72) -> int:
+    """Снимки листинга одного сбора: страницы по cards карточек (page-NNN.html)"""
+    directory.mkdir(parents=True, exist_ok=True)
+    pages = max((len(products) + cards - 1) // cards, 1)
+    for page in range(pages):
+        chunk = products[page * cards:(page + 1) * cards]
+        (directory / f"page-{page + 1:03d}.html").write_text(make_snapshot(chunk, pages), encoding="utf-8")
+    return pages
+
+
+def build_dataset(directory: Path, skus: int, years: float, seed: int = 7, cards: int = 72,
+                  snapshot_pages: int = 40) -> Dict:
+    """
+    Набор данных для бенчмарков в directory: bench.db с историей, snapshots/
+    со страницами листинга и dataset.json с параметрами и размерами.
+    Если набор с теми же параметрами уже собран, он переиспользуется
+    """
+    directory = Path(directory)
+    params = {"skus": skus, "years": years, "seed": seed, "cards": cards, "snapshot_pages": snapshot_pages}
+    manifest_path = directory / "dataset.json"
+    if manifest_path.exists():
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        if manifest.get("params") == params:
+            return manifest
+    if directory.exists():
+        shutil.rmtree(directory)
+    directory.mkdir(parents=True)
+
+    started = time.perf_counter()
+    catalog = make_catalog(skus, years, seed)
+    db = DatabaseManager(str(directory / "bench.db"))
+    scrapes, rows, products = fill_database(db, catalog, years, seed)
+    with db.get_connection() as conn:
+        conn.execute("ANALYZE")
+        conn.commit()
+    db.close()
+    pages = write_snapshots(directory / "snapshots", products[:cards * snapshot_pages], cards)
+
+    manifest = {
+        "params": params,
+        "scrapes": scrapes,
+        "rows": rows,
+        "snapshot_pages": pages,
+        "db_bytes": (directory / "bench.db").stat().st_size,
+        "build_seconds": round(time.perf_counter() - started, 1),
+    }
+    manifest_path.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--preset", choices=PRESETS, default="default")
+    parser.add_argument("--skus", type=int)
+    parser.add_argument("--years", type=float)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", default="benchmarks/.dataset")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    preset = PRESETS[args.preset]
+    manifest = build_dataset(Path(args.out), args.skus or preset["skus"], args.years or preset["years"], args.seed)
+    print(json.dumps(manifest, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
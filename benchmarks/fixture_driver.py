@@ -0,0 +1,118 @@
+"""
+Тестовый драйвер на локальных HTML-файлах листинга: имитирует отрисовку
+и ленивую подгрузку карточек при прокрутке, как страница mvideo.ru.
+Подходит везде, где скрапер ждет PageDriver (scraper.readiness)
+"""
+import html
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from bs4 import BeautifulSoup
+
+from scraper.readiness import CARD_SELECTOR, PAGE_STATE_JS, SCROLL_BY_VIEWPORT_JS
+
+
+def make_listing_html(products: List[Dict], pages: int = 1) -> str:
+    """HTML листинга в разметке mvideo.ru (карточки и блок пагинации)"""
+    cards = "".join(
+        '<div class="product-cards-layout__item">'
+        f'<a class="product-title__text" href="/products/{html.escape(product["url"].rsplit("/", 1)[-1])}">'
+        f'{html.escape(product["name"])}</a>'
+        f'<span class="price__main-value">{product["price"]:,}&nbsp;₽</span>'.replace(",", " ")
+        + '</div>'
+        for product in products
+    )
+    pagination = "".join(f'<a href="?page={page}">{page}</a>' for page in range(1, pages + 1))
+    return (
+        "<html><head><title>Смартфоны</title></head><body>"
+        f'<div class="product-cards-layout">{cards}</div>'
+        f'<div class="pagination">{pagination}</div>'
+        "</body></html>"
+    )
+
+
+class FixtureDriver:
+    """
+    Страница url отдается из fixtures[url] (путь к HTML). Первые batch карточек
+    появляются через first_paint секунд, следующая пачка догружается через
+    batch_delay после того, как прокрутка дошла до низа страницы.
+    beacon_interval - фоновый запрос (аналитика) каждые столько секунд без конца
+    """
+
+    def __init__(self, fixtures: Dict[str, str], first_paint: float = 0.5, batch: int = 24,
+                 batch_delay: float = 0.4, viewport: int = 1080, row_height: int = 420,
+                 per_row: int = 4, beacon_interval: Optional[float] = None):
+        self.fixtures = fixtures
+        self.first_paint = first_paint
+        self.batch = batch
+        self.batch_delay = batch_delay
+        self.viewport = viewport
+        self.row_height = row_height
+        self.per_row = per_row
+        self.beacon_interval = beacon_interval
+        self._soup: Optional[BeautifulSoup] = None
+        self._cards: List = []
+
+    def get(self, url: str) -> None:
+        self._soup = BeautifulSoup(Path(self.fixtures[url]).read_text(encoding="utf-8"), "html.parser")
+        self._cards = [card.extract() for card in self._soup.select(CARD_SELECTOR)]
+        self._container = self._soup.select_one(".product-cards-layout")
+        self._opened = time.monotonic()
+        self._visible = 0
+        self._resources = 8
+        self._pending_at: Optional[float] = None
+        self._scroll_y = 0
+
+    def _advance(self) -> None:
+        now = time.monotonic()
+        if self._visible == 0 and now - self._opened >= self.first_paint:
+            self._load_batch()
+        if self._pending_at is not None and now >= self._pending_at:
+            self._pending_at = None
+            self._load_batch()
+
+    def _load_batch(self) -> None:
+        self._visible = min(len(self._cards), self._visible + self.batch)
+        self._resources += 5
+
+    @property
+    def _beacons(self) -> int:
+        if not self.beacon_interval:
+            return 0
+        return int((time.monotonic() - self._opened) / self.beacon_interval)
+
+    @property
+    def _height(self) -> int:
+        rows = -(-self._visible // self.per_row)
+        return 1500 + rows * self.row_height
+
+    def execute_script(self, script: str, *args):
+        self._advance()
+        if script == PAGE_STATE_JS:
+            return {
+                "ready": "complete" if self._visible else "interactive",
+                "cards": self._visible,
+                "resources": self._resources + (1 if self._pending_at else 0) + self._beacons,
+                "height": self._height,
+            }
+        if script == SCROLL_BY_VIEWPORT_JS:
+            self._scroll_y = min(self._scroll_y + self.viewport, max(self._height - self.viewport, 0))
+            at_bottom = self._scroll_y + self.viewport >= self._height
+            if at_bottom and self._visible and self._visible < len(self._cards) and self._pending_at is None:
+                self._pending_at = time.monotonic() + self.batch_delay
+            return at_bottom
+        if "scrollHeight" in script:
+            return self._height
+        return None
+
+    @property
+    def page_source(self) -> str:
+        self._advance()
+        self._container.clear()
+        for card in self._cards[:self._visible]:
+            self._container.append(card)
+        return str(self._soup)
+
+    def quit(self) -> None:
+        self._soup = None
@@ -0,0 +1,274 @@
+"""
+Набор бенчмарков на детерминированных данных (benchmarks.datagen) с выводом
+в JSON для сравнения между коммитами.
+
+Замеры: save_products, get_last_scrape_data, DataAnalyzer.analyze_by_scrape_id,
+analyze_all_scrapes, extract_product_data, разбор страницы каждым парсером
+и /api/products через Flask test_client (с кэшем ответов и без).
+В JSON попадают коммит, параметры набора данных и для каждого замера
+минимум и медиана по повторам. --compare сравнивает с прошлым прогоном
+минимумы (они меньше всего шумят) и помечает замедления больше --threshold
+процентов; с замедлениями процесс завершается с кодом 1.
+
+Запуск:
+    python -m benchmarks.run --preset small
+    python -m benchmarks.run --compare benchmarks/results/<коммит>.json
+    python -m benchmarks.run --only api_products,analyze_by_scrape_id --repeat 20
+"""
+import argparse
+import io
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from bs4 import BeautifulSoup
+
+from benchmarks.datagen import CATEGORY_URL, PRESETS, build_dataset, iter_history, make_catalog
+from scraper.analyzedata import DataAnalyzer, analyze_all_scrapes
+from scraper.database import DatabaseManager
+from scraper.parsers import PARSERS, extract_product_data, get_parser
+
+RESULTS_DIR = Path("benchmarks/results")
+
+API_QUERIES = [
+    "/api/products",
+    "/api/products?brand=Samsung&min_price=20000&per_page=50",
+    "/api/products?sort=price&order=desc&page=5&per_page=100",
+    "/api/products?scrape_id=all&brand=Apple&max_price=60000",
+]
+
+BENCHMARKS: Dict[str, Callable] = {}
+
+
+def benchmark(func: Callable) -> Callable:
+    BENCHMARKS[func.__name__] = func
+    return func
+
+
+def measure(func: Callable, repeat: int, **extra) -> Dict:
+    """Время func() по repeat повторам, мс"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return {"median_ms": round(statistics.median(timings), 3), "min_ms": round(min(timings), 3),
+            "runs": repeat, **extra}
+
+
+@benchmark
+def save_products(ctx: Dict) -> Dict:
+    """Запись первых сборов истории в пустую базу, сбор - одна транзакция"""
+    history = iter_history(ctx["catalog"], ctx["years"], ctx["seed"])
+    scrapes = [next(history) for _ in range(ctx["repeat"])]
+    rows = sum(len(products) for _, _, products in scrapes)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(str(Path(tmp) / "save.db"))
+        pending = iter(scrapes)
+
+        def save():
+            scrape_id, _, products = next(pending)
+            db.save_products(products, scrape_id)
+
+        started = time.perf_counter()
+        result = measure(save, len(scrapes))
+        result["rows_per_s"] = round(rows / (time.perf_counter() - started))
+        db.close()
+    return result
+
+
+@benchmark
+def get_last_scrape_data(ctx: Dict) -> Dict:
+    db = ctx["db"]
+    return measure(db.get_last_scrape_data, ctx["repeat"], rows=len(db.get_last_scrape_data()))
+
+
+@benchmark
+def analyze_by_scrape_id(ctx: Dict) -> Dict:
+    analyzer = DataAnalyzer(ctx["db"])
+    scrape_id = ctx["db"].get_last_scrape_id()
+    return measure(lambda: analyzer.analyze_by_scrape_id(scrape_id), ctx["repeat"])
+
+
+@benchmark
+def analyze_all_scrapes_full(ctx: Dict) -> Dict:
+    """Полный пересчет анализа всех сборов (analyze_all_scrapes(incremental=False))"""
+    def run():
+        with redirect_stdout(io.StringIO()):
+            analyze_all_scrapes(incremental=False, workers=1, db=ctx["db"])
+    return measure(run, max(ctx["repeat"] // 5, 1), scrapes=ctx["manifest"]["scrapes"])
+
+
+@benchmark
+def extract_product_data_bs4(ctx: Dict) -> Dict:
+    """Разбор уже распарсенных BeautifulSoup карточек, на все снимки"""
+    cards = [card for page in ctx["snapshots"]
+             for card in BeautifulSoup(page, "html.parser").find_all("div", class_="product-cards-layout__item")]
+    timestamp = datetime.now().isoformat()
+
+    def run():
+        for card in cards:
+            extract_product_data(card, timestamp)
+    result = measure(run, ctx["repeat"], cards=len(cards))
+    result["us_per_card"] = round(result["median_ms"] * 1000 / len(cards), 2)
+    return result
+
+
+@benchmark
+def parse_page(ctx: Dict) -> Dict:
+    """Страница листинга целиком (товары и пагинация) каждым доступным парсером"""
+    pages = ctx["snapshots"]
+    results = {}
+    for name in PARSERS:
+        listing_parser = get_parser(name)
+        result = measure(lambda: [listing_parser.parse(page, CATEGORY_URL) for page in pages], ctx["repeat"])
+        results[name] = {"ms_per_page": round(result["median_ms"] / len(pages), 3), **result}
+    return results
+
+
+@benchmark
+def api_products(ctx: Dict) -> Dict:
+    """Запросы /api/products: cold - кэш ответов сброшен перед каждым запросом"""
+    # api.app при импорте открывает рабочую базу data/mvideo_monitoring.db
+    Path("data").mkdir(exist_ok=True)
+    import api.app as api_app
+
+    api_app.db = ctx["db"]
+    client = api_app.app.test_client()
+    for url in API_QUERIES:
+        assert client.get(url).status_code == 200, url
+
+    def cold():
+        for url in API_QUERIES:
+            api_app.cache.clear()
+            client.get(url)
+
+    def warm():
+        for url in API_QUERIES:
+            client.get(url)
+    return {"cold": measure(cold, ctx["repeat"], requests=len(API_QUERIES)),
+            "warm": measure(warm, ctx["repeat"], requests=len(API_QUERIES))}
+
+
+def git_commit() -> Dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": dirty}
+
+
+def _best(results: Dict, prefix: str = "") -> Dict[str, float]:
+    """Плоский словарь {замер: min_ms} с вложенными замерами вида api_products.cold"""
+    best = {}
+    for name, value in results.items():
+        if not isinstance(value, dict):
+            continue
+        if "min_ms" in value:
+            best[prefix + name] = value["min_ms"]
+        else:
+            best.update(_best(value, f"{prefix}{name}."))
+    return best
+
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Печатает сравнение с baseline и возвращает замеры с замедлением"""
+    now, before = _best(current["results"]), _best(baseline["results"])
+    if current["meta"]["dataset"]["params"] != baseline["meta"]["dataset"]["params"]:
+        print("Внимание: прогоны на разных наборах данных, сравнение условное")
+    base_commit = (baseline["meta"].get("commit") or "?")[:10]
+    print(f"\nСравнение с {base_commit}:")
+    regressions = []
+    for name in sorted(now):
+        if name not in before:
+            print(f"  {name:<40} {now[name]:>10.2f} мс  (новый)")
+            continue
+        change = (now[name] / before[name] - 1) * 100 if before[name] else 0.0
+        mark = ""
+        if change > threshold:
+            mark = "  регрессия"
+            regressions.append(name)
+        print(f"  {name:<40} {before[name]:>10.2f} -> {now[name]:>10.2f} мс  ({change:+.1f}%){mark}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--preset", choices=PRESETS, default="default")
+    parser.add_argument("--skus", type=int)
+    parser.add_argument("--years", type=float)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--data", default="benchmarks/.dataset", help="каталог набора данных (кэшируется)")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--only", help="замеры через запятую: " + ", ".join(BENCHMARKS))
+    parser.add_argument("--output", help=f"файл результатов (по умолчанию {RESULTS_DIR}/<коммит>.json)")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=10.0, help="порог замедления, %%")
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        raise SystemExit(f"Неизвестные замеры: {', '.join(unknown)}")
+
+    preset = PRESETS[args.preset]
+    skus, years = args.skus or preset["skus"], args.years or preset["years"]
+    data = Path(args.data)
+    print(f"Набор данных: {skus} SKU x {years} г. в {data}")
+    manifest = build_dataset(data, skus, years, args.seed)
+    print(f"Сборов {manifest['scrapes']}, строк {manifest['rows']:,}, "
+          f"снимков {manifest['snapshot_pages']}, БД {manifest['db_bytes'] / 1024 / 1024:.0f} МБ")
+
+    ctx = {
+        "db": DatabaseManager(str(data / "bench.db")),
+        "catalog": make_catalog(skus, years, args.seed),
+        "snapshots": [path.read_text(encoding="utf-8") for path in sorted((data / "snapshots").glob("*.html"))],
+        "manifest": manifest,
+        "years": years,
+        "seed": args.seed,
+        "repeat": args.repeat,
+    }
+    results = {}
+    for name in names:
+        started = time.perf_counter()
+        results[name] = BENCHMARKS[name](ctx)
+        print(f"{name}: {time.perf_counter() - started:.1f} с - {json.dumps(results[name], ensure_ascii=False)}")
+    ctx["db"].close()
+
+    report = {
+        "meta": {
+            **git_commit(),
+            "timestamp": datetime.now().isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "dataset": manifest,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{(report['meta']['commit'] or 'local')[:10]}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"Результаты: {output}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        if compare(report, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
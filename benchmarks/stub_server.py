@@ -0,0 +1,70 @@
+"""
+Локальный HTTP-сервер с записанными ответами для проверки HTTP-режима сбора
+(scraper.http_fetch) без обращения к mvideo.ru. Умеет задержку ответа
+и заданное число отказов 503 перед успешным ответом
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+
+class StubServer:
+    """
+    responses: путь с query ('/cat-1?page=2') -> HTML. Неизвестный путь - 404.
+    fail_first: путь -> сколько раз ответить 503 перед нормальным ответом
+    """
+
+    def __init__(self, responses: Dict[str, str], latency: float = 0.0,
+                 fail_first: Optional[Dict[str, int]] = None):
+        self.responses = responses
+        self.latency = latency
+        self.fail_first = dict(fail_first or {})
+        self.hits: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        # Обрыв соединения клиентом (в том числе аварийно завершенным) - не ошибка стенда
+        self._server.handle_error = lambda request, client_address: None
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                time.sleep(stub.latency)
+                with stub._lock:
+                    stub.hits[self.path] = stub.hits.get(self.path, 0) + 1
+                    failing = stub.fail_first.get(self.path, 0)
+                    if failing:
+                        stub.fail_first[self.path] = failing - 1
+                body = stub.responses.get(self.path)
+                status = 503 if failing else 200 if body is not None else 404
+                payload = (body if status == 200 else "").encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                if status == 503:
+                    self.send_header("Retry-After", "0")
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._server.shutdown()
+        self._server.server_close()
@@ -1,11 +1,21 @@
 import io
-import json
-from typing import Any, Dict, List
+from typing import Dict, List, Optional
 from prefect import flow, task
 from datetime import timedelta, datetime
-from scraper.main import scrape_mvideo
+from functools import partial
+from scraper.crawler import crawl_categories
+from scraper.http_fetch import fetch_categories
+from scraper.main import configure_driver
+from scraper.parsers import get_parser
+from scraper.alerts import AlertThresholds, dispatch_alerts, make_sink
 from scraper.analyzedata import DataAnalyzer
 from scraper.database import DatabaseManager
+from scraper import metrics
+from scraper.metrics import STAGE_SECONDS, StageTimings, timed
+from scraper.pipeline import stream_scrape
+from scraper.snapshots import snapshot_path
+from scraper.writer import WriteBehindQueue
+import hashlib
 import logging
 import sys
 import uuid
@@ -26,100 +36,167 @@ handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s -
 logger.addHandler(handler)
 
 
-def ensure_utf8(data: Any) -> Any:
-    """Рекурсивно преобразует строки в данных к UTF-8"""
-    if isinstance(data, bytes):
-        try:
-            return data.decode('utf-8')
-        except UnicodeDecodeError:
-            return data.decode('utf-8', errors='replace')
-    elif isinstance(data, str):
-        return data
-    elif isinstance(data, dict):
-        return {ensure_utf8(k): ensure_utf8(v) for k, v in data.items()}
-    elif isinstance(data, (list, tuple)):
-        return [ensure_utf8(item) for item in data]
-    return data
-
-
-@task(retries=2, retry_delay_seconds=60)
-def scrape_task(url: str):
-    """Задача для скрапинга данных"""
+# Окно, в котором перезапуск flow продолжает прерванный сбор тех же категорий
+# (и в котором живет кэш scrape_task), вместо того чтобы начинать новый
+RESUME_WINDOW = timedelta(hours=1)
+
+
+def scrape_cache_key(context, parameters: Dict) -> str:
+    """Ключ кэша scrape_task: категории и окно RESUME_WINDOW. scrape_id входит
+    в ключ, чтобы кэш не отдал новому сбору статистику чужого"""
+    urls = hashlib.sha1("\n".join(parameters["urls"]).encode()).hexdigest()[:16]
+    window = int(datetime.now().timestamp() // RESUME_WINDOW.total_seconds())
+    return f"scrape-{urls}-{window}-{parameters['scrape_id']}"
+
+
+@task(retries=2, retry_delay_seconds=60, cache_key_fn=scrape_cache_key, cache_expiration=RESUME_WINDOW)
+def scrape_task(urls: List[str], scrape_id: str, pool_size: int = 4, headless: bool = False,
+                lean: bool = True, fetch_mode: str = "browser", parser: str = "auto",
+                chunk_size: int = 1, snapshot: Optional[str] = None) -> Dict:
+    """Задача для скрапинга данных: все страницы категорий через пул браузеров
+    (fetch_mode='browser') или по HTTP без браузера (fetch_mode='http').
+    parser - разбор HTML: 'lxml', 'bs4' или 'auto' (lxml, если установлен).
+    Товары по мере сбора пишутся в БД пачками по chunk_size (ScrapePipeline)
+    вместе с отметками страниц; возвращается статистика сбора, посчитанная на лету.
+    Повтор задачи или перезапуск flow собирает только страницы без отметок.
+    snapshot - путь снимка сбора (NDJSON, scraper.snapshots) или None.
+    Отдельные упавшие страницы пропускаются, задача падает, только если не
+    удалось собрать ни одной"""
     try:
-        return scrape_mvideo(url)
+        listing_parser = get_parser(parser)
+        if fetch_mode == "http":
+            crawl = partial(fetch_categories, urls, concurrency=pool_size, parser=listing_parser)
+        elif fetch_mode == "browser":
+            crawl = partial(crawl_categories, urls, pool_size=pool_size, parser=listing_parser,
+                            driver_factory=partial(configure_driver, headless=headless, lean=lean))
+        else:
+            raise ValueError(f"Неизвестный режим сбора: {fetch_mode}")
+        with timed(STAGE_SECONDS, "scrape"):
+            result, stats = stream_scrape(DatabaseManager(), scrape_id, crawl, chunk_size, snapshot=snapshot)
+        if result.failed:
+            logger.warning(f"Не собрано страниц: {len(result.failed)} из {result.pages + len(result.failed)}")
+        if not result.pages and not result.resumed_pages:
+            raise RuntimeError("Не удалось собрать ни одной страницы")
+        return stats
     except Exception as e:
         logger.error(f"Ошибка при скрапинге: {str(e)}")
         raise
 
 
 @task
-def save_task(data: Dict, filename: str):
-    """Задача для сохранения данных с обработкой кодировки"""
+def diff_task(scrape_id: str, drop_pct: Optional[float], rise_pct: Optional[float], sinks: List[str]) -> int:
+    """Сравнение с предыдущим сбором (price_events) и оповещения по порогам"""
+    db = DatabaseManager()
+    counts = db.diff_scrapes(scrape_id)
+    logger.info(f"События сбора: {counts}")
+    if not counts:
+        return 0
+    thresholds = AlertThresholds(drop_pct=drop_pct, rise_pct=rise_pct)
+    with timed(STAGE_SECONDS, "alerts"):
+        return dispatch_alerts(db, scrape_id, thresholds, [make_sink(spec) for spec in sinks])
+
+
+def _save_timings(db: DatabaseManager, scrape_id: str, stages: StageTimings) -> None:
+    """Время этапов сбора в scrape_timings; ошибка записи не роняет flow"""
+    timings = stages.totals()
+    if not timings:
+        return
     try:
-
-        processed_data = ensure_utf8(data)
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(processed_data, f, ensure_ascii=False, indent=4)
-        logger.info(f"Данные успешно сохранены в {filename}")
-        return filename
+        db.save_stage_timings(scrape_id, timings)
+        logger.info("Время этапов: " + ", ".join(
+            f"{stage} {seconds:.1f} с" for stage, (seconds, _) in sorted(timings.items(), key=lambda t: -t[1][0])))
     except Exception as e:
-        logger.error(f"Ошибка при сохранении файла: {str(e)}")
-        raise
+        logger.error(f"Не удалось сохранить время этапов: {str(e)}")
 
-def save_products(self, products: list, scrape_id: str):
-    with self.get_connection() as conn:
-        cursor = conn.cursor()
-        try:
-            cursor.execute("BEGIN TRANSACTION")
-            for product in products:
-                cursor.execute(
-                    "INSERT INTO products (...) VALUES (...)",
-                    (...,)
-                )
-            conn.commit()
-        except Exception as e:
-            conn.rollback()
-            raise
 
 @task
-def analyze_task(data: List[Dict]):
-    """Задача для анализа данных"""
+def analyze_task(scrape_id: str, stats: Optional[Dict] = None):
+    """Задача для анализа данных: статистика, посчитанная при записи сбора,
+    а без нее - агрегация по БД"""
+    if stats:
+        return stats
     try:
         analyzer = DataAnalyzer()
-        return analyzer.analyze_last_scrape()
+        return analyzer.analyze_by_scrape_id(scrape_id)
     except Exception as e:
         logger.error(f"Ошибка при анализе данных: {str(e)}")
         raise
 
 
 @flow(name="MVideo Price Monitoring", log_prints=True)
-def monitor_prices(url: str = "https://www.mvideo.ru/smartfony-i-svyaz-10/smartfony-205"):
-    """Основной flow для мониторинга цен"""
+def monitor_prices(url: str = "https://www.mvideo.ru/smartfony-i-svyaz-10/smartfony-205",
+                   category_urls: Optional[List[str]] = None,
+                   pool_size: int = 4,
+                   headless: bool = False,
+                   lean: bool = True,
+                   fetch_mode: str = "browser",
+                   parser: str = "auto",
+                   alert_drop_pct: Optional[float] = 10.0,
+                   alert_rise_pct: Optional[float] = None,
+                   alert_sinks: Optional[List[str]] = None,
+                   collect_metrics: bool = True,
+                   snapshot_dir: Optional[str] = None):
+    """Основной flow для мониторинга цен.
+    category_urls - список категорий (по умолчанию одна категория url),
+    fetch_mode - 'browser' (Chrome) или 'http' (серверный HTML без браузера),
+    parser - разбор HTML: 'lxml', 'bs4' или 'auto',
+    pool_size - число одновременно открытых браузеров / HTTP-запросов,
+    headless - без окна браузера, lean - без картинок и шрифтов.
+    alert_*_pct - пороги оповещений о падении/росте цены (None - отключено),
+    alert_sinks - получатели: 'log' (по умолчанию), 'file:<путь>', URL вебхука,
+    collect_metrics - время этапов (scraper.metrics), итог пишется в scrape_timings,
+    snapshot_dir - каталог для снимков сборов (<scrape_id>.ndjson.zst), None - без снимков"""
     logger.info("Starting MVideo price monitoring flow")
+    metrics.configure(collect_metrics)
     db = DatabaseManager()
+    writer = WriteBehindQueue(db)
+    scrape_id = None
 
-    try:
-        # Генерируем уникальный ID для этого сбора данных
-        scrape_id = str(uuid.uuid4())
-
-        # 1. Сбор данных
-        scraped_data = scrape_task(url)
-
-        # 2. Сохранение в БД
-        db.save_products(scraped_data, scrape_id)
-
-        # 3. Анализ данных
-        analysis_result = analyze_task(scraped_data)
-
-        # 4. Сохранение результатов анализа
-        db.save_analysis(analysis_result, scrape_id)
-
-        logger.info(f"Flow completed. Scrape ID: {scrape_id}")
-        return analysis_result
+    with StageTimings() as stages:
+        try:
+            # Прерванный сбор тех же категорий в пределах RESUME_WINDOW продолжаем,
+            # иначе генерируем уникальный ID для нового сбора данных
+            urls = category_urls or [url]
+            since = (datetime.now() - RESUME_WINDOW).isoformat()
+            scrape_id = db.find_resumable_scrape(", ".join(urls), since)
+            if scrape_id:
+                logger.info(f"Найден прерванный сбор {scrape_id}, продолжаем его")
+            else:
+                scrape_id = str(uuid.uuid4())
+                db.start_scrape(scrape_id, ", ".join(urls))
+
+            # 1-2. Сбор данных с потоковой записью в БД пачками (и в снимок)
+            snapshot = str(snapshot_path(scrape_id, snapshot_dir)) if snapshot_dir else None
+            scrape_stats = scrape_task(urls, scrape_id, pool_size, headless, lean, fetch_mode, parser,
+                                       snapshot=snapshot)
+            db.finish_scrape(scrape_id)
+
+            # 3. События изменения цен и оповещения сразу после записи сбора.
+            # Сбой оповещений не должен ронять сам сбор
+            try:
+                diff_task(scrape_id, alert_drop_pct, alert_rise_pct, alert_sinks or ["log"])
+            except Exception as e:
+                logger.error(f"Ошибка сравнения сборов и оповещений: {str(e)}")
+
+            # 4. Анализ данных: статистика уже посчитана при записи, второго чтения из БД нет
+            analysis_result = analyze_task(scrape_id, scrape_stats)
+
+            # 5. Сохранение результатов анализа
+            writer.submit_analysis(analysis_result, scrape_id)
+            writer.close()
+
+            logger.info(f"Flow completed. Scrape ID: {scrape_id}")
+            return analysis_result
 
-    except Exception as e:
-        logger.error(f"Ошибка в основном flow: {str(e)}")
-        raise
+        except Exception as e:
+            logger.error(f"Ошибка в основном flow: {str(e)}")
+            if scrape_id:
+                db.finish_scrape(scrape_id, status="failed")
+            raise
+        finally:
+            writer.close()
+            if scrape_id:
+                _save_timings(db, scrape_id, stages)
 
 
 if __name__ == "__main__":
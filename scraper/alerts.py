@@ -0,0 +1,121 @@
+import json
+import logging
+import urllib.request
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from scraper.database import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+
+class AlertThresholds:
+    """
+    Пороги оповещений по событиям price_events.
+    drop_pct / rise_pct - минимальное падение / рост цены в процентах
+    (None - не оповещать), min_change - минимальное изменение в рублях,
+    new / removed - оповещать о появлении и пропаже товаров
+    """
+
+    def __init__(self, drop_pct: Optional[float] = 10.0, rise_pct: Optional[float] = None,
+                 min_change: int = 0, new: bool = False, removed: bool = False):
+        self.drop_pct = drop_pct
+        self.rise_pct = rise_pct
+        self.min_change = min_change
+        self.new = new
+        self.removed = removed
+
+    def matches(self, event: Dict) -> bool:
+        if event["event_type"] == "new":
+            return self.new
+        if event["event_type"] == "removed":
+            return self.removed
+        change = event["new_price"] - event["old_price"]
+        if abs(change) < self.min_change or event["change_pct"] is None:
+            return False
+        if change < 0:
+            return self.drop_pct is not None and -event["change_pct"] >= self.drop_pct
+        return self.rise_pct is not None and event["change_pct"] >= self.rise_pct
+
+
+class AlertSink:
+    """Получатель оповещений. Наследники реализуют send"""
+
+    def send(self, alerts: List[Dict]) -> None:
+        raise NotImplementedError
+
+
+class LogSink(AlertSink):
+    """Оповещения в лог (по умолчанию, если получатель не задан)"""
+
+    def send(self, alerts: List[Dict]) -> None:
+        for alert in alerts:
+            change = f" ({alert['change_pct']}%)" if alert["change_pct"] is not None else ""
+            logger.warning(f"Оповещение: {alert['event_type']} {alert.get('name') or alert['url']} "
+                           f"{alert['old_price']} -> {alert['new_price']}{change}")
+
+
+class FileSink(AlertSink):
+    """Оповещения дописываются в файл построчно (NDJSON)"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+
+    def send(self, alerts: List[Dict]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            for alert in alerts:
+                f.write(json.dumps(alert, ensure_ascii=False) + "\n")
+
+
+class WebhookSink(AlertSink):
+    """Оповещения одним POST-запросом с JSON {"alerts": [...]}"""
+
+    def __init__(self, url: str, timeout: float = 10):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, alerts: List[Dict]) -> None:
+        body = json.dumps({"alerts": alerts}, ensure_ascii=False).encode("utf-8")
+        request = urllib.request.Request(
+            self.url, data=body, method="POST",
+            headers={"Content-Type": "application/json; charset=utf-8"}
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+def make_sink(spec: Optional[str]) -> AlertSink:
+    """
+    Получатель по строке настройки: 'log', 'file:<путь>',
+    'http(s)://...' - вебхук
+    """
+    if not spec or spec == "log":
+        return LogSink()
+    if spec.startswith("file:"):
+        return FileSink(spec[len("file:"):])
+    if spec.startswith(("http://", "https://")):
+        return WebhookSink(spec)
+    raise ValueError(f"Неизвестный получатель оповещений: {spec}")
+
+
+def dispatch_alerts(db: DatabaseManager, scrape_id: str, thresholds: AlertThresholds,
+                    sinks: List[AlertSink]) -> int:
+    """
+    Отбирает события сбора по порогам и отправляет их всем получателям.
+    Ошибка одного получателя не мешает остальным. Возвращает число оповещений
+    """
+    alerts = [event for event in db.get_price_events(scrape_id) if thresholds.matches(event)]
+    if not alerts:
+        return 0
+    sent_at = datetime.now().isoformat()
+    for alert in alerts:
+        alert["sent_at"] = sent_at
+    for sink in sinks:
+        try:
+            sink.send(alerts)
+        except Exception as e:
+            logger.error(f"Получатель {type(sink).__name__} не принял оповещения: {e}")
+    logger.info(f"Отправлено {len(alerts)} оповещений по сбору {scrape_id}")
+    return len(alerts)
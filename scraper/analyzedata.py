@@ -1,50 +1,51 @@
+import argparse
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import datetime
-from typing import Dict
 import sqlite3
+from typing import Dict, List, Optional, Tuple
+from scraper.archive import ARCHIVE_DIR, ArchiveReader
 from scraper.database import DatabaseManager
+from scraper.metrics import STAGE_SECONDS, timed
+
+# Начиная с этого числа сборов pandas-анализ раздается пулу процессов
+PARALLEL_THRESHOLD = 50
+# Максимум scrape_id в одном IN (...) для SQL-агрегации
+SQL_BATCH_SIZE = 500
 
 
 class DataAnalyzer:
-    def __init__(self, db_manager: DatabaseManager = None):
+    def __init__(self, db_manager: DatabaseManager = None, use_sql: bool = True):
         self.db = db_manager if db_manager else DatabaseManager()
+        # Статистика считается агрегатами SQL; pandas остается запасным путем
+        self.use_sql = use_sql
 
     def analyze_last_scrape(self) -> Dict:
         """
         Анализирует данные последнего сбора из базы данных
         Возвращает статистику без генерации графиков
         """
-        try:
-            products = self.db.get_last_scrape_data()
-            if not products:
-                return {}
-
-            df = pd.DataFrame(products)
-            return self._process_data(df)
-
-        except Exception as e:
-            print(f"Ошибка при анализе данных: {e}")
+        scrape_id = self.db.get_last_scrape_id()
+        if not scrape_id:
             return {}
+        return self.analyze_by_scrape_id(scrape_id)
 
+    @timed(STAGE_SECONDS, "analysis")
     def analyze_by_scrape_id(self, scrape_id: str) -> Dict:
         """
         Анализирует данные по конкретному scrape_id
         """
+        if self.use_sql:
+            try:
+                return self.compute_stats_sql([scrape_id]).get(scrape_id, {})
+            except sqlite3.Error as e:
+                print(f"Ошибка SQL-агрегации, используем pandas: {e}")
+        return self._analyze_with_pandas(scrape_id)
+
+    def _analyze_with_pandas(self, scrape_id: str) -> Dict:
         try:
-            conn = sqlite3.connect(self.db.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-
-            cursor.execute("""
-                SELECT name, price, url, timestamp 
-                FROM products 
-                WHERE scrape_id = ?
-            """, (scrape_id,))
-
-            products = [dict(row) for row in cursor.fetchall()]
-            conn.close()
-
+            products = self.db.get_scrape_data(scrape_id)
             if not products:
                 return {}
 
@@ -54,60 +55,173 @@ class DataAnalyzer:
         except Exception as e:
             print(f"Ошибка при анализе данных: {e}")
             return {}
-        finally:
-            conn.close()
+
+    def compute_stats_sql(self, scrape_ids: Optional[List[str]] = None) -> Dict[str, Dict]:
+        """
+        Статистика по сборам одним GROUP BY scrape_id. Для таблицы products
+        запрос целиком читается из индекса (scrape_id, brand, price)
+        """
+        if scrape_ids is None:
+            return self._aggregate("", ())
+
+        stats = {}
+        for start in range(0, len(scrape_ids), SQL_BATCH_SIZE):
+            batch = scrape_ids[start:start + SQL_BATCH_SIZE]
+            placeholders = ", ".join("?" * len(batch))
+            stats.update(self._aggregate(f"WHERE scrape_id IN ({placeholders})", tuple(batch)))
+        return stats
+
+    def _aggregate(self, where: str, params: tuple) -> Dict[str, Dict]:
+        rows = self.db.execute_query(f"""
+            SELECT
+                scrape_id,
+                COUNT(*) AS total_products,
+                MIN(price) AS min_price,
+                MAX(price) AS max_price,
+                SUM(price) AS price_sum,
+                COUNT(DISTINCT brand) AS unique_brands
+            FROM {self.db.products_table}
+            {where}
+            GROUP BY scrape_id
+        """, params)
+        timestamp = datetime.now().isoformat()
+        return {
+            row["scrape_id"]: {
+                "total_products": row["total_products"],
+                "min_price": row["min_price"],
+                "max_price": row["max_price"],
+                "avg_price": int(row["price_sum"] / row["total_products"]),
+                "unique_brands": row["unique_brands"],
+                "timestamp": timestamp
+            }
+            for row in rows
+        }
+
+    @timed(STAGE_SECONDS, "analysis")
+    def analyze_many(self, scrape_ids: List[str], workers: Optional[int] = None) -> List[Tuple[str, Dict]]:
+        """
+        Анализирует несколько сборов: одним SQL-запросом, а при его ошибке
+        через pandas (большие бэкфиллы раздаются пулу из workers процессов;
+        SQL-путь пул не использует)
+        """
+        if self.use_sql:
+            try:
+                stats = self.compute_stats_sql(scrape_ids)
+                return [(scrape_id, stats.get(scrape_id, {})) for scrape_id in scrape_ids]
+            except sqlite3.Error as e:
+                print(f"Ошибка SQL-агрегации, используем pandas: {e}")
+
+        if len(scrape_ids) >= PARALLEL_THRESHOLD and workers != 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(self.db.db_path,)) as pool:
+                return list(pool.map(_analyze_in_worker, scrape_ids, chunksize=16))
+        return [(scrape_id, self._analyze_with_pandas(scrape_id)) for scrape_id in scrape_ids]
+
+    @timed(STAGE_SECONDS, "long_range_stats")
+    def long_range_stats(self, start: Optional[str] = None, end: Optional[str] = None,
+                         archive_dir: str = ARCHIVE_DIR) -> pd.DataFrame:
+        """
+        Статистика цен по сборам за произвольный период: архив Parquet
+        и живая БД читаются вместе колоночно, агрегаты считаются векторно
+        """
+        df = ArchiveReader(self.db, archive_dir).load(start, end)
+        if df.empty:
+            return pd.DataFrame()
+        stats = df.groupby("scrape_id").agg(
+            timestamp=("timestamp", "min"),
+            total_products=("price", "size"),
+            min_price=("price", "min"),
+            max_price=("price", "max"),
+            avg_price=("price", "mean"),
+            unique_brands=("brand", "nunique"),
+        )
+        stats["avg_price"] = stats["avg_price"].astype(int)
+        return stats.sort_values("timestamp").reset_index()
+
     def _process_data(self, df: pd.DataFrame) -> Dict:
         """Общая обработка данных без генерации графиков"""
         df['price'] = pd.to_numeric(df['price'], errors='coerce')
         df = df.dropna(subset=['price'])
-        df['brand'] = df['name'].str.split().str[0]
+        if 'brand' not in df:
+            df['brand'] = df['name'].str.split().str[0]
 
         return {
             "total_products": len(df),
             "min_price": int(df['price'].min()),
             "max_price": int(df['price'].max()),
-            "avg_price": int(df['price'].mean()),
-            "unique_brands": df['brand'].nunique(),
+            # Как и в SQL-пути: точная сумма, деленная на количество
+            "avg_price": int(int(df['price'].sum()) / len(df)),
+            "unique_brands": int(df['brand'].nunique()),
             "timestamp": datetime.now().isoformat()
         }
 
 
-def analyze_all_scrapes():
-    """Анализирует все имеющиеся в БД сборы данных без графиков"""
-    db = DatabaseManager()
-    analyzer = DataAnalyzer(db)
+_worker_analyzer = None
 
-    try:
-        conn = sqlite3.connect(db.db_path)
-        cursor = conn.cursor()
 
-        cursor.execute("SELECT DISTINCT scrape_id FROM products ORDER BY timestamp DESC")
-        scrape_ids = [row[0] for row in cursor.fetchall()]
-        conn.close()
+def _init_worker(db_path: str) -> None:
+    """Один DataAnalyzer на процесс пула"""
+    global _worker_analyzer
+    _worker_analyzer = DataAnalyzer(DatabaseManager(db_path))
+
+
+def _analyze_in_worker(scrape_id: str) -> Tuple[str, Dict]:
+    return scrape_id, _worker_analyzer._analyze_with_pandas(scrape_id)
+
+
+def analyze_all_scrapes(incremental: bool = True, workers: Optional[int] = None,
+                        db: DatabaseManager = None) -> int:
+    """Анализирует сборы данных без графиков.
+    В инкрементальном режиме берутся только сборы без результата анализа,
+    статистика по всем считается одним SQL-запросом. workers - число процессов
+    только для запасного пути через pandas (при ошибке SQL-агрегации или
+    use_sql=False), на SQL-путь не влияет. Возвращает число обработанных сборов"""
+    db = db if db else DatabaseManager()
+
+    try:
+        if incremental:
+            scrape_ids = db.get_pending_analysis()
+        else:
+            scrape_ids = [scrape["scrape_id"] for scrape in db.list_scrapes(status="completed")]
 
         print(f"Найдено {len(scrape_ids)} сборов данных для анализа...")
+        if not scrape_ids:
+            db.advance_analysis_watermark()
+            return 0
 
-        for scrape_id in scrape_ids:
-            print(f"\nАнализирую сбор данных: {scrape_id}")
+        analyzed = DataAnalyzer(db).analyze_many(scrape_ids, workers=workers)
 
-            results = analyzer.analyze_by_scrape_id(scrape_id)
+        results = [(scrape_id, result) for scrape_id, result in analyzed if result]
+        # Пишет только основной процесс, одной транзакцией
+        db.save_analyses(results)
+        db.advance_analysis_watermark()
 
-            if results:
-                db.save_analysis(results, scrape_id)
-                print("Статистика:")
-                for key, value in results.items():
-                    print(f"  {key}: {value}")
+        for scrape_id, result in results:
+            print(f"\nАнализирую сбор данных: {scrape_id}")
+            print("Статистика:")
+            for key, value in result.items():
+                print(f"  {key}: {value}")
+        return len(results)
 
     except Exception as e:
         print(f"Ошибка при анализе всех сборов данных: {e}")
+        return 0
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Анализ сборов данных MVideo")
+    parser.add_argument("--full", action="store_true",
+                        help="Переанализировать все сборы, а не только новые")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Число процессов для бэкфилла через pandas, если SQL-агрегация "
+                             "недоступна (1 - без пула)")
+    args = parser.parse_args()
+
     analyzer = DataAnalyzer()
 
     last_scrape_stats = analyzer.analyze_last_scrape()
     print("Статистика последнего сбора данных:")
     print(last_scrape_stats)
 
-    analyze_all_scrapes()
-    print("\nАнализ всех сборов данных завершен!")
\ No newline at end of file
+    analyze_all_scrapes(incremental=not args.full, workers=args.workers)
+    print("\nАнализ всех сборов данных завершен!")
@@ -0,0 +1,172 @@
+import argparse
+import logging
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import pandas as pd
+
+from scraper.database import DatabaseManager, PRODUCT_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = "data/archive"
+
+
+def _month_path(archive_dir: Path, month: str) -> Path:
+    return archive_dir / f"products_{month}.parquet"
+
+
+def archive_old_scrapes(db: DatabaseManager, older_than_days: int = 90,
+                        archive_dir: str = ARCHIVE_DIR, vacuum: bool = False) -> int:
+    """
+    Переносит сборы старше older_than_days в помесячные Parquet-файлы
+    и удаляет их строки из SQLite. Сбор получает статус 'archived'.
+    Возвращает число перенесенных сборов
+    """
+    if db.storage_mode == "delta":
+        logger.info("БД в дельта-режиме: история уже хранится компактно, архивация не нужна")
+        return 0
+
+    archive_path = Path(archive_dir)
+    archive_path.mkdir(parents=True, exist_ok=True)
+    cutoff = (datetime.now() - timedelta(days=older_than_days)).isoformat()
+    scrapes = db.execute_query("""
+        SELECT scrape_id, substr(started_at, 1, 7) AS month FROM scrapes
+        WHERE started_at < ? AND status IN ('completed', 'failed')
+        ORDER BY seq
+    """, (cutoff,))
+
+    months = {}
+    for scrape in scrapes:
+        months.setdefault(scrape["month"], []).append(scrape["scrape_id"])
+
+    archived = 0
+    for month, scrape_ids in months.items():
+        frame = _read_scrapes(db, scrape_ids)
+        path = _month_path(archive_path, month)
+        if path.exists():
+            # Повторная архивация после сбоя не должна дублировать строки
+            existing = pd.read_parquet(path)
+            frame = pd.concat([existing[~existing["scrape_id"].isin(scrape_ids)], frame], ignore_index=True)
+        tmp_path = path.with_suffix(".parquet.tmp")
+        frame.to_parquet(tmp_path, index=False, compression="zstd")
+        os.replace(tmp_path, path)
+
+        # Из SQLite удаляем только после того, как файл записан
+        placeholders = ", ".join("?" * len(scrape_ids))
+        with db.get_connection() as conn:
+            conn.execute(f"DELETE FROM products WHERE scrape_id IN ({placeholders})", scrape_ids)
+            conn.execute(f"UPDATE scrapes SET status = 'archived' WHERE scrape_id IN ({placeholders})",
+                         scrape_ids)
+            conn.commit()
+        archived += len(scrape_ids)
+        logger.info(f"Архивировано {len(scrape_ids)} сборов за {month} в {path}")
+
+    if vacuum and archived:
+        with db.get_connection() as conn:
+            conn.execute("VACUUM")
+            # В WAL сжатая копия базы сначала попадает в журнал: место на диске
+            # освобождается только после checkpoint
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return archived
+
+
+def _read_scrapes(db: DatabaseManager, scrape_ids: List[str]) -> pd.DataFrame:
+    frames = []
+    with db.read_connection() as conn:
+        for start in range(0, len(scrape_ids), 500):
+            batch = scrape_ids[start:start + 500]
+            placeholders = ", ".join("?" * len(batch))
+            frames.append(pd.read_sql(
+                f"SELECT {', '.join(PRODUCT_COLUMNS)} FROM products WHERE scrape_id IN ({placeholders})",
+                conn, params=batch
+            ))
+    return pd.concat(frames, ignore_index=True)
+
+
+class ArchiveReader:
+    """
+    Единое колоночное чтение истории цен: Parquet-архив (memory-mapped)
+    плюс живые строки из SQLite
+    """
+
+    def __init__(self, db: DatabaseManager, archive_dir: str = ARCHIVE_DIR):
+        self.db = db
+        self.archive_dir = Path(archive_dir)
+
+    def _read_archive(self, start: Optional[str], end: Optional[str], columns: List[str],
+                      filters: Optional[List[tuple]] = None) -> List[pd.DataFrame]:
+        """Строки помесячных Parquet-файлов с timestamp в [start, end)"""
+        frames = []
+        for path in sorted(self.archive_dir.glob("products_*.parquet")):
+            month = path.stem.split("_", 1)[1]
+            # Месяцы целиком вне диапазона не открываем
+            if (start and month < start[:7]) or (end and month > end[:7]):
+                continue
+            month_filters = list(filters or [])
+            if start:
+                month_filters.append(("timestamp", ">=", start))
+            if end:
+                month_filters.append(("timestamp", "<", end))
+            frames.append(pd.read_parquet(path, columns=columns, memory_map=True,
+                                          filters=month_filters or None))
+        return frames
+
+    def load(self, start: Optional[str] = None, end: Optional[str] = None,
+             columns: Sequence[str] = ("scrape_id", "timestamp", "brand", "price")) -> pd.DataFrame:
+        """Товары с timestamp в [start, end) из архива и живой БД"""
+        columns = list(columns)
+        frames = self._read_archive(start, end, columns)
+
+        conditions = []
+        params = []
+        if start:
+            conditions.append("timestamp >= ?")
+            params.append(start)
+        if end:
+            conditions.append("timestamp < ?")
+            params.append(end)
+        query = f"SELECT {', '.join(columns)} FROM {self.db.products_table}"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        with self.db.read_connection() as conn:
+            frames.append(pd.read_sql(query, conn, params=params))
+
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(frames, ignore_index=True)
+
+    def price_history(self, urls: List[str], date_from: Optional[str] = None,
+                      date_to: Optional[str] = None) -> Dict[str, List[Dict]]:
+        """
+        DatabaseManager.get_price_history с точками архивированных сборов:
+        их строк в SQLite уже нет, без архива ряд обрывается на границе архивации
+        """
+        history = self.db.get_price_history(urls, date_from, date_to)
+        if not urls:
+            return history
+        columns = ["url", "timestamp", "price", "scrape_id"]
+        frames = [frame for frame in self._read_archive(date_from, date_to, columns, [("url", "in", list(urls))])
+                  if not frame.empty]
+        if not frames:
+            return history
+
+        archived = {url: [] for url in urls}
+        frame = pd.concat(frames, ignore_index=True).sort_values(["url", "timestamp"])
+        for url, timestamp, price, scrape_id in frame.itertuples(index=False, name=None):
+            archived[url].append({"timestamp": timestamp, "price": int(price), "scrape_id": scrape_id})
+        # Архивируются сборы старше живых, поэтому архивные точки идут первыми
+        return {url: archived[url] + points for url, points in history.items()}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Архивация старых сборов в Parquet")
+    parser.add_argument("--days", type=int, default=90, help="Архивировать сборы старше N дней")
+    parser.add_argument("--vacuum", action="store_true", help="Сжать файл БД после переноса")
+    args = parser.parse_args()
+    count = archive_old_scrapes(DatabaseManager(), args.days, vacuum=args.vacuum)
+    print(f"Архивировано сборов: {count}")
@@ -0,0 +1,226 @@
+import logging
+import queue
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from scraper.main import configure_driver, load_listing
+from scraper.metrics import PAGES, inc
+from scraper.parsers import ListingParser, get_parser
+
+logger = logging.getLogger(__name__)
+
+# Потолок страниц в одной категории на случай ошибочного разбора пагинации
+MAX_PAGES = 50
+
+
+class RateLimiter:
+    """Не чаще одного запроса в min_interval секунд (плюс случайный разброс),
+    чтобы сессия не выглядела для сайта как робот с ровным ритмом"""
+
+    def __init__(self, min_interval: float = 3.0, jitter: float = 0.5):
+        self.min_interval = min_interval
+        self.jitter = jitter
+        self._last = 0.0
+
+    def wait(self) -> None:
+        delay = self._last + self.min_interval + random.uniform(0, self.jitter) - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self._last = time.monotonic()
+
+
+class BrowserSession:
+    """Долгоживущий драйвер с собственным ограничителем частоты запросов"""
+
+    def __init__(self, driver, limiter: RateLimiter):
+        self.driver = driver
+        self.limiter = limiter
+        self.pages = 0
+
+    def close(self) -> None:
+        try:
+            self.driver.quit()
+        except Exception as e:
+            logger.error(f"Ошибка при закрытии драйвера: {e}")
+
+
+class BrowserPool:
+    """
+    Ограниченный пул долгоживущих сессий браузера. Сессии создаются лениво,
+    не больше size одновременно. Сессия, на которой страница упала,
+    закрывается и при следующем запросе заменяется новой
+    """
+
+    def __init__(self, size: int = 4, driver_factory: Callable = configure_driver,
+                 min_interval: float = 3.0):
+        self.size = size
+        self.driver_factory = driver_factory
+        self.min_interval = min_interval
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._sessions: List[BrowserSession] = []
+        self.created = 0
+
+    @contextmanager
+    def session(self):
+        """Выдает свободную сессию (ждет, если все заняты)"""
+        self._slots.acquire()
+        try:
+            try:
+                session = self._idle.get_nowait()
+            except queue.Empty:
+                session = BrowserSession(self.driver_factory(), RateLimiter(self.min_interval))
+                with self._lock:
+                    self._sessions.append(session)
+                    self.created += 1
+            try:
+                yield session
+            except Exception:
+                self._discard(session)
+                raise
+            self._idle.put(session)
+        finally:
+            self._slots.release()
+
+    def _discard(self, session: BrowserSession) -> None:
+        with self._lock:
+            if session in self._sessions:
+                self._sessions.remove(session)
+        session.close()
+
+    def close(self) -> None:
+        with self._lock:
+            sessions, self._sessions = self._sessions, []
+        for session in sessions:
+            session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def page_url(url: str, page: int) -> str:
+    """URL страницы листинга: параметр page в строке запроса"""
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query) if k != "page"]
+    if page > 1:
+        query.append(("page", str(page)))
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def listing_pages(url: str, last_page: int, max_pages: int = MAX_PAGES) -> List[str]:
+    """Остальные страницы категории по номеру последней страницы из пагинации"""
+    return [page_url(url, page) for page in range(2, min(last_page, max_pages) + 1)]
+
+
+def plan_pages(category_urls: List[str], progress: Optional[Dict[str, Dict]] = None,
+               max_pages: int = MAX_PAGES) -> List[Tuple[str, str, bool]]:
+    """
+    Страницы, с которых начинается обход: (url, категория, первая ли это страница).
+    progress - прогресс прерванного сбора (DatabaseManager.get_checkpoints):
+    у категории с собранной первой страницей остаются только несобранные страницы
+    """
+    progress = progress or {}
+    plan = []
+    for category in category_urls:
+        state = progress.get(category)
+        if state is None or state["last_page"] is None:
+            plan.append((category, category, True))
+            continue
+        plan.extend((page, category, False) for page in listing_pages(category, state["last_page"], max_pages)
+                    if page not in state["pages"])
+    return plan
+
+
+class CrawlResult:
+    """
+    Итог обхода: товары без дублей по URL и страницы, которые не удалось собрать.
+    С sink товары каждой страницы сразу передаются в sink (например,
+    ScrapePipeline.add_page) вместе с отметкой страницы (url, категория,
+    число страниц категории) и в products не копятся
+    """
+
+    def __init__(self, sink: Optional[Callable[[List[Dict], tuple], None]] = None):
+        self.products: List[Dict] = []
+        self.sink = sink
+        self.pages = 0
+        self.resumed_pages = 0
+        self.collected = 0
+        self.failed: List[Tuple[str, str]] = []
+        self._seen = set()
+
+    def add(self, products: List[Dict], page: tuple = ()) -> None:
+        self.pages += 1
+        fresh = []
+        for product in products:
+            if product["url"] not in self._seen:
+                self._seen.add(product["url"])
+                fresh.append(product)
+        self.collected += len(fresh)
+        if self.sink is None:
+            self.products.extend(fresh)
+        else:
+            self.sink(fresh, page)
+
+
+def _fetch_page(pool: BrowserPool, parser: ListingParser, url: str,
+                retries: int) -> Tuple[List[Dict], int]:
+    """Товары страницы и номер последней страницы категории"""
+    for attempt in range(retries + 1):
+        try:
+            with pool.session() as session:
+                session.limiter.wait()
+                html = load_listing(session.driver, url)
+                session.pages += 1
+            return parser.parse(html, url)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            logger.warning(f"Страница {url} не загрузилась ({e}), повтор на новой сессии")
+
+
+def crawl_categories(category_urls: List[str], pool_size: int = 4, min_interval: float = 3.0,
+                     retries: int = 1, driver_factory: Callable = configure_driver,
+                     max_pages: int = MAX_PAGES, parser: Optional[ListingParser] = None,
+                     sink: Optional[Callable[[List[Dict], tuple], None]] = None,
+                     progress: Optional[Dict[str, Dict]] = None) -> CrawlResult:
+    """
+    Обход категорий: первая страница каждой категории определяет число
+    страниц листинга, все страницы идут через общий пул из pool_size
+    сессий браузера. Ошибка страницы не останавливает обход: страница
+    попадает в result.failed. Время обхода растет с числом страниц / pool_size.
+    sink получает товары каждой собранной страницы (см. CrawlResult),
+    progress - уже собранные страницы прерванного сбора (см. plan_pages)
+    """
+    parser = parser or get_parser()
+    result = CrawlResult(sink)
+    with BrowserPool(pool_size, driver_factory, min_interval) as pool, \
+            ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="crawler") as executor:
+        pending = {executor.submit(_fetch_page, pool, parser, url, retries): (url, category, first)
+                   for url, category, first in plan_pages(category_urls, progress, max_pages)}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                url, category, first = pending.pop(future)
+                try:
+                    products, last_page = future.result()
+                except Exception as e:
+                    logger.error(f"Страница {url} пропущена: {e}")
+                    result.failed.append((url, str(e)))
+                    inc(PAGES, 1, "failed")
+                    continue
+                result.add(products, (url, category, last_page))
+                inc(PAGES, 1, "ok")
+                for page in listing_pages(url, last_page, max_pages) if first else []:
+                    pending[executor.submit(_fetch_page, pool, parser, page, retries)] = (page, category, False)
+        logger.info(f"Обход завершен: {result.pages} страниц, {result.collected} товаров, "
+                    f"ошибок {len(result.failed)}, сессий браузера {pool.created}")
+    return result
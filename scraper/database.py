@@ -1,129 +1,1023 @@
 import sqlite3
 from datetime import datetime
-from typing import List, Dict
+from typing import Callable, Iterator, List, Dict, Tuple, Optional
 from pathlib import Path
 import logging
-import time
+import queue
+import re
+import threading
+from collections import Counter
 from contextlib import contextmanager
+from scraper.metrics import DB_SECONDS, STAGE_SECONDS, timed
+from scraper.utils import encode_cursor, decode_cursor
 import sys
 sys.stdout.reconfigure(encoding='utf-8')
 sys.stderr.reconfigure(encoding='utf-8')
 logger = logging.getLogger(__name__)
 
+# URL в одном запросе поиска по каталогу (IN (...)) при записи сбора
+CATALOG_LOOKUP_BATCH = 500
+
+
+# Миграции схемы: (версия, список SQL). Текущая версия хранится в PRAGMA user_version,
+# поэтому существующие файлы БД обновляются на месте при создании DatabaseManager
+MIGRATIONS = [
+    (1, [
+        # Таблица для хранения продуктов
+        """
+        CREATE TABLE IF NOT EXISTS products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            price INTEGER NOT NULL,
+            url TEXT NOT NULL,
+            brand TEXT,
+            timestamp DATETIME NOT NULL,
+            scrape_id TEXT NOT NULL
+        )
+        """,
+        # Таблица для хранения результатов анализа
+        """
+        CREATE TABLE IF NOT EXISTS analysis_results (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            scrape_id TEXT NOT NULL,
+            total_products INTEGER NOT NULL,
+            min_price INTEGER NOT NULL,
+            max_price INTEGER NOT NULL,
+            unique_brands INTEGER NOT NULL,
+            plot_path TEXT,
+            timestamp DATETIME NOT NULL
+        )
+        """,
+    ]),
+    (2, [
+        # Выборка товаров одного сбора (анализ, фильтры API внутри сбора)
+        "CREATE INDEX IF NOT EXISTS idx_products_scrape_brand_price ON products (scrape_id, brand, price)",
+        # Поиск последнего сбора: ORDER BY timestamp DESC LIMIT 1 без обращения к таблице
+        "CREATE INDEX IF NOT EXISTS idx_products_timestamp_scrape ON products (timestamp, scrape_id)",
+        # Фильтры /api/products по бренду и диапазону цен
+        "CREATE INDEX IF NOT EXISTS idx_products_brand_price ON products (brand, price)",
+        "CREATE INDEX IF NOT EXISTS idx_products_price ON products (price)",
+        "CREATE INDEX IF NOT EXISTS idx_analysis_scrape_id ON analysis_results (scrape_id)",
+        "ANALYZE",
+    ]),
+    (3, [
+        # Отдельная запись на каждый сбор: последний сбор и список сборов
+        # берутся отсюда, а не сортировкой всей таблицы products
+        """
+        CREATE TABLE IF NOT EXISTS scrapes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            scrape_id TEXT NOT NULL UNIQUE,
+            url TEXT,
+            started_at DATETIME NOT NULL,
+            finished_at DATETIME,
+            product_count INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL DEFAULT 'running'
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_scrapes_status_seq ON scrapes (status, seq)",
+        # Переносим уже накопленные сборы в хронологическом порядке
+        """
+        INSERT OR IGNORE INTO scrapes (scrape_id, started_at, finished_at, product_count, status)
+        SELECT scrape_id, MIN(timestamp), MAX(timestamp), COUNT(*), 'completed'
+        FROM products
+        GROUP BY scrape_id
+        ORDER BY MIN(timestamp)
+        """,
+    ]),
+    (4, [
+        # Служебные настройки БД (режим хранения и т.п.)
+        """
+        CREATE TABLE IF NOT EXISTS db_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+        """,
+        "INSERT OR IGNORE INTO db_meta (key, value) VALUES ('storage_mode', 'full')",
+        # Справочник брендов: в каталоге хранится только id
+        """
+        CREATE TABLE IF NOT EXISTS brands (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+        """,
+        # Каталог товаров: одна строка на URL
+        """
+        CREATE TABLE IF NOT EXISTS product_catalog (
+            id INTEGER PRIMARY KEY,
+            url TEXT NOT NULL UNIQUE,
+            name TEXT NOT NULL,
+            brand_id INTEGER REFERENCES brands (id),
+            first_seen DATETIME NOT NULL
+        )
+        """,
+        # История цен интервалами: товар стоил price во всех сборах
+        # с first_seq по last_seq (scrapes.seq) подряд
+        """
+        CREATE TABLE IF NOT EXISTS price_history (
+            product_id INTEGER NOT NULL REFERENCES product_catalog (id),
+            price INTEGER NOT NULL,
+            first_seq INTEGER NOT NULL,
+            last_seq INTEGER NOT NULL,
+            PRIMARY KEY (product_id, first_seq)
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_price_history_last_seq ON price_history (last_seq)",
+        # Полный снимок любого сбора в формате таблицы products
+        """
+        CREATE VIEW IF NOT EXISTS products_delta AS
+        SELECT
+            c.id AS id,
+            c.name AS name,
+            h.price AS price,
+            c.url AS url,
+            b.name AS brand,
+            s.started_at AS timestamp,
+            s.scrape_id AS scrape_id
+        FROM scrapes s
+        JOIN price_history h ON s.seq BETWEEN h.first_seq AND h.last_seq
+        JOIN product_catalog c ON c.id = h.product_id
+        LEFT JOIN brands b ON b.id = c.brand_id
+        """,
+    ]),
+    (5, [
+        # Один результат анализа на сбор: убираем накопившиеся дубликаты
+        # (оставляем последний) и делаем scrape_id уникальным ключом для upsert
+        """
+        DELETE FROM analysis_results
+        WHERE id NOT IN (SELECT MAX(id) FROM analysis_results GROUP BY scrape_id)
+        """,
+        "DROP INDEX IF EXISTS idx_analysis_scrape_id",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_analysis_scrape_id ON analysis_results (scrape_id)",
+        "ALTER TABLE analysis_results ADD COLUMN avg_price INTEGER",
+    ]),
+    (6, [
+        # Keyset-пагинация внутри сбора: (price, id) и (timestamp, id).
+        # id (rowid) хранится в каждой записи индекса, отдельно его указывать не нужно
+        "CREATE INDEX IF NOT EXISTS idx_products_scrape_price ON products (scrape_id, price)",
+        "CREATE INDEX IF NOT EXISTS idx_products_scrape_timestamp ON products (scrape_id, timestamp)",
+    ]),
+    (7, [
+        # Каталог теперь ведется и в полном режиме: заполняем его из накопленных снимков
+        "INSERT OR IGNORE INTO brands (name) SELECT DISTINCT brand FROM products WHERE brand IS NOT NULL",
+        """
+        INSERT OR IGNORE INTO product_catalog (url, name, brand_id, first_seen)
+        SELECT p.url, p.name, b.id, MIN(p.timestamp)
+        FROM products p LEFT JOIN brands b ON b.name = p.brand
+        GROUP BY p.url
+        """,
+        # Полнотекстовый индекс по названиям из каталога (по одной записи на товар,
+        # а не на каждую строку истории). Новые товары индексируются пачкой
+        # в _upsert_catalog / _sync_catalog, переименование и удаление - триггерами
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS product_search USING fts5 (
+            name,
+            content = 'product_catalog',
+            content_rowid = 'id',
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+        """,
+        "INSERT INTO product_search (product_search) VALUES ('rebuild')",
+        """
+        CREATE TRIGGER IF NOT EXISTS product_catalog_ad AFTER DELETE ON product_catalog BEGIN
+            INSERT INTO product_search (product_search, rowid, name) VALUES ('delete', old.id, old.name);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS product_catalog_au AFTER UPDATE OF name ON product_catalog BEGIN
+            INSERT INTO product_search (product_search, rowid, name) VALUES ('delete', old.id, old.name);
+            INSERT INTO product_search (rowid, name) VALUES (new.id, new.name);
+        END
+        """,
+        # Готовые счетчики по брендам внутри сбора (фасеты поиска)
+        """
+        CREATE TABLE IF NOT EXISTS brand_facets (
+            scrape_id TEXT NOT NULL,
+            brand TEXT NOT NULL,
+            product_count INTEGER NOT NULL,
+            PRIMARY KEY (scrape_id, brand)
+        ) WITHOUT ROWID
+        """,
+        """
+        INSERT OR IGNORE INTO brand_facets (scrape_id, brand, product_count)
+        SELECT scrape_id, brand, COUNT(*) FROM (
+            SELECT scrape_id, brand FROM products
+            UNION ALL
+            SELECT scrape_id, brand FROM products_delta
+        )
+        WHERE brand IS NOT NULL
+        GROUP BY scrape_id, brand
+        """,
+        # Товар сбора по URL: результаты поиска, сравнение соседних сборов
+        "CREATE INDEX IF NOT EXISTS idx_products_scrape_url ON products (scrape_id, url)",
+        # Фильтры API теперь работают внутри сбора (индексы с префиксом scrape_id),
+        # глобальные индексы по цене и бренду только замедляют вставку
+        "DROP INDEX IF EXISTS idx_products_brand_price",
+        "DROP INDEX IF EXISTS idx_products_price",
+    ]),
+    (8, [
+        # История цены одного товара: покрывающий индекс (scrape_id тоже в нем),
+        # запрос не читает саму таблицу
+        "CREATE INDEX IF NOT EXISTS idx_products_url_timestamp ON products (url, timestamp, price, scrape_id)",
+    ]),
+    (9, [
+        # Роллапы динамики цен (пересчитываются scraper.trends по всей истории)
+        """
+        CREATE TABLE IF NOT EXISTS brand_price_trends (
+            scrape_id TEXT NOT NULL,
+            brand TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            product_count INTEGER NOT NULL,
+            p10_price INTEGER NOT NULL,
+            median_price INTEGER NOT NULL,
+            p90_price INTEGER NOT NULL,
+            PRIMARY KEY (brand, timestamp, scrape_id)
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS product_volatility (
+            url TEXT PRIMARY KEY,
+            brand TEXT,
+            observations INTEGER NOT NULL,
+            min_price INTEGER NOT NULL,
+            max_price INTEGER NOT NULL,
+            mean_price INTEGER NOT NULL,
+            volatility REAL,
+            changes INTEGER NOT NULL,
+            computed_at TEXT NOT NULL
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS price_moves (
+            scrape_id TEXT NOT NULL,
+            url TEXT NOT NULL,
+            prev_price INTEGER NOT NULL,
+            price INTEGER NOT NULL,
+            change INTEGER NOT NULL,
+            change_pct REAL NOT NULL,
+            PRIMARY KEY (scrape_id, url)
+        ) WITHOUT ROWID
+        """,
+    ]),
+    (10, [
+        # События изменения ассортимента и цен между соседними сборами
+        """
+        CREATE TABLE IF NOT EXISTS price_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            scrape_id TEXT NOT NULL,
+            prev_scrape_id TEXT NOT NULL,
+            url TEXT NOT NULL,
+            event_type TEXT NOT NULL CHECK (event_type IN ('new', 'removed', 'price_changed')),
+            old_price INTEGER,
+            new_price INTEGER,
+            change_pct REAL,
+            created_at TEXT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_price_events_scrape_type ON price_events (scrape_id, event_type)",
+        "CREATE INDEX IF NOT EXISTS idx_price_events_url ON price_events (url)",
+        # Снимок сбора (url, price) для сравнения целиком из индекса;
+        # заменяет idx_products_scrape_url, число индексов на вставку не растет
+        "CREATE INDEX IF NOT EXISTS idx_products_scrape_url_price ON products (scrape_id, url, price)",
+        "DROP INDEX IF EXISTS idx_products_scrape_url",
+    ]),
+    (11, [
+        # Отметки собранных страниц незавершенного сбора: пишутся в одной транзакции
+        # с товарами страницы, по ним перезапущенный сбор продолжает с места сбоя
+        """
+        CREATE TABLE IF NOT EXISTS scrape_checkpoints (
+            scrape_id TEXT NOT NULL,
+            page_url TEXT NOT NULL,
+            category_url TEXT NOT NULL,
+            last_page INTEGER NOT NULL,
+            product_count INTEGER NOT NULL,
+            completed_at TEXT NOT NULL,
+            PRIMARY KEY (scrape_id, page_url)
+        ) WITHOUT ROWID
+        """,
+    ]),
+    (12, [
+        # Суммарное время этапов сбора (scraper.metrics.StageTimings); у продолженного
+        # после сбоя сбора время всех запусков складывается
+        """
+        CREATE TABLE IF NOT EXISTS scrape_timings (
+            scrape_id TEXT NOT NULL,
+            stage TEXT NOT NULL,
+            seconds REAL NOT NULL,
+            calls INTEGER NOT NULL,
+            PRIMARY KEY (scrape_id, stage)
+        ) WITHOUT ROWID
+        """,
+    ]),
+]
+
+# Колонки, которые можно запросить через API, и допустимые ключи сортировки
+PRODUCT_COLUMNS = ("id", "name", "price", "url", "brand", "timestamp", "scrape_id")
+SORT_COLUMNS = ("price", "timestamp")
+
+
+class ConnectionPool:
+    """Потокобезопасный пул соединений SQLite: несколько read-only читателей
+    и один писатель. PRAGMA настраиваются один раз при открытии соединения"""
+
+    def __init__(self, db_path: str, readers: int = 4,
+                 mmap_size: int = 256 * 1024 * 1024, cache_size_kb: int = 64 * 1024):
+        self.db_path = db_path
+        self.max_readers = readers
+        self.mmap_size = mmap_size
+        self.cache_size_kb = cache_size_kb
+        self._idle_readers = queue.LifoQueue()
+        self._opened_readers = 0
+        self._readers_lock = threading.Lock()
+        self._writer = None
+        self._writer_lock = threading.RLock()
+
+    def _open(self, read_only: bool) -> sqlite3.Connection:
+        if read_only:
+            uri = Path(self.db_path).resolve().as_uri() + "?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, timeout=30, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA busy_timeout=30000")  # 30 секунд ожидания блокировки
+        conn.execute(f"PRAGMA mmap_size={self.mmap_size}")
+        conn.execute(f"PRAGMA cache_size=-{self.cache_size_kb}")
+        # В WAL режим NORMAL не делает fsync на каждый коммит и не рискует
+        # целостностью базы: важно для потоковой записи сбора пачками
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _acquire_reader(self) -> sqlite3.Connection:
+        try:
+            return self._idle_readers.get_nowait()
+        except queue.Empty:
+            pass
+        with self._readers_lock:
+            if self._opened_readers < self.max_readers:
+                self._opened_readers += 1
+                try:
+                    return self._open(read_only=True)
+                except sqlite3.Error:
+                    self._opened_readers -= 1
+                    raise
+        return self._idle_readers.get()
+
+    @contextmanager
+    def reader(self):
+        """Соединение только для чтения; при исчерпании пула ждем свободное"""
+        conn = self._acquire_reader()
+        try:
+            yield conn
+        finally:
+            self._idle_readers.put(conn)
+
+    @contextmanager
+    def dedicated_reader(self):
+        """Отдельное read-only соединение вне пула - для долгих потоковых
+        выборок, чтобы они не занимали соединения коротких запросов"""
+        conn = self._open(read_only=True)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def writer(self):
+        """Единственное пишущее соединение; незакоммиченная транзакция
+        откатывается при выходе, как при закрытии отдельного соединения"""
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = self._open(read_only=False)
+            try:
+                yield self._writer
+            finally:
+                if self._writer.in_transaction:
+                    self._writer.rollback()
+
+    def close(self) -> None:
+        """Читатели закрываются первыми, писатель последним: read-only соединение
+        не может сделать checkpoint, и при закрытии последним оставило бы WAL
+        невлитым. Перед закрытием писатель переносит WAL в основной файл и обрезает его"""
+        with self._readers_lock:
+            while True:
+                try:
+                    self._idle_readers.get_nowait().close()
+                except queue.Empty:
+                    break
+                self._opened_readers -= 1
+        with self._writer_lock:
+            if self._writer is not None:
+                try:
+                    self._writer.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                except sqlite3.Error as e:
+                    logger.warning(f"Не удалось перенести WAL в файл БД: {e}")
+                self._writer.close()
+                self._writer = None
+
 
 class DatabaseManager:
-    def __init__(self, db_path: str = "data/mvideo_monitoring.db"):
+    def __init__(self, db_path: str = "data/mvideo_monitoring.db", readers: int = 4):
         self.db_path = db_path
-        self.max_retries = 10
-        self.retry_delay = 0.5
+        self.chunk_size = 5000
         self._init_db()
+        self.pool = ConnectionPool(db_path, readers=readers)
+        self.storage_mode = self._get_meta("storage_mode", "full")
+        # Вызываются с scrape_id после коммита новых товаров (сброс кэшей и т.п.)
+        self.commit_listeners = []
+
+    def add_commit_listener(self, callback: Callable[[str], None]) -> None:
+        self.commit_listeners.append(callback)
+
+    def _notify_commit(self, scrape_id: str) -> None:
+        for callback in self.commit_listeners:
+            try:
+                callback(scrape_id)
+            except Exception as e:
+                logger.error(f"Ошибка обработчика коммита: {e}")
+
+    @property
+    def products_table(self) -> str:
+        """Источник строк товаров для чтения: таблица products или
+        представление products_delta в дельта-режиме"""
+        return "products_delta" if self.storage_mode == "delta" else "products"
 
     def _init_db(self):
-        """Инициализация базы данных и таблиц"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            # Таблица для хранения продуктов
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS products (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    price INTEGER NOT NULL,
-                    url TEXT NOT NULL,
-                    brand TEXT,
-                    timestamp DATETIME NOT NULL,
-                    scrape_id TEXT NOT NULL
-                )
-            """)
-            # Таблица для хранения результатов анализа
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS analysis_results (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    scrape_id TEXT NOT NULL,
-                    total_products INTEGER NOT NULL,
-                    min_price INTEGER NOT NULL,
-                    max_price INTEGER NOT NULL,
-                    unique_brands INTEGER NOT NULL,
-                    plot_path TEXT,
-                    timestamp DATETIME NOT NULL
-                )
-            """)
-            conn.commit()
+        """Инициализация базы данных и применение недостающих миграций"""
+        conn = sqlite3.connect(self.db_path, isolation_level=None, timeout=30)
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for target, statements in MIGRATIONS:
+                if target <= version:
+                    continue
+                # IMMEDIATE: параллельно стартующие процессы не применят миграцию дважды
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    version = conn.execute("PRAGMA user_version").fetchone()[0]
+                    if target > version:
+                        logger.info(f"Миграция схемы БД: {version} -> {target}")
+                        for statement in statements:
+                            conn.execute(statement)
+                        conn.execute(f"PRAGMA user_version = {target}")
+                    conn.execute("COMMIT")
+                except sqlite3.Error:
+                    conn.execute("ROLLBACK")
+                    raise
+                version = max(version, target)
+            # Режим WAL сохраняется в самом файле БД, достаточно включить его один раз
+            conn.execute("PRAGMA journal_mode=WAL")
+        finally:
+            conn.close()
 
-    @contextmanager
     def get_connection(self):
-        """Контекстный менеджер с обработкой блокировок"""
-        conn = None
-        for attempt in range(self.max_retries):
+        """Пишущее соединение из пула (контекстный менеджер)"""
+        return self.pool.writer()
+
+    def read_connection(self):
+        """Соединение только для чтения из пула (контекстный менеджер)"""
+        return self.pool.reader()
+
+    def close(self) -> None:
+        self.pool.close()
+
+    def _prepare_rows(self, products: List[Dict], scrape_id: str) -> Tuple[List[tuple], int]:
+        """Проверяет товары заранее и собирает кортежи для executemany.
+        Возвращает (строки, количество отброшенных товаров)"""
+        rows = []
+        rejected = 0
+        for product in products:
             try:
-                conn = sqlite3.connect(
-                    self.db_path,
-                    timeout=30,
-                    check_same_thread=False
+                rows.append((
+                    product["name"],
+                    int(product["price"]),
+                    product["url"],
+                    product["brand"],
+                    product["timestamp"],
+                    scrape_id
+                ))
+            except (KeyError, TypeError, ValueError):
+                rejected += 1
+        return rows, rejected
+
+    def _insert_rows(self, cursor: sqlite3.Cursor, rows: List[tuple]) -> None:
+        """Пакетная вставка подготовленных строк кусками по chunk_size.
+        Строки идут в порядке URL: индексы (scrape_id, url, ...) и (url, ...)
+        заполняются подряд, а не вставками в случайные страницы B-дерева"""
+        rows = sorted(rows, key=lambda row: row[2])
+        for start in range(0, len(rows), self.chunk_size):
+            cursor.executemany("""
+                INSERT INTO products (name, price, url, brand, timestamp, scrape_id)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, rows[start:start + self.chunk_size])
+
+    def _upsert_catalog(self, cursor: sqlite3.Cursor, rows: List[tuple]) -> None:
+        """Обновляет справочник брендов и каталог товаров (ключ - URL).
+        Каталог ведется в обоих режимах хранения: по нему работает полнотекстовый поиск.
+        Повторный сбор почти не меняет каталог, поэтому URL пачки сначала ищутся
+        в каталоге одним запросом на CATALOG_LOOKUP_BATCH адресов: вставляются
+        только новые товары, обновляются только переименованные"""
+        # Одна строка на URL (побеждает последняя): новый товар попадает в FTS только
+        # в конце, и его переименование в той же пачке триггером product_catalog_au
+        # удаляло бы из индекса строку, которой там еще нет (FTS5 считает базу поврежденной)
+        latest = {row[2]: row for row in rows}
+
+        brands = dict(cursor.execute("SELECT name, id FROM brands"))
+        new_brands = {row[3] for row in latest.values() if row[3] and row[3] not in brands}
+        if new_brands:
+            cursor.executemany("INSERT OR IGNORE INTO brands (name) VALUES (?)", [(name,) for name in new_brands])
+            brands = dict(cursor.execute("SELECT name, id FROM brands"))
+
+        urls = list(latest)
+        known = {}
+        for start in range(0, len(urls), CATALOG_LOOKUP_BATCH):
+            batch = urls[start:start + CATALOG_LOOKUP_BATCH]
+            known.update(
+                (url, (name, brand_id)) for url, name, brand_id in cursor.execute(
+                    f"SELECT url, name, brand_id FROM product_catalog WHERE url IN ({', '.join('?' * len(batch))})",
+                    batch
                 )
-                conn.execute("PRAGMA journal_mode=WAL")  # Включите WAL-режим
-                conn.execute("PRAGMA busy_timeout=30000")  # 10 секунд ожидания
-                yield conn
-                break
-            except sqlite3.OperationalError as e:
-                if "database is locked" in str(e) and attempt < self.max_retries - 1:
-                    time.sleep(self.retry_delay * (attempt + 1))
-                    continue
-                raise
-            finally:
-                if conn:
-                    conn.close()
+            )
+
+        inserts, renames = [], []
+        for url, row in latest.items():
+            current, brand_id = known.get(url), brands.get(row[3])
+            if current is None:
+                inserts.append((url, row[0], brand_id, row[4]))
+            elif current != (row[0], brand_id):
+                renames.append((row[0], brand_id, url))
+        if renames:
+            cursor.executemany("UPDATE product_catalog SET name = ?, brand_id = ? WHERE url = ?", renames)
+        if inserts:
+            last_id = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM product_catalog").fetchone()[0]
+            cursor.executemany(
+                "INSERT INTO product_catalog (url, name, brand_id, first_seen) VALUES (?, ?, ?, ?)", inserts)
+            # Одна вставка INSERT ... SELECT в FTS на порядок быстрее триггера на каждую строку
+            cursor.execute(
+                "INSERT INTO product_search (rowid, name) SELECT id, name FROM product_catalog WHERE id > ?",
+                (last_id,)
+            )
+
+    def _sync_catalog(self, cursor: sqlite3.Cursor, rows: List[tuple], after_id: int) -> None:
+        """Полный режим: каталог обновляется по только что вставленным строкам
+        products (id > after_id) двумя запросами целиком внутри SQLite - по одному
+        поиску в уникальном индексе url на строку, без выборки каталога в Python.
+        Сначала переименования (эти товары уже в FTS, их обновляет триггер
+        product_catalog_au), затем новые URL: повтор URL в пачке пропускается
+        ON CONFLICT, поэтому в FTS попадает ровно одна строка на товар"""
+        cursor.executemany("INSERT OR IGNORE INTO brands (name) VALUES (?)", {(row[3],) for row in rows if row[3]})
+        cursor.execute("""
+            UPDATE product_catalog SET name = p.name, brand_id = b.id
+            FROM products p LEFT JOIN brands b ON b.name = p.brand
+            WHERE p.id > ? AND product_catalog.url = p.url
+              AND (product_catalog.name != p.name OR product_catalog.brand_id IS NOT b.id)
+        """, (after_id,))
+        last_id = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM product_catalog").fetchone()[0]
+        cursor.execute("""
+            INSERT INTO product_catalog (url, name, brand_id, first_seen)
+            SELECT p.url, p.name, b.id, p.timestamp
+            FROM products p LEFT JOIN brands b ON b.name = p.brand
+            WHERE p.id > ? AND NOT EXISTS (SELECT 1 FROM product_catalog c WHERE c.url = p.url)
+            ON CONFLICT (url) DO NOTHING
+        """, (after_id,))
+        cursor.execute(
+            "INSERT INTO product_search (rowid, name) SELECT id, name FROM product_catalog WHERE id > ?",
+            (last_id,)
+        )
+
+    def _count_brands(self, cursor: sqlite3.Cursor, rows: List[tuple], scrape_id: str) -> None:
+        """Накапливает готовые счетчики товаров по брендам для фасетов поиска"""
+        counts = Counter(row[3] for row in rows if row[3])
+        cursor.executemany("""
+            INSERT INTO brand_facets (scrape_id, brand, product_count) VALUES (?, ?, ?)
+            ON CONFLICT (scrape_id, brand) DO UPDATE SET
+                product_count = product_count + excluded.product_count
+        """, [(scrape_id, brand, count) for brand, count in counts.items()])
+
+    def _insert_delta(self, cursor: sqlite3.Cursor, rows: List[tuple], seq: int) -> None:
+        """Дельта-режим: добавляет строку истории цен только для новых
+        товаров и изменившихся цен. Товары уже должны быть в каталоге"""
+        # Интервал продлевается, только если товар был в непосредственно
+        # предыдущем сборе по той же цене
+        prev_seq = cursor.execute(
+            "SELECT MAX(seq) FROM scrapes WHERE seq < ?", (seq,)
+        ).fetchone()[0]
 
-    def save_products(self, products: List[Dict], scrape_id: str) -> None:
+        for start in range(0, len(rows), self.chunk_size):
+            chunk = rows[start:start + self.chunk_size]
+            prices = [(seq, row[2], prev_seq, row[1]) for row in chunk]
+            cursor.executemany("""
+                UPDATE price_history SET last_seq = ?
+                WHERE product_id = (SELECT id FROM product_catalog WHERE url = ?)
+                  AND last_seq = ? AND price = ?
+            """, prices)
+            cursor.executemany("""
+                INSERT INTO price_history (product_id, price, first_seq, last_seq)
+                SELECT c.id, ?, ?, ? FROM product_catalog c
+                WHERE c.url = ? AND NOT EXISTS (
+                    SELECT 1 FROM price_history h
+                    WHERE h.product_id = c.id AND h.last_seq = ?
+                )
+                ON CONFLICT DO NOTHING
+            """, [(row[1], seq, seq, row[2], seq) for row in chunk])
+
+    @timed(STAGE_SECONDS, "save")
+    def _write_rows(self, cursor: sqlite3.Cursor, rows: List[tuple], scrape_id: str) -> None:
+        """Запись подготовленных строк внутри уже открытой транзакции"""
+        seq = self._register_products(cursor, scrape_id, len(rows))
+        self._count_brands(cursor, rows, scrape_id)
+        if self.storage_mode == "delta":
+            self._upsert_catalog(cursor, rows)
+            self._insert_delta(cursor, rows, seq)
+        else:
+            # AUTOINCREMENT: id новых строк больше любого уже выданного
+            after_id = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM products").fetchone()[0]
+            self._insert_rows(cursor, rows)
+            self._sync_catalog(cursor, rows, after_id)
+
+    def save_products(self, products: List[Dict], scrape_id: str) -> int:
+        """Сохраняет товары одной транзакцией через executemany.
+        Возвращает количество отброшенных (невалидных) товаров"""
         if not products:
             logger.warning("Пустой список продуктов для сохранения")
-            return
+            return 0
 
-        logger.info(f"Сохранение {len(products)} товаров...")
+        rows, rejected = self._prepare_rows(products, scrape_id)
+        logger.info(f"Сохранение {len(rows)} товаров...")
 
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            for idx, product in enumerate(products, 1):
-                try:
-                    cursor.execute("""
-                        INSERT INTO products (name, price, url, brand, timestamp, scrape_id)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    """, (
-                        product["name"],
-                        product["price"],
-                        product["url"],
-                        product["brand"],
-                        product["timestamp"],
-                        scrape_id
-                    ))
-                    logger.debug(f"Сохранен товар {idx}/{len(products)}: {product['name']}")
-                except KeyError as e:
-                    logger.error(f"Пропущен товар: отсутствует ключ {e}")
-                except sqlite3.Error as e:
-                    logger.error(f"Ошибка SQLite: {e}")
+            try:
+                cursor.execute("BEGIN")
+                self._write_rows(cursor, rows, scrape_id)
+                conn.commit()
+            except sqlite3.Error as e:
+                conn.rollback()
+                logger.error(f"Ошибка SQLite: {e}")
+                raise
+            finally:
+                cursor.close()
+        self._notify_commit(scrape_id)
+
+        if rejected:
+            logger.warning(f"Пропущено {rejected} товаров без обязательных полей")
+        return rejected
+
+    def _register_products(self, cursor: sqlite3.Cursor, scrape_id: str, count: int) -> int:
+        """Учитывает сохраненные товары в таблице scrapes и возвращает seq сбора.
+        Сбор без start_scrape (ручной запуск) сразу считается завершенным.
+        Не upsert: в AUTOINCREMENT-таблице ON CONFLICT DO UPDATE расходует
+        значение seq на каждую порцию, поэтому сначала UPDATE, INSERT - только
+        если сбора еще нет"""
+        now = datetime.now().isoformat()
+        cursor.execute("""
+            UPDATE scrapes SET product_count = product_count + ?, finished_at = ?
+            WHERE scrape_id = ?
+        """, (count, now, scrape_id))
+        if cursor.rowcount == 0:
+            cursor.execute("""
+                INSERT INTO scrapes (scrape_id, started_at, finished_at, product_count, status)
+                VALUES (?, ?, ?, ?, 'completed')
+            """, (scrape_id, now, now, count))
+            return cursor.lastrowid
+        return cursor.execute(
+            "SELECT seq FROM scrapes WHERE scrape_id = ?", (scrape_id,)
+        ).fetchone()[0]
+
+    def _get_meta(self, key: str, default: str = None) -> Optional[str]:
+        with self.read_connection() as conn:
+            row = conn.execute("SELECT value FROM db_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def migrate_to_delta(self, vacuum: bool = True) -> None:
+        """Одноразовый перевод БД в дельта-режим: переносит накопленные
+        полные снимки из products в каталог и историю цен, затем очищает products"""
+        if self.storage_mode == "delta":
+            logger.info("БД уже в дельта-режиме")
+            return
+
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("BEGIN")
+                scrapes = cursor.execute("SELECT scrape_id, seq FROM scrapes ORDER BY seq").fetchall()
+                for idx, (scrape_id, seq) in enumerate(scrapes, 1):
+                    rows = cursor.execute("""
+                        SELECT name, price, url, brand, timestamp, scrape_id
+                        FROM products WHERE scrape_id = ?
+                    """, (scrape_id,)).fetchall()
+                    self._upsert_catalog(cursor, rows)
+                    self._insert_delta(cursor, rows, seq)
+                    if idx % 100 == 0:
+                        logger.info(f"Перенесено {idx}/{len(scrapes)} сборов")
+                cursor.execute("DELETE FROM products")
+                cursor.execute("UPDATE db_meta SET value = 'delta' WHERE key = 'storage_mode'")
+                conn.commit()
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+            if vacuum:
+                conn.execute("VACUUM")
+                # В WAL VACUUM пишет новую копию базы в журнал: без checkpoint
+                # основной файл не уменьшится, а рядом вырастет такой же -wal
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+        self.storage_mode = "delta"
+        logger.info(f"БД переведена в дельта-режим ({len(scrapes)} сборов)")
+
+    def start_scrape(self, scrape_id: str, url: str = None) -> None:
+        """Регистрирует начало сбора данных. Продолженный сбор уже записан:
+        INSERT OR IGNORE расходовал бы seq, поэтому вставка через NOT EXISTS"""
+        with self.get_connection() as conn:
+            conn.execute("""
+                INSERT INTO scrapes (scrape_id, url, started_at, status)
+                SELECT ?, ?, ?, 'running'
+                WHERE NOT EXISTS (SELECT 1 FROM scrapes WHERE scrape_id = ?)
+            """, (scrape_id, url, datetime.now().isoformat(), scrape_id))
             conn.commit()
-            cursor.close()
+
+    def finish_scrape(self, scrape_id: str, status: str = "completed") -> None:
+        """Отмечает завершение сбора данных (completed/failed).
+        Отметки страниц завершенного сбора больше не нужны и удаляются.
+        failed ставится только идущему сбору: сбой после завершения (анализ,
+        оповещения) не должен делать завершенный сбор снова продолжаемым"""
+        query = "UPDATE scrapes SET status = ?, finished_at = ? WHERE scrape_id = ?"
+        if status == "failed":
+            query += " AND status = 'running'"
+        with self.get_connection() as conn:
+            conn.execute(query, (status, datetime.now().isoformat(), scrape_id))
+            if status == "completed":
+                conn.execute("DELETE FROM scrape_checkpoints WHERE scrape_id = ?", (scrape_id,))
+            conn.commit()
+        self._notify_commit(scrape_id)
+
+    def save_stage_timings(self, scrape_id: str, timings: Dict[str, Tuple[float, int]]) -> None:
+        """Время этапов сбора {этап: (секунды, вызовы)}, добавляется к уже записанному"""
+        with self.get_connection() as conn:
+            conn.executemany("""
+                INSERT INTO scrape_timings (scrape_id, stage, seconds, calls) VALUES (?, ?, ?, ?)
+                ON CONFLICT (scrape_id, stage) DO UPDATE SET
+                    seconds = seconds + excluded.seconds,
+                    calls = calls + excluded.calls
+            """, [(scrape_id, stage, seconds, calls) for stage, (seconds, calls) in timings.items()])
+            conn.commit()
+
+    def get_stage_timings(self, scrape_id: str) -> Dict[str, Dict]:
+        """Время этапов сбора: {этап: {"seconds", "calls"}}"""
+        rows = self.execute_query("""
+            SELECT stage, seconds, calls FROM scrape_timings WHERE scrape_id = ? ORDER BY seconds DESC
+        """, (scrape_id,))
+        return {row["stage"]: {"seconds": row["seconds"], "calls": row["calls"]} for row in rows}
+
+    def find_resumable_scrape(self, url: str, since: str) -> Optional[str]:
+        """Незавершенный (running/failed) сбор тех же категорий, начатый не раньше since.
+        Найденный сбор снова помечается как running. Водяной знак анализа мог уйти
+        дальше упавшего сбора - он опускается под сбор, чтобы тот после
+        завершения попал в get_pending_analysis"""
+        rows = self.execute_query("""
+            SELECT scrape_id, seq FROM scrapes
+            WHERE url = ? AND started_at >= ? AND status IN ('running', 'failed')
+            ORDER BY seq DESC
+            LIMIT 1
+        """, (url, since))
+        if not rows:
+            return None
+        scrape_id, seq = rows[0]["scrape_id"], rows[0]["seq"]
+        with self.get_connection() as conn:
+            conn.execute("UPDATE scrapes SET status = 'running' WHERE scrape_id = ?", (scrape_id,))
+            conn.execute("""
+                UPDATE db_meta SET value = ? - 1
+                WHERE key = 'analysis_watermark' AND CAST(value AS INTEGER) >= ?
+            """, (seq, seq))
+            conn.commit()
+        return scrape_id
+
+    def _save_checkpoints(self, cursor: sqlite3.Cursor, scrape_id: str, pages: List[tuple]) -> None:
+        """Отметки страниц (page_url, category_url, last_page, product_count)
+        внутри транзакции, в которой записаны их товары"""
+        now = datetime.now().isoformat()
+        cursor.executemany("""
+            INSERT OR REPLACE INTO scrape_checkpoints
+                (scrape_id, page_url, category_url, last_page, product_count, completed_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [(scrape_id, *page, now) for page in pages])
+
+    def get_checkpoints(self, scrape_id: str) -> Dict[str, Dict]:
+        """Прогресс сбора по категориям: {category_url: {"last_page": число страниц
+        категории или None, пока первая страница не собрана, "pages": собранные URL}}"""
+        progress: Dict[str, Dict] = {}
+        for row in self.execute_query("""
+            SELECT page_url, category_url, last_page FROM scrape_checkpoints WHERE scrape_id = ?
+        """, (scrape_id,)):
+            category = progress.setdefault(row["category_url"], {"last_page": None, "pages": set()})
+            category["pages"].add(row["page_url"])
+            if row["page_url"] == row["category_url"]:
+                category["last_page"] = row["last_page"]
+        return progress
+
+    def get_previous_scrape_id(self, scrape_id: str) -> Optional[str]:
+        """Последний завершенный непустой сбор перед указанным"""
+        rows = self.execute_query("""
+            SELECT scrape_id FROM scrapes
+            WHERE seq < (SELECT seq FROM scrapes WHERE scrape_id = ?)
+              AND status = 'completed' AND product_count > 0
+            ORDER BY seq DESC
+            LIMIT 1
+        """, (scrape_id,))
+        return rows[0]["scrape_id"] if rows else None
+
+    @timed(STAGE_SECONDS, "diff")
+    def diff_scrapes(self, scrape_id: str, prev_scrape_id: Optional[str] = None) -> Dict[str, int]:
+        """
+        Сравнивает сбор с предыдущим по URL товара и записывает в price_events
+        новые (new), пропавшие (removed) товары и изменения цены (price_changed).
+        Один INSERT ... SELECT: снимки сборов материализуются (GROUP BY url)
+        и соединяются по автоматическому индексу, пропавшие товары ищутся
+        по индексу (scrape_id, url). Повторный вызов перезаписывает события сбора.
+        Возвращает число событий по типам
+        """
+        prev_scrape_id = prev_scrape_id or self.get_previous_scrape_id(scrape_id)
+        if not prev_scrape_id:
+            logger.info(f"Нет предыдущего сбора для сравнения с {scrape_id}")
+            return {}
+
+        table = self.products_table
+        # ?1 - текущий сбор, ?2 - предыдущий, ?3 - время создания событий
+        current = f"SELECT url, MIN(price) AS price FROM {table} WHERE scrape_id = ?1 GROUP BY url"
+        previous = f"SELECT url, MIN(price) AS price FROM {table} WHERE scrape_id = ?2 GROUP BY url"
+        created_at = datetime.now().isoformat()
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("BEGIN")
+                cursor.execute("DELETE FROM price_events WHERE scrape_id = ?", (scrape_id,))
+                cursor.execute(f"""
+                    INSERT INTO price_events
+                        (scrape_id, prev_scrape_id, url, event_type, old_price, new_price, change_pct, created_at)
+                    SELECT ?1, ?2, cur.url,
+                           CASE WHEN prev.url IS NULL THEN 'new' ELSE 'price_changed' END,
+                           prev.price, cur.price,
+                           CASE WHEN prev.price > 0
+                                THEN ROUND((cur.price - prev.price) * 100.0 / prev.price, 2) END,
+                           ?3
+                    FROM ({current}) cur
+                    LEFT JOIN ({previous}) prev ON prev.url = cur.url
+                    WHERE prev.url IS NULL OR prev.price != cur.price
+                    UNION ALL
+                    SELECT ?1, ?2, prev.url, 'removed', prev.price, NULL, NULL, ?3
+                    FROM ({previous}) prev
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM {table} c WHERE c.scrape_id = ?1 AND c.url = prev.url
+                    )
+                """, (scrape_id, prev_scrape_id, created_at))
+                counts = dict(cursor.execute("""
+                    SELECT event_type, COUNT(*) FROM price_events
+                    WHERE scrape_id = ? GROUP BY event_type
+                """, (scrape_id,)).fetchall())
+                conn.commit()
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+        logger.info(f"Сравнение {scrape_id} с {prev_scrape_id}: {counts}")
+        return counts
+
+    def get_price_events(self, scrape_id: str, event_type: Optional[str] = None) -> List[Dict]:
+        """События сбора из price_events (все или одного типа)"""
+        query = """
+            SELECT e.scrape_id, e.prev_scrape_id, e.url, e.event_type,
+                   e.old_price, e.new_price, e.change_pct, c.name, b.name AS brand
+            FROM price_events e
+            LEFT JOIN product_catalog c ON c.url = e.url
+            LEFT JOIN brands b ON b.id = c.brand_id
+            WHERE e.scrape_id = ?
+        """
+        params = [scrape_id]
+        if event_type:
+            query += " AND e.event_type = ?"
+            params.append(event_type)
+        return self.execute_query(query + " ORDER BY e.id", tuple(params))
+
+    def get_last_scrape_id(self) -> Optional[str]:
+        """Возвращает scrape_id последнего завершенного сбора"""
+        with self.read_connection() as conn:
+            # MAX(seq) по индексу idx_scrapes_status_seq - одно чтение индекса
+            row = conn.execute("""
+                SELECT scrape_id FROM scrapes
+                WHERE seq = (SELECT MAX(seq) FROM scrapes WHERE status = 'completed')
+            """).fetchone()
+        return row[0] if row else None
+
+    def data_version(self) -> str:
+        """Дешевая версия данных для кэшей: последний завершенный сбор
+        плюс состояние самого нового сбора. Меняется с каждым сохранением"""
+        with self.read_connection() as conn:
+            row = conn.execute("""
+                SELECT
+                    (SELECT scrape_id FROM scrapes
+                     WHERE seq = (SELECT MAX(seq) FROM scrapes WHERE status = 'completed')),
+                    seq, product_count, status
+                FROM scrapes
+                WHERE seq = (SELECT MAX(seq) FROM scrapes)
+            """).fetchone()
+        return ":".join(str(value) for value in row) if row else "empty"
+
+    @timed(DB_SECONDS, "list_scrapes")
+    def list_scrapes(self, limit: Optional[int] = None, status: str = None) -> List[Dict]:
+        """Список сборов от новых к старым"""
+        query = "SELECT * FROM scrapes"
+        params = []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY seq DESC"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        return self.execute_query(query, tuple(params))
+
+    def _upsert_analysis(self, cursor: sqlite3.Cursor, analysis: Dict, scrape_id: str) -> None:
+        cursor.execute("""
+            INSERT INTO analysis_results (
+                scrape_id, total_products, min_price, max_price, avg_price,
+                unique_brands, plot_path, timestamp
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (scrape_id) DO UPDATE SET
+                total_products = excluded.total_products,
+                min_price = excluded.min_price,
+                max_price = excluded.max_price,
+                avg_price = excluded.avg_price,
+                unique_brands = excluded.unique_brands,
+                plot_path = excluded.plot_path,
+                timestamp = excluded.timestamp
+        """, (
+            scrape_id,
+            analysis.get("total_products", 0),
+            analysis.get("min_price", 0),
+            analysis.get("max_price", 0),
+            analysis.get("avg_price"),
+            analysis.get("unique_brands", 0),
+            analysis.get("plot_path"),
+            analysis.get("timestamp", datetime.now().isoformat())
+        ))
 
     def save_analysis(self, analysis: Dict, scrape_id: str) -> None:
-        """Сохраняет результаты анализа в базу данных"""
-        with sqlite3.connect(self.db_path) as conn:
+        """Сохраняет (или обновляет) результаты анализа сбора"""
+        self.save_analyses([(scrape_id, analysis)])
+        logger.info(f"Сохранены результаты анализа (scrape_id: {scrape_id})")
+
+    def save_analyses(self, results: List[Tuple[str, Dict]]) -> None:
+        """Сохраняет результаты анализа нескольких сборов одной транзакцией"""
+        with self.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO analysis_results (
-                    scrape_id, total_products, min_price, max_price, 
-                    unique_brands, plot_path, timestamp
+            try:
+                cursor.execute("BEGIN")
+                for scrape_id, analysis in results:
+                    self._upsert_analysis(cursor, analysis, scrape_id)
+                conn.commit()
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def get_pending_analysis(self) -> List[str]:
+        """Завершенные непустые сборы выше водяного знака, для которых еще нет анализа"""
+        watermark = int(self._get_meta("analysis_watermark", "0"))
+        rows = self.execute_query("""
+            SELECT s.scrape_id FROM scrapes s
+            WHERE s.seq > ? AND s.status = 'completed' AND s.product_count > 0
+              AND NOT EXISTS (
+                  SELECT 1 FROM analysis_results a WHERE a.scrape_id = s.scrape_id
+              )
+            ORDER BY s.seq
+        """, (watermark,))
+        return [row["scrape_id"] for row in rows]
+
+    def advance_analysis_watermark(self) -> None:
+        """Сдвигает водяной знак до последнего сбора, ниже которого нет
+        незавершенных сборов и все завершенные уже проанализированы"""
+        watermark = int(self._get_meta("analysis_watermark", "0"))
+        with self.get_connection() as conn:
+            conn.execute("""
+                INSERT INTO db_meta (key, value)
+                SELECT 'analysis_watermark', COALESCE(MIN(seq) - 1, :watermark) FROM (
+                    SELECT seq FROM scrapes WHERE seq > :watermark AND status = 'running'
+                    UNION ALL
+                    SELECT s.seq FROM scrapes s
+                    WHERE s.seq > :watermark AND s.status = 'completed' AND s.product_count > 0
+                      AND NOT EXISTS (
+                        SELECT 1 FROM analysis_results a WHERE a.scrape_id = s.scrape_id
+                    )
+                    UNION ALL
+                    SELECT MAX(seq) + 1 FROM scrapes
                 )
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                scrape_id,
-                analysis.get("total_products", 0),
-                analysis.get("min_price", 0),
-                analysis.get("max_price", 0),
-                analysis.get("unique_brands", 0),
-                analysis.get("plot_path"),
-                analysis.get("timestamp", datetime.now().isoformat())
-            ))
+                WHERE true
+                ON CONFLICT (key) DO UPDATE SET value = excluded.value
+            """, {"watermark": watermark})
             conn.commit()
-        logger.info(f"Сохранены результаты анализа (scrape_id: {scrape_id})")
 
     def _extract_brand(self, product_name: str) -> str:
         """Извлекает бренд из названия продукта"""
@@ -131,32 +1025,245 @@ class DatabaseManager:
             return None
         return product_name.split()[0] if product_name else None
 
+    def get_scrape_data(self, scrape_id: str) -> List[Dict]:
+        """Полный снимок товаров сбора (в обоих режимах хранения)"""
+        return self.execute_query(f"""
+            SELECT name, price, url, brand, timestamp
+            FROM {self.products_table}
+            WHERE scrape_id = ?
+        """, (scrape_id,))
+
     def get_last_scrape_data(self) -> List[Dict]:
         """Получает данные последнего сбора"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            # Получаем последний scrape_id
-            cursor.execute("""
-                SELECT scrape_id FROM products 
-                ORDER BY timestamp DESC LIMIT 1
-            """)
-            last_scrape = cursor.fetchone()
-            if not last_scrape:
-                return []
-
-            # Получаем все продукты для этого scrape_id
-            cursor.execute("""
-                SELECT name, price, url, timestamp 
-                FROM products 
-                WHERE scrape_id = ?
-            """, (last_scrape["scrape_id"],))
-            return [dict(row) for row in cursor.fetchall()]
+        scrape_id = self.get_last_scrape_id()
+        if not scrape_id:
+            return []
+        return self.get_scrape_data(scrape_id)
+
+    def _product_filters(self, scrape_id: Optional[str], min_price: Optional[int] = None,
+                         max_price: Optional[int] = None, brand: Optional[str] = None) -> Tuple[List[str], List]:
+        conditions = []
+        params = []
+        if scrape_id:
+            conditions.append("scrape_id = ?")
+            params.append(scrape_id)
+        if min_price is not None:
+            conditions.append("price >= ?")
+            params.append(min_price)
+        if max_price is not None:
+            conditions.append("price <= ?")
+            params.append(max_price)
+        if brand:
+            conditions.append("brand = ?")
+            params.append(brand)
+        return conditions, params
+
+    @timed(DB_SECONDS, "query_products")
+    def query_products(self, scrape_id: Optional[str] = None, min_price: Optional[int] = None,
+                       max_price: Optional[int] = None, brand: Optional[str] = None,
+                       sort: Optional[str] = None, descending: bool = False, cursor: Optional[str] = None,
+                       limit: int = 10, offset: int = 0, fields: Optional[List[str]] = None) -> Dict:
+        """
+        Страница товаров с keyset-пагинацией по (sort, id) внутри сбора
+        (по умолчанию sort=price). С курсором следующая страница ищется по
+        индексу, а не пропуском OFFSET строк.
+        scrape_id=None - вся история в порядке записи. Глобальных индексов по
+        цене и времени нет (см. миграцию 7), поэтому сортировка по всей истории
+        не поддерживается. В полном режиме курсор идет по id, в дельта-режиме
+        id - это id товара в каталоге и по всей истории не уникален: курсор там
+        не поддерживается (только page/OFFSET), порядок (timestamp, id, scrape_id)
+        """
+        if not scrape_id and sort:
+            raise ValueError("Сортировка по всей истории не поддерживается: страницы идут в порядке записи")
+        if scrape_id:
+            sort = sort or "price"
+            if sort not in SORT_COLUMNS:
+                raise ValueError(f"Недопустимая сортировка: {sort}")
+        fields = list(fields) if fields else list(PRODUCT_COLUMNS)
+        unknown = [field for field in fields if field not in PRODUCT_COLUMNS]
+        if unknown:
+            raise ValueError(f"Неизвестные поля: {', '.join(unknown)}")
+
+        conditions, params = self._product_filters(scrape_id, min_price, max_price, brand)
+        direction = "DESC" if descending else "ASC"
+        keyset = bool(scrape_id) or self.storage_mode != "delta"
+        if cursor and not keyset:
+            raise ValueError("Курсор не поддерживается для всей истории в дельта-режиме, используйте page")
+        if cursor:
+            sort_value, last_id = decode_cursor(cursor)
+            if scrape_id:
+                conditions.append(f"({sort}, id) {'<' if descending else '>'} (?, ?)")
+                params.extend([sort_value, last_id])
+            else:
+                conditions.append(f"id {'<' if descending else '>'} ?")
+                params.append(last_id)
+            offset = 0
+
+        if scrape_id:
+            order = [sort, "id"]
+        elif keyset:
+            order = ["id"]
+        else:
+            order = ["timestamp", "id", "scrape_id"]
+        # Колонки порядка нужны для курсора, даже если их не запросили
+        columns = list(dict.fromkeys(order + fields))
+        query = f"SELECT {', '.join(columns)} FROM {self.products_table}"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY " + ", ".join(f"{column} {direction}" for column in order)
+        query += " LIMIT ? OFFSET ?"
+        params.extend([limit + 1, offset])
+
+        rows = self.execute_query(query, tuple(params))
+        next_cursor = None
+        if len(rows) > limit and not keyset:
+            rows = rows[:limit]
+        elif len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(last[sort] if scrape_id else None, last["id"])
+        return {
+            "data": [{field: row[field] for field in fields} for row in rows],
+            "next_cursor": next_cursor
+        }
+
+    @timed(DB_SECONDS, "count_products")
+    def count_products(self, scrape_id: Optional[str] = None, min_price: Optional[int] = None,
+                       max_price: Optional[int] = None, brand: Optional[str] = None) -> int:
+        """Количество товаров. Без фильтров по цене и бренду берется готовый
+        product_count из scrapes, с фильтрами - COUNT(*) по индексу внутри сбора.
+        Строки архивированных сборов (scraper.archive) из БД удалены и не считаются"""
+        if min_price is None and max_price is None and not brand:
+            if scrape_id:
+                rows = self.execute_query("""
+                    SELECT CASE WHEN status = 'archived' THEN 0 ELSE product_count END AS n
+                    FROM scrapes WHERE scrape_id = ?
+                """, (scrape_id,))
+            else:
+                rows = self.execute_query("""
+                    SELECT COALESCE(SUM(product_count), 0) AS n FROM scrapes WHERE status != 'archived'
+                """)
+            return rows[0]["n"] if rows else 0
+
+        conditions, params = self._product_filters(scrape_id, min_price, max_price, brand)
+        query = f"SELECT COUNT(*) AS n FROM {self.products_table} WHERE " + " AND ".join(conditions)
+        return self.execute_query(query, tuple(params))[0]["n"]
+
+    def resolve_brand(self, brand: str) -> str:
+        """Бренд в том написании, в каком он хранится (ввод без учета регистра)"""
+        rows = self.execute_query(
+            "SELECT name FROM brands WHERE name = ? COLLATE NOCASE LIMIT 1", (brand,))
+        return rows[0]["name"] if rows else brand
+
+    @timed(DB_SECONDS, "get_brand_facets")
+    def get_brand_facets(self, scrape_id: str) -> Dict[str, int]:
+        """Готовые счетчики товаров по брендам в сборе"""
+        rows = self.execute_query("""
+            SELECT brand, product_count FROM brand_facets
+            WHERE scrape_id = ?
+            ORDER BY product_count DESC
+        """, (scrape_id,))
+        return {row["brand"]: row["product_count"] for row in rows}
+
+    @timed(DB_SECONDS, "search_products")
+    def search_products(self, text: str, scrape_id: str, limit: int = 20) -> List[Dict]:
+        """
+        Полнотекстовый поиск по названиям (FTS5, префиксный: 'iph 15' найдет
+        'iPhone 15'), только товары, присутствующие в сборе. Сортировка по bm25
+        """
+        tokens = re.findall(r"\w+", text)
+        if not tokens:
+            raise ValueError("Пустой поисковый запрос")
+        match = " ".join(f'"{token}"*' for token in tokens)
+        return self.execute_query(f"""
+            SELECT c.id AS product_id, c.name, c.url, b.name AS brand, p.price, s.rank
+            FROM (
+                SELECT rowid, rank FROM product_search WHERE product_search MATCH ?
+            ) s
+            JOIN product_catalog c ON c.id = s.rowid
+            JOIN {self.products_table} p ON p.scrape_id = ? AND p.url = c.url
+            LEFT JOIN brands b ON b.id = c.brand_id
+            ORDER BY s.rank
+            LIMIT ?
+        """, (match, scrape_id, limit))
+
+    @timed(DB_SECONDS, "get_price_history")
+    def get_price_history(self, urls: List[str], date_from: Optional[str] = None,
+                          date_to: Optional[str] = None) -> Dict[str, List[Dict]]:
+        """
+        Временные ряды (timestamp, price, scrape_id) по списку URL товаров.
+        Полный режим читает покрывающий индекс (url, timestamp, price, scrape_id),
+        дельта-режим разворачивает интервалы price_history по сборам.
+        Только живые строки БД: точки архивированных сборов добавляет
+        scraper.archive.ArchiveReader.price_history
+        """
+        history = {url: [] for url in urls}
+        if not urls:
+            return history
+        placeholders = ", ".join("?" * len(urls))
+        params = list(urls)
+        if self.storage_mode == "delta":
+            time_column = "s.started_at"
+            query = f"""
+                SELECT c.url, s.started_at AS timestamp, h.price, s.scrape_id
+                FROM product_catalog c
+                JOIN price_history h ON h.product_id = c.id
+                JOIN scrapes s ON s.seq BETWEEN h.first_seq AND h.last_seq
+                WHERE c.url IN ({placeholders})
+            """
+        else:
+            time_column = "timestamp"
+            query = f"""
+                SELECT url, timestamp, price, scrape_id FROM products
+                WHERE url IN ({placeholders})
+            """
+        if date_from:
+            query += f" AND {time_column} >= ?"
+            params.append(date_from)
+        if date_to:
+            query += f" AND {time_column} < ?"
+            params.append(date_to)
+        query += " ORDER BY 1, 2"
+
+        for row in self.execute_query(query, tuple(params)):
+            url = row.pop("url")
+            history[url].append(row)
+        return history
+
+    def iter_products(self, scrape_id: Optional[str] = None, date_from: Optional[str] = None,
+                      date_to: Optional[str] = None, brand: Optional[str] = None,
+                      batch_size: int = 1000) -> Iterator[List[tuple]]:
+        """
+        Потоковая выгрузка товаров пачками по batch_size строк (кортежи в порядке
+        PRODUCT_COLUMNS). Курсор читается через fetchmany, поэтому память
+        не зависит от общего числа строк
+        """
+        conditions, params = self._product_filters(scrape_id, brand=brand)
+        if date_from:
+            conditions.append("timestamp >= ?")
+            params.append(date_from)
+        if date_to:
+            conditions.append("timestamp < ?")
+            params.append(date_to)
+        query = f"SELECT {', '.join(PRODUCT_COLUMNS)} FROM {self.products_table}"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+
+        with self.pool.dedicated_reader() as conn:
+            conn.row_factory = None
+            cursor = conn.execute(query, params)
+            try:
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield rows
+            finally:
+                cursor.close()
 
     def execute_query(self, query: str, params: tuple = ()) -> List[Dict]:
         """Выполняет SQL-запрос и возвращает результат"""
-        with self.get_connection() as conn:
-            conn.row_factory = sqlite3.Row
+        with self.read_connection() as conn:
             cursor = conn.cursor()
             cursor.execute(query, params)
             return [dict(row) for row in cursor.fetchall()]
\ No newline at end of file
@@ -0,0 +1,151 @@
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+from scraper.crawler import MAX_PAGES, CrawlResult, listing_pages, plan_pages
+from scraper.metrics import PAGES, inc
+from scraper.parsers import ListingParser, get_parser
+
+logger = logging.getLogger(__name__)
+
+# Ответы, после которых есть смысл повторить запрос
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                  "(KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "ru-RU,ru;q=0.9,en;q=0.8",
+}
+
+
+class AsyncRateLimiter:
+    """Не больше rate запросов в секунду на весь клиент (равномерно, без всплесков)"""
+
+    def __init__(self, rate: Optional[float]):
+        self.interval = 1 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        if not self.interval:
+            return
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            now = loop.time()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class HttpFetcher:
+    """
+    Сбор листингов без браузера: серверный HTML страниц категорий по HTTP.
+    Один асинхронный клиент с пулом keep-alive соединений, не больше
+    concurrency запросов одновременно и rate запросов в секунду, повторы
+    с экспоненциальной паузой (или по Retry-After) при сетевых ошибках,
+    429 и 5xx; пауза не длиннее max_backoff секунд. Страницы разбирает тот же ListingParser, что и в браузерном режиме
+    """
+
+    def __init__(self, concurrency: int = 8, rate: Optional[float] = 4.0, retries: int = 3,
+                 timeout: float = 20.0, backoff: float = 1.0, max_backoff: float = 60.0,
+                 headers: Optional[Dict[str, str]] = None, parser: Optional[ListingParser] = None):
+        self.concurrency = concurrency
+        self.rate = rate
+        self.retries = retries
+        self.timeout = timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.headers = headers or DEFAULT_HEADERS
+        self.parser = parser or get_parser()
+        self.requests = 0
+        self.retried = 0
+
+    def _client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            headers=self.headers,
+            timeout=self.timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=self.concurrency,
+                                max_keepalive_connections=self.concurrency),
+        )
+
+    def _retry_delay(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        # Retry-After: 3600 от перегруженного сервера не должен останавливать
+        # весь сбор на час: пауза ограничена max_backoff
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.max_backoff)
+        return min(self.backoff * 2 ** attempt, self.max_backoff)
+
+    async def fetch(self, client: httpx.AsyncClient, url: str) -> str:
+        """Текст страницы с повторами; после исчерпания попыток - исключение"""
+        for attempt in range(self.retries + 1):
+            await self._limiter.wait()
+            response = None
+            try:
+                async with self._semaphore:
+                    self.requests += 1
+                    response = await client.get(url)
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    return response.text
+                error: Exception = httpx.HTTPStatusError(
+                    f"HTTP {response.status_code}", request=response.request, response=response)
+            except httpx.TransportError as e:
+                error = e
+            if attempt == self.retries:
+                raise error
+            self.retried += 1
+            delay = self._retry_delay(attempt, response)
+            logger.warning(f"{url}: {error!r}, повтор через {delay:.1f} с")
+            await asyncio.sleep(delay)
+
+    async def _page(self, client: httpx.AsyncClient, url: str) -> Tuple[List[Dict], int]:
+        html = await self.fetch(client, url)
+        # Разбор HTML в отдельном потоке, чтобы не задерживать остальные запросы
+        return await asyncio.to_thread(self.parser.parse, html, url)
+
+    async def crawl(self, category_urls: List[str], max_pages: int = MAX_PAGES,
+                    sink: Optional[Callable[[List[Dict], tuple], None]] = None,
+                    progress: Optional[Dict[str, Dict]] = None) -> CrawlResult:
+        """Все страницы категорий: первая страница каждой категории
+        определяет остальные, ошибки отдельных страниц попадают в result.failed.
+        sink получает товары каждой собранной страницы (см. CrawlResult),
+        progress - уже собранные страницы прерванного сбора (см. plan_pages)"""
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._limiter = AsyncRateLimiter(self.rate)
+        result = CrawlResult(sink)
+        async with self._client() as client:
+            pending = {asyncio.ensure_future(self._page(client, url)): (url, category, first)
+                       for url, category, first in plan_pages(category_urls, progress, max_pages)}
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    url, category, first = pending.pop(task)
+                    try:
+                        products, last_page = task.result()
+                    except Exception as e:
+                        logger.error(f"Страница {url} пропущена: {e!r}")
+                        result.failed.append((url, repr(e)))
+                        inc(PAGES, 1, "failed")
+                        continue
+                    result.add(products, (url, category, last_page))
+                    inc(PAGES, 1, "ok")
+                    for page in listing_pages(url, last_page, max_pages) if first else []:
+                        pending[asyncio.ensure_future(self._page(client, page))] = (page, category, False)
+        logger.info(f"HTTP-сбор завершен: {result.pages} страниц, {result.collected} товаров, "
+                    f"ошибок {len(result.failed)}, запросов {self.requests} (повторов {self.retried})")
+        return result
+
+
+def fetch_categories(category_urls: List[str], concurrency: int = 8, rate: Optional[float] = 4.0,
+                     retries: int = 3, max_pages: int = MAX_PAGES,
+                     parser: Optional[ListingParser] = None,
+                     sink: Optional[Callable[[List[Dict], tuple], None]] = None,
+                     progress: Optional[Dict[str, Dict]] = None) -> CrawlResult:
+    """Синхронная обертка над HttpFetcher.crawl для flow и CLI"""
+    fetcher = HttpFetcher(concurrency=concurrency, rate=rate, retries=retries, parser=parser)
+    return asyncio.run(fetcher.crawl(category_urls, max_pages=max_pages, sink=sink, progress=progress))
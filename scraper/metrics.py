@@ -0,0 +1,133 @@
+import threading
+from functools import wraps
+from time import perf_counter
+from typing import Dict, List, Tuple
+
+from prometheus_client import CollectorRegistry, Counter, Histogram
+
+# Собственный реестр: в /metrics только метрики скрапера и API
+REGISTRY = CollectorRegistry()
+
+_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 1800)
+
+STAGE_SECONDS = Histogram(
+    "mvideo_stage_seconds", "Время этапов сбора и анализа",
+    ["stage"], buckets=_LATENCY_BUCKETS, registry=REGISTRY)
+DB_SECONDS = Histogram(
+    "mvideo_db_operation_seconds", "Время операций с БД",
+    ["operation"], buckets=_LATENCY_BUCKETS, registry=REGISTRY)
+HTTP_SECONDS = Histogram(
+    "mvideo_http_request_seconds", "Время ответа API",
+    ["endpoint", "method", "status"], buckets=_LATENCY_BUCKETS, registry=REGISTRY)
+PAGES = Counter(
+    "mvideo_pages_total", "Страницы листинга по результату", ["result"], registry=REGISTRY)
+CARDS = Counter(
+    "mvideo_cards_total", "Карточки товаров по результату разбора", ["result"], registry=REGISTRY)
+
+_enabled = True
+_children: Dict[tuple, object] = {}
+_collectors: List["StageTimings"] = []
+_collectors_lock = threading.Lock()
+
+
+def configure(enabled: bool) -> None:
+    """Включает/выключает сбор метрик. Выключенные таймеры и счетчики
+    сводятся к одной проверке флага"""
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def _child(metric, labels: tuple):
+    # metric.labels() берет блокировку на каждый вызов - дочерние метрики кэшируем
+    key = (id(metric), labels)
+    child = _children.get(key)
+    if child is None:
+        child = _children[key] = metric.labels(*labels)
+    return child
+
+
+def observe(metric: Histogram, seconds: float, *labels: str) -> None:
+    if not _enabled:
+        return
+    _child(metric, labels).observe(seconds)
+    if _collectors and metric is STAGE_SECONDS:
+        for collector in list(_collectors):
+            collector.add(labels[0], seconds)
+
+
+def inc(metric: Counter, amount: float = 1, *labels: str) -> None:
+    if _enabled and amount:
+        _child(metric, labels).inc(amount)
+
+
+class timed:
+    """
+    Таймер этапа: контекстный менеджер (with timed(STAGE_SECONDS, "parse"): ...)
+    или декоратор (@timed(DB_SECONDS, "diff_scrapes")). Время пишется
+    в гистограмму metric с метками labels
+    """
+    __slots__ = ("metric", "labels", "_started")
+
+    def __init__(self, metric: Histogram, *labels: str):
+        self.metric = metric
+        self.labels = labels
+        self._started = None
+
+    def __enter__(self):
+        if _enabled:
+            self._started = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._started is not None:
+            observe(self.metric, perf_counter() - self._started, *self.labels)
+
+    def __call__(self, func):
+        metric, labels = self.metric, self.labels
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            started = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(metric, perf_counter() - started, *labels)
+        return wrapper
+
+
+class StageTimings:
+    """
+    Суммарное время этапов (STAGE_SECONDS) за время жизни контекста - из всех
+    потоков процесса, поэтому параллельные этапы (загрузка страниц пулом
+    браузеров) суммируются. Этапы вложены: scrape включает page_load, parse и т.д.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals: Dict[str, List] = {}
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            total = self._totals.setdefault(stage, [0.0, 0])
+            total[0] += seconds
+            total[1] += 1
+
+    def totals(self) -> Dict[str, Tuple[float, int]]:
+        """{этап: (секунды, число вызовов)}"""
+        with self._lock:
+            return {stage: (seconds, calls) for stage, (seconds, calls) in self._totals.items()}
+
+    def __enter__(self):
+        with _collectors_lock:
+            _collectors.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        with _collectors_lock:
+            _collectors.remove(self)
@@ -0,0 +1,205 @@
+import logging
+import re
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from bs4 import BeautifulSoup
+
+from scraper.metrics import CARDS, STAGE_SECONDS, inc, timed
+from scraper.utils import product_key, product_url
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+except ImportError:  # lxml не установлен - остается только BeautifulSoup
+    etree = lxml_html = None
+
+logger = logging.getLogger(__name__)
+
+
+def build_product(name: str, price: str, href: Optional[str], timestamp: Optional[str] = None) -> Optional[Dict]:
+    """Словарь товара из текста названия, текста цены и ссылки карточки.
+    Общая часть всех парсеров: одинаковые проверки, цена, URL и бренд"""
+    # Конвертация цены с обработкой ошибок
+    try:
+        price_clean = int(''.join(c for c in price if c.isdigit()))
+    except ValueError:
+        logger.error(f"Некорректная цена: {price}")
+        return None
+
+    # Проверка наличия атрибута href
+    if href is None:
+        logger.warning("Отсутствует атрибут href в названии товара")
+        return None
+    # Канонический URL: один товар - один ключ, независимо от параметров ссылки
+    try:
+        url = product_url(product_key(href))
+    except ValueError:
+        logger.warning(f"Некорректная ссылка на товар: {href}")
+        return None
+
+    # Извлечение бренда (первое слово после "Смартфон" или первое слово)
+    brand = "Unknown"
+    parts = name.split()
+    if "Смартфон" in parts:
+        brand_index = parts.index("Смартфон") + 1
+        if brand_index < len(parts):
+            brand = parts[brand_index]
+    else:
+        brand = parts[0] if parts else "Unknown"
+
+    logger.debug(f"Успешно обработан товар: {name}, {brand}, {price_clean}")
+    return {
+        "name": name,
+        "price": price_clean,
+        "url": url,
+        "brand": brand,
+        "timestamp": timestamp or datetime.now().isoformat()
+    }
+
+
+def extract_product_data(card, timestamp: Optional[str] = None) -> Dict:
+    try:
+        # Проверка наличия элемента с названием
+        name_element = card.find('a', {'class': 'product-title__text'})
+        if not name_element:
+            logger.warning("Элемент названия товара не найден")
+            return None
+
+        # Проверка наличия элемента с ценой
+        price_element = card.find('span', {'class': 'price__main-value'})
+        if not price_element:
+            logger.warning("Элемент цены не найден")
+            return None
+
+        return build_product(name_element.text.strip(), price_element.text.strip(),
+                             name_element.get('href'), timestamp)
+    except Exception as e:
+        logger.error(f"Критическая ошибка: {str(e)}", exc_info=True)
+        return None
+
+
+def extract_products(soup: BeautifulSoup) -> List[Dict]:
+    """Товары со всех карточек страницы листинга (одно время на всю страницу)"""
+    products = []
+    timestamp = datetime.now().isoformat()
+    product_cards = soup.find_all('div', class_='product-cards-layout__item')
+    for card in product_cards:
+        try:
+            product = extract_product_data(card, timestamp)
+            if product:
+                products.append(product)
+        except Exception as e:
+            logger.error(f"Ошибка при обработке карточки товара: {e}")
+            continue
+    inc(CARDS, len(products), "parsed")
+    inc(CARDS, len(product_cards) - len(products), "rejected")
+    return products
+
+
+def _page_number(href: str, path: str) -> int:
+    """Номер страницы из ссылки ?page=N на тот же листинг (иначе 0)"""
+    parts = urlsplit(href)
+    page = dict(parse_qsl(parts.query)).get("page", "")
+    if page.isdigit() and (not parts.path or parts.path == path):
+        return int(page)
+    return 0
+
+
+class ListingParser:
+    """
+    Разбор страницы листинга: товары (в формате extract_product_data)
+    и номер последней страницы категории по блоку пагинации
+    (ссылки ?page=N и номера внутри элементов *pagination*)
+    """
+    name = ""
+
+    def parse(self, html: str, url: str = "") -> Tuple[List[Dict], int]:
+        raise NotImplementedError
+
+
+class SoupParser(ListingParser):
+    """BeautifulSoup + html.parser: медленный, но эталонный разбор"""
+    name = "bs4"
+
+    @timed(STAGE_SECONDS, "parse")
+    def parse(self, html: str, url: str = "") -> Tuple[List[Dict], int]:
+        soup = BeautifulSoup(html, 'html.parser')
+        path = urlsplit(url).path
+        last_page = 1
+        for link in soup.find_all("a", href=True):
+            last_page = max(last_page, _page_number(link["href"], path))
+        for element in soup.find_all(class_=re.compile("pagination")):
+            for text in element.stripped_strings:
+                if text.isdigit():
+                    last_page = max(last_page, int(text))
+        return extract_products(soup), last_page
+
+
+def _has_class(name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+class LxmlParser(ListingParser):
+    """
+    lxml (парсер на C) и заранее скомпилированные XPath: все карточки
+    выбираются одним запросом, поля карточки - относительными путями.
+    Результат совпадает с SoupParser
+    """
+    name = "lxml"
+
+    if etree is not None:
+        _cards = etree.XPath(f"//div[{_has_class('product-cards-layout__item')}]")
+        _title = etree.XPath(f".//a[{_has_class('product-title__text')}]")
+        _price = etree.XPath(f".//span[{_has_class('price__main-value')}]")
+        _links = etree.XPath("//a/@href")
+        _pagination_text = etree.XPath("//*[contains(@class, 'pagination')]//text()")
+
+    def __init__(self):
+        if etree is None:
+            raise ImportError("Для парсера lxml нужен пакет lxml")
+
+    @timed(STAGE_SECONDS, "parse")
+    def parse(self, html: str, url: str = "") -> Tuple[List[Dict], int]:
+        tree = lxml_html.document_fromstring(html)
+        timestamp = datetime.now().isoformat()
+        products = []
+        cards = self._cards(tree)
+        for card in cards:
+            titles = self._title(card)
+            if not titles:
+                logger.warning("Элемент названия товара не найден")
+                continue
+            prices = self._price(card)
+            if not prices:
+                logger.warning("Элемент цены не найден")
+                continue
+            product = build_product(titles[0].text_content().strip(), prices[0].text_content().strip(),
+                                    titles[0].get("href"), timestamp)
+            if product:
+                products.append(product)
+        inc(CARDS, len(products), "parsed")
+        inc(CARDS, len(cards) - len(products), "rejected")
+
+        path = urlsplit(url).path
+        last_page = 1
+        for href in self._links(tree):
+            last_page = max(last_page, _page_number(href, path))
+        for text in self._pagination_text(tree):
+            text = text.strip()
+            if text.isdigit():
+                last_page = max(last_page, int(text))
+        return products, last_page
+
+
+PARSERS = {"bs4": SoupParser, "lxml": LxmlParser}
+
+
+def get_parser(name: str = "auto") -> ListingParser:
+    """Парсер по имени; 'auto' - lxml, если он установлен, иначе BeautifulSoup"""
+    if name == "auto":
+        name = "lxml" if etree is not None else "bs4"
+    if name not in PARSERS:
+        raise ValueError(f"Неизвестный парсер: {name}")
+    return PARSERS[name]()
@@ -0,0 +1,186 @@
+import logging
+import sys
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from scraper.database import DatabaseManager
+from scraper.snapshots import SnapshotWriter
+from scraper.writer import WriteBehindQueue
+
+logger = logging.getLogger(__name__)
+
+# Товаров в одной пачке на запись: столько же держит в памяти конвейер
+PIPELINE_CHUNK_SIZE = 1000
+
+
+class ProductRecord:
+    """
+    Компактная запись товара вместо словаря: без __dict__, бренд интернирован
+    (на сбор их единицы), время - одна строка на весь сбор
+    """
+    __slots__ = ("name", "price", "url", "brand", "timestamp")
+
+    def __init__(self, name: str, price: int, url: str, brand: str, timestamp: str):
+        self.name = name
+        self.price = price
+        self.url = url
+        self.brand = brand
+        self.timestamp = timestamp
+
+    @classmethod
+    def from_product(cls, product: Dict, timestamp: str) -> "ProductRecord":
+        """Из словаря формата extract_product_data; время карточки заменяется временем сбора"""
+        return cls(product["name"], int(product["price"]), product["url"],
+                   sys.intern(product["brand"]), timestamp)
+
+    def as_row(self, scrape_id: str) -> tuple:
+        """Строка в формате DatabaseManager._prepare_rows"""
+        return self.name, self.price, self.url, self.brand, self.timestamp, scrape_id
+
+    def as_dict(self) -> Dict:
+        """Словарь формата extract_product_data (строка снимка)"""
+        return {"name": self.name, "price": self.price, "url": self.url,
+                "brand": self.brand, "timestamp": self.timestamp}
+
+
+def iter_records(products: Iterable[Dict], timestamp: str) -> Iterator[ProductRecord]:
+    """Товары страницы как ProductRecord; товары без обязательных полей пропускаются"""
+    for product in products:
+        try:
+            yield ProductRecord.from_product(product, timestamp)
+        except (KeyError, TypeError, ValueError):
+            logger.warning(f"Пропущен товар без обязательных полей: {product!r}")
+
+
+class ScrapeStats:
+    """
+    Статистика сбора, накапливаемая по ходу записи. as_analysis() дает
+    тот же результат, что DataAnalyzer.analyze_by_scrape_id, без чтения из БД
+    """
+    __slots__ = ("total_products", "min_price", "max_price", "price_sum", "brands")
+
+    def __init__(self):
+        self.total_products = 0
+        self.min_price: Optional[int] = None
+        self.max_price: Optional[int] = None
+        self.price_sum = 0
+        self.brands = set()
+
+    def add(self, record: ProductRecord) -> None:
+        price = record.price
+        self.total_products += 1
+        self.price_sum += price
+        if self.min_price is None or price < self.min_price:
+            self.min_price = price
+        if self.max_price is None or price > self.max_price:
+            self.max_price = price
+        self.brands.add(record.brand)
+
+    def as_analysis(self) -> Dict:
+        if not self.total_products:
+            return {}
+        return {
+            "total_products": self.total_products,
+            "min_price": self.min_price,
+            "max_price": self.max_price,
+            "avg_price": int(self.price_sum / self.total_products),
+            "unique_brands": len(self.brands),
+            "timestamp": datetime.now().isoformat()
+        }
+
+
+class ScrapePipeline:
+    """
+    Потоковая запись сбора: страницы товаров (add_page - sink для
+    crawl_categories / fetch_categories) превращаются в ProductRecord,
+    копятся пачками и уходят в WriteBehindQueue.
+    Пачка состоит из целых страниц (отправляется, как только в ней
+    набралось chunk_size товаров) и несет их отметки: отметка страницы
+    коммитится вместе с ее товарами, поэтому после сбоя теряются только
+    страницы последней неотправленной пачки (при chunk_size=1 - не больше одной).
+    В памяти одновременно не больше одной пачки конвейера и max_pending
+    пачек в очереди писателя, независимо от размера сбора.
+    С snapshot товары каждой страницы еще и дописываются в снимок (SnapshotWriter)
+    """
+
+    def __init__(self, writer: WriteBehindQueue, scrape_id: str,
+                 chunk_size: int = PIPELINE_CHUNK_SIZE, timestamp: Optional[str] = None,
+                 snapshot: Optional[SnapshotWriter] = None):
+        self.writer = writer
+        self.scrape_id = scrape_id
+        self.chunk_size = chunk_size
+        self.snapshot = snapshot
+        self.timestamp = timestamp or datetime.now().isoformat()
+        self.stats = ScrapeStats()
+        self.chunks = 0
+        self._chunk: List[ProductRecord] = []
+        self._pages: List[tuple] = []
+        self._written: Set[str] = set()
+
+    def resume(self) -> int:
+        """
+        Продолжение прерванного сбора: товары, уже записанные под scrape_id,
+        учитываются в статистике и не пишутся повторно. Возвращает их число
+        """
+        rows = self.writer.db.get_scrape_data(self.scrape_id)
+        for product in rows:
+            self.stats.add(ProductRecord.from_product(product, product["timestamp"]))
+            self._written.add(product["url"])
+        return len(rows)
+
+    def add_page(self, products: Iterable[Dict], page: tuple = ()) -> None:
+        """Товары одной страницы; page - (url, категория, число страниц категории)"""
+        count = 0
+        for record in iter_records(products, self.timestamp):
+            if self._written and record.url in self._written:
+                continue
+            self.stats.add(record)
+            self._chunk.append(record)
+            count += 1
+        if self.snapshot is not None and count:
+            self.snapshot.write_many(record.as_dict() for record in self._chunk[-count:])
+        if page:
+            self._pages.append((*page, count))
+        if len(self._chunk) >= self.chunk_size:
+            self._submit()
+
+    def _submit(self) -> None:
+        chunk, self._chunk = self._chunk, []
+        pages, self._pages = self._pages, []
+        self.writer.submit_rows([record.as_row(self.scrape_id) for record in chunk], self.scrape_id, pages)
+        self.chunks += 1
+
+    def close(self) -> Dict:
+        """Дописывает остаток, ждет коммита всех пачек и возвращает статистику сбора"""
+        if self._chunk or self._pages:
+            self._submit()
+        self.writer.flush()
+        logger.info(f"Записано {self.stats.total_products} товаров пачками по {self.chunk_size} "
+                    f"({self.chunks} пачек)")
+        return self.stats.as_analysis()
+
+
+def stream_scrape(db: DatabaseManager, scrape_id: str, crawl: Callable, chunk_size: int = 1,
+                  max_pending: int = 4, snapshot: Optional[str] = None) -> Tuple[object, Dict]:
+    """
+    Сбор с потоковой записью и продолжением после сбоя: crawl(sink=..., progress=...)
+    (crawl_categories / fetch_categories с привязанными аргументами) обходит
+    только страницы без отметок в scrape_checkpoints. snapshot - путь снимка
+    сбора (scraper.snapshots), при продолжении снимок дописывается.
+    Уже записанные товары сбора не пишутся повторно, даже если отметок
+    страниц нет (их удаляет finish_scrape завершенного сбора).
+    Возвращает (CrawlResult, статистика сбора)
+    """
+    progress = db.get_checkpoints(scrape_id)
+    done = sum(len(category["pages"]) for category in progress.values())
+    resuming = bool(progress) or db.count_products(scrape_id) > 0
+    snapshot_writer = SnapshotWriter(snapshot, append=resuming) if snapshot else nullcontext()
+    with snapshot_writer, WriteBehindQueue(db, max_pending=max_pending) as writer:
+        pipeline = ScrapePipeline(writer, scrape_id, chunk_size,
+                                  snapshot=snapshot_writer if snapshot else None)
+        if resuming:
+            logger.info(f"Продолжаем сбор {scrape_id}: собрано страниц {done}, товаров {pipeline.resume()}")
+        result = crawl(sink=pipeline.add_page, progress=progress)
+        result.resumed_pages = done
+        return result, pipeline.close()
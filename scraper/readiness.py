@@ -0,0 +1,198 @@
+import logging
+import math
+import threading
+import time
+from typing import Any, Dict, Optional, Protocol
+
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+
+logger = logging.getLogger(__name__)
+
+CARD_SELECTOR = ".product-cards-layout__item"
+
+# Одно обращение к браузеру за опрос: готовность документа, число карточек,
+# число загруженных ресурсов и высота страницы. Ресурсы считает PerformanceObserver:
+# буфер Resource Timing (getEntriesByType) по умолчанию ограничен 250 записями,
+# после чего счетчик замирает и сеть выглядит затихшей
+PAGE_STATE_JS = f"""
+const w = window;
+if (!w.__readinessResources) {{
+    w.__readinessResources = {{count: 0}};
+    try {{
+        new PerformanceObserver(list => {{ w.__readinessResources.count += list.getEntries().length; }})
+            .observe({{type: 'resource', buffered: true}});
+    }} catch (e) {{
+        w.__readinessResources.fallback = true;
+    }}
+}}
+return {{
+    ready: document.readyState,
+    cards: document.querySelectorAll('{CARD_SELECTOR}').length,
+    resources: w.__readinessResources.fallback
+        ? performance.getEntriesByType('resource').length : w.__readinessResources.count,
+    height: document.body ? document.body.scrollHeight : 0
+}};
+"""
+SCROLL_BY_VIEWPORT_JS = "window.scrollBy(0, window.innerHeight); " \
+                        "return window.scrollY + window.innerHeight >= document.body.scrollHeight;"
+
+# Предохранитель от бесконечной ленты: больше экранов за раунд не листаем
+MAX_SCROLL_STEPS = 200
+
+# Прежний алгоритм: фиксированные паузы, по ним считается сэкономленное время
+LEGACY_INITIAL_SLEEP = 30
+LEGACY_SCROLL_STEP_PX = 500
+LEGACY_SCROLL_STEP_SLEEP = 0.2
+LEGACY_ROUND_SLEEP = 5
+
+
+class PageDriver(Protocol):
+    """Минимум от драйвера, который нужен скраперу. Ему удовлетворяет
+    selenium WebDriver и тестовый драйвер на локальных HTML-файлах"""
+
+    page_source: str
+
+    def get(self, url: str) -> None: ...
+
+    def execute_script(self, script: str, *args) -> Any: ...
+
+    def quit(self) -> None: ...
+
+
+class ReadinessReport:
+    """Итог ожидания одной страницы"""
+
+    def __init__(self):
+        self.elapsed = 0.0
+        self.legacy_estimate = float(LEGACY_INITIAL_SLEEP)
+        self.cards = 0
+        self.rounds = 0
+        self.timed_out = False
+
+    @property
+    def saved(self) -> float:
+        return self.legacy_estimate - self.elapsed
+
+
+class _Stable:
+    """
+    Условие для WebDriverWait: страница загружена, карточки есть, число
+    карточек и высота не менялись quiet секунд и сеть затихла на quiet секунд.
+    Если контент стоит уже network_grace секунд, сеть не ждем: фоновые
+    запросы (аналитика, маяки) могут идти непрерывно
+    """
+
+    def __init__(self, quiet: float, min_cards: int = 1, network_grace: float = 3.0):
+        self.quiet = quiet
+        self.min_cards = min_cards
+        self.network_grace = network_grace
+        self.state: Dict = {}
+        self._content = None
+        self._resources = None
+        self.content_since = self._network_since = time.monotonic()
+
+    @property
+    def has_content(self) -> bool:
+        return self.state.get("ready") == "complete" and self.state.get("cards", 0) >= self.min_cards
+
+    def __call__(self, driver: PageDriver):
+        state = driver.execute_script(PAGE_STATE_JS) or {}
+        self.state = state
+        now = time.monotonic()
+        content = (state.get("cards"), state.get("height"))
+        if content != self._content:
+            self._content, self.content_since = content, now
+        if state.get("resources") != self._resources:
+            self._resources, self._network_since = state.get("resources"), now
+        content_quiet = now - self.content_since
+        return self.has_content and content_quiet >= self.quiet and (
+            now - self._network_since >= self.quiet or content_quiet >= self.network_grace)
+
+
+class ReadinessEngine:
+    """
+    Ожидание готовности листинга по событиям вместо фиксированных пауз:
+    после загрузки ждем стабилизации числа карточек и тишины в сети,
+    затем листаем страницу по экранам, пока подгрузка добавляет карточки.
+    Таймаут одного ожидания адаптивный: кратен скользящему среднему времени
+    готовности прошлых страниц (с учетом ожиданий, ушедших в таймаут).
+    Вся страница ограничена сроком report.legacy_estimate - временем прежних
+    фиксированных пауз за пройденные раунды, поэтому дольше них ожидание не идет
+    """
+
+    def __init__(self, quiet: float = 0.75, poll: float = 0.1, min_timeout: float = 5.0,
+                 max_timeout: float = LEGACY_INITIAL_SLEEP, timeout_factor: float = 3.0,
+                 max_rounds: int = 30, network_grace: float = 3.0):
+        self.quiet = quiet
+        self.poll = poll
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_factor = timeout_factor
+        self.max_rounds = max_rounds
+        self.network_grace = network_grace
+        self._average: Optional[float] = None
+        self._lock = threading.Lock()
+        self.pages = 0
+        self.total_saved = 0.0
+
+    @property
+    def timeout(self) -> float:
+        if self._average is None:
+            return self.max_timeout
+        return min(self.max_timeout, max(self.min_timeout, self.timeout_factor * self._average))
+
+    def _wait_stable(self, driver: PageDriver, report: ReadinessReport, deadline: float,
+                     min_cards: int = 1) -> Dict:
+        condition = _Stable(self.quiet, min_cards, self.network_grace)
+        started = time.monotonic()
+        timeout = min(self.timeout, deadline - started)
+        if timeout <= 0:
+            # Срок страницы исчерпан: только текущее состояние, без ожидания
+            condition(driver)
+            report.timed_out = True
+            return condition.state
+        try:
+            WebDriverWait(driver, timeout, poll_frequency=self.poll).until(condition)
+            self._observe(time.monotonic() - started - self.quiet)
+        except TimeoutException:
+            report.timed_out = True
+            # Таймаут тоже учитываем: если карточки успели устояться - время
+            # до их стабилизации, иначе все ожидание целиком
+            settled = condition.content_since if condition.has_content else time.monotonic()
+            self._observe(settled - started)
+        return condition.state
+
+    def _observe(self, seconds: float) -> None:
+        # Скользящее среднее времени до стабилизации (без окна тишины)
+        with self._lock:
+            seconds = max(seconds, 0.0)
+            self._average = seconds if self._average is None else 0.8 * self._average + 0.2 * seconds
+
+    def wait_ready(self, driver: PageDriver) -> ReadinessReport:
+        """Вызывается сразу после driver.get(url): ждет первую отрисовку,
+        затем листает до конца, пока появляются новые карточки"""
+        report = ReadinessReport()
+        started = time.monotonic()
+        state = self._wait_stable(driver, report, started + report.legacy_estimate)
+
+        while report.rounds < self.max_rounds:
+            report.rounds += 1
+            cards, height = state.get("cards", 0), state.get("height", 0)
+            report.legacy_estimate += (math.ceil(height / LEGACY_SCROLL_STEP_PX) * LEGACY_SCROLL_STEP_SLEEP
+                                       + LEGACY_ROUND_SLEEP)
+            # Листаем по экрану без пауз: между вызовами браузер успевает отрисовать
+            # кадр, и ленивые карточки в зоне видимости начинают грузиться
+            for _ in range(MAX_SCROLL_STEPS):
+                if driver.execute_script(SCROLL_BY_VIEWPORT_JS):
+                    break
+            state = self._wait_stable(driver, report, started + report.legacy_estimate, min_cards=cards)
+            if state.get("cards", 0) <= cards and state.get("height", 0) <= height:
+                break
+
+        report.cards = state.get("cards", 0)
+        report.elapsed = time.monotonic() - started
+        with self._lock:
+            self.pages += 1
+            self.total_saved += report.saved
+        return report
@@ -0,0 +1,203 @@
+import argparse
+import gzip
+import io
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import orjson
+
+from scraper.database import DatabaseManager
+
+try:
+    import zstandard
+except ImportError:  # zstandard не установлен - снимки сжимаются gzip
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = "data/snapshots"
+SUFFIXES = {"zstd": ".ndjson.zst", "gzip": ".ndjson.gz", None: ".ndjson"}
+REPLAY_CHUNK_SIZE = 1000
+# Строк в одной записи в поток: столько же держит в памяти write_many
+WRITE_BATCH_SIZE = 1000
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+_DUMPS_OPTIONS = orjson.OPT_APPEND_NEWLINE
+
+
+def _default(obj):
+    # orjson сам пишет datetime и всегда выдает UTF-8; байты (редкость) декодируем
+    if isinstance(obj, (bytes, bytearray)):
+        return obj.decode("utf-8", errors="replace")
+    raise TypeError(f"Type {type(obj)} not serializable")
+
+
+def resolve_compression(compression: Optional[str] = "auto") -> Optional[str]:
+    """'auto' - zstd, если установлен zstandard, иначе gzip; None - без сжатия"""
+    if compression == "auto":
+        return "zstd" if zstandard is not None else "gzip"
+    if compression not in SUFFIXES:
+        raise ValueError(f"Неподдерживаемое сжатие снимка: {compression}")
+    if compression == "zstd" and zstandard is None:
+        raise ValueError("Для сжатия zstd нужен пакет zstandard")
+    return compression
+
+
+def snapshot_path(scrape_id: str, directory: str = SNAPSHOT_DIR, compression: Optional[str] = "auto") -> Path:
+    """Путь снимка сбора: <directory>/<scrape_id>.ndjson[.zst|.gz]"""
+    return Path(directory) / f"{scrape_id}{SUFFIXES[resolve_compression(compression)]}"
+
+
+def _compression_of(path: Path) -> Optional[str]:
+    for compression, suffix in SUFFIXES.items():
+        if compression and path.name.endswith(suffix):
+            return compression
+    return None
+
+
+class SnapshotWriter:
+    """
+    Потоковая запись товаров в NDJSON через orjson: строка на товар, в памяти
+    только текущая пачка. Сжатие выбирается по расширению файла
+    (.zst - zstd, .gz - gzip). append=True дописывает в существующий снимок
+    (продолжение сбора): и gzip, и zstd читают склеенные потоки целиком
+    """
+
+    def __init__(self, path, append: bool = False, level: Optional[int] = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.compression = _compression_of(self.path)
+        self.written = 0
+        self._raw = open(self.path, "ab" if append else "wb")
+        if self.compression == "zstd":
+            if zstandard is None:
+                self._raw.close()
+                raise ValueError("Для сжатия zstd нужен пакет zstandard")
+            self._stream = zstandard.ZstdCompressor(level=level or 3).stream_writer(self._raw, closefd=False)
+        elif self.compression == "gzip":
+            self._stream = gzip.GzipFile(fileobj=self._raw, mode="wb", compresslevel=level or 6)
+        else:
+            self._stream = self._raw
+
+    def write(self, product: Dict) -> None:
+        self._stream.write(orjson.dumps(product, default=_default, option=_DUMPS_OPTIONS))
+        self.written += 1
+
+    def write_many(self, products: Iterable[Dict]) -> int:
+        """Товары пачками по WRITE_BATCH_SIZE строк на запись в поток; возвращает их число"""
+        count = 0
+        lines = []
+        for product in products:
+            lines.append(orjson.dumps(product, default=_default, option=_DUMPS_OPTIONS))
+            if len(lines) >= WRITE_BATCH_SIZE:
+                count += self._write_lines(lines)
+                lines = []
+        if lines:
+            count += self._write_lines(lines)
+        return count
+
+    def _write_lines(self, lines: List[bytes]) -> int:
+        self._stream.write(b"".join(lines))
+        self.written += len(lines)
+        return len(lines)
+
+    def close(self) -> None:
+        if self._raw.closed:
+            return
+        if self._stream is not self._raw:
+            self._stream.close()
+        self._raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def write_snapshot(products: Iterable[Dict], path, level: Optional[int] = None) -> int:
+    """Записывает товары в снимок целиком; возвращает число строк"""
+    with SnapshotWriter(path, level=level) as writer:
+        writer.write_many(products)
+    logger.info(f"Снимок {path}: {writer.written} товаров")
+    return writer.written
+
+
+def _open_stream(path: Path):
+    """Поток распакованных байтов; формат определяется по сигнатуре файла"""
+    raw = open(path, "rb")
+    magic = raw.read(4)
+    raw.seek(0)
+    if magic.startswith(_GZIP_MAGIC):
+        return gzip.GzipFile(fileobj=raw, mode="rb"), raw
+    if magic == _ZSTD_MAGIC:
+        if zstandard is None:
+            raw.close()
+            raise ValueError(f"Снимок {path} сжат zstd, нужен пакет zstandard")
+        reader = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=False)
+        return io.BufferedReader(reader), raw
+    return raw, raw
+
+
+def iter_snapshot(path) -> Iterator[Dict]:
+    """
+    Товары снимка по одному, без загрузки файла в память. Оборванная
+    последняя строка (сбой во время записи) пропускается с предупреждением
+    """
+    stream, raw = _open_stream(Path(path))
+    try:
+        for number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                yield orjson.loads(line)
+            except orjson.JSONDecodeError:
+                logger.warning(f"Снимок {path}: не удалось разобрать строку {number}, чтение остановлено")
+                return
+    except EOFError:
+        logger.warning(f"Снимок {path} обрывается: прочитано до места сбоя")
+    finally:
+        if stream is not raw:
+            stream.close()
+        raw.close()
+
+
+def replay_snapshot(db: DatabaseManager, path, scrape_id: str, chunk_size: int = REPLAY_CHUNK_SIZE) -> int:
+    """
+    Загружает снимок в БД через save_products пачками по chunk_size.
+    Повторы URL (страница, записанная в снимок дважды при продолжении
+    сбора) пропускаются. Возвращает число загруженных товаров
+    """
+    seen = set()
+    chunk: List[Dict] = []
+    loaded = 0
+    for product in iter_snapshot(path):
+        url = product.get("url")
+        if url in seen:
+            continue
+        seen.add(url)
+        chunk.append(product)
+        if len(chunk) >= chunk_size:
+            loaded += len(chunk) - db.save_products(chunk, scrape_id)
+            chunk = []
+    if chunk:
+        loaded += len(chunk) - db.save_products(chunk, scrape_id)
+    logger.info(f"Из снимка {path} загружено {loaded} товаров в сбор {scrape_id}")
+    return loaded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Загрузка снимка сбора (NDJSON) в БД")
+    parser.add_argument("path", help="файл снимка .ndjson, .ndjson.zst или .ndjson.gz")
+    parser.add_argument("--scrape-id", help="ID сбора (по умолчанию - имя файла снимка)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    snapshot = Path(args.path)
+    scrape_id = args.scrape_id or snapshot.name.split(".ndjson")[0]
+    db = DatabaseManager()
+    db.start_scrape(scrape_id)
+    replay_snapshot(db, snapshot, scrape_id)
+    db.finish_scrape(scrape_id)
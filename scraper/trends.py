@@ -0,0 +1,192 @@
+import argparse
+import logging
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from scraper.archive import ARCHIVE_DIR, ArchiveReader
+from scraper.database import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+QUANTILES = (0.1, 0.5, 0.9)
+# Сколько крупнейших падений и ростов цены хранить на каждый сбор
+TOP_MOVES = 10
+
+
+def load_history(db: DatabaseManager, start: Optional[str] = None, end: Optional[str] = None,
+                 archive_dir: str = ARCHIVE_DIR) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Вся история цен одной колоночной загрузкой (архив Parquet + живая БД).
+    Возвращает строки (seq, url, brand, price) и сборы (seq, scrape_id, started_at)
+    """
+    df = ArchiveReader(db, archive_dir).load(start, end, columns=("scrape_id", "url", "brand", "price"))
+    scrapes = pd.DataFrame(db.execute_query("SELECT seq, scrape_id, started_at FROM scrapes"),
+                           columns=["seq", "scrape_id", "started_at"])
+    df["seq"] = df["scrape_id"].map(dict(zip(scrapes["scrape_id"], scrapes["seq"])))
+    return df.drop(columns="scrape_id").dropna(subset=["seq"]), scrapes
+
+
+def compute_trends(df: pd.DataFrame, scrapes: pd.DataFrame,
+                   top_moves: int = TOP_MOVES) -> Dict[str, pd.DataFrame]:
+    """
+    Векторный расчет динамики цен за один проход по истории
+    (df: seq, url, brand, price; scrapes: seq, scrape_id, started_at):
+      brand_trends - число товаров, p10/медиана/p90 цены бренда в каждом сборе;
+      volatility - волатильность цены товара (стд. отклонение лог-доходностей
+                   между соседними наблюдениями) и число изменений;
+      moves - крупнейшие падения и росты цены между соседними сборами
+    Циклов по сборам и товарам в Python нет: строки один раз кодируются
+    целыми числами, дальше только groupby и операции numpy
+    """
+    url_codes, urls = pd.factorize(df["url"])
+    brand_codes, brands = pd.factorize(df["brand"].fillna("Unknown"))
+    # Номер сбора среди присутствующих в истории: соседние сборы отличаются на 1
+    seqs, ranks = np.unique(df["seq"].to_numpy(dtype=np.int64), return_inverse=True)
+    prices = df["price"].to_numpy(dtype=np.float64)
+
+    # Сортировка по товару, затем по сбору
+    order = np.lexsort((ranks, url_codes))
+    url_codes, brand_codes, ranks, prices = (
+        url_codes[order], brand_codes[order], ranks[order], prices[order])
+    scrape_meta = scrapes.set_index("seq").reindex(seqs)
+    scrape_ids = scrape_meta["scrape_id"].to_numpy()
+    frame = pd.DataFrame({"rank": ranks, "brand": brand_codes, "url": url_codes, "price": prices})
+
+    # Перцентили бренда по сборам
+    by_brand = frame.groupby(["rank", "brand"], sort=False)["price"]
+    brand_trends = by_brand.quantile(list(QUANTILES)).unstack()
+    brand_trends.columns = ["p10", "median", "p90"]
+    brand_trends["product_count"] = by_brand.size()
+    brand_trends = brand_trends.reset_index()
+    brand_trends["timestamp"] = scrape_meta["started_at"].to_numpy()[brand_trends["rank"]]
+    brand_trends["scrape_id"] = scrape_ids[brand_trends["rank"]]
+    brand_trends["brand"] = brands[brand_trends["brand"]]
+
+    # Предыдущее наблюдение того же товара
+    same_product = np.zeros(len(frame), dtype=bool)
+    same_product[1:] = url_codes[1:] == url_codes[:-1]
+    prev_price = np.full(len(frame), np.nan)
+    prev_price[1:] = prices[:-1]
+    prev_price[~same_product] = np.nan
+    with np.errstate(divide="ignore", invalid="ignore"):
+        frame["log_return"] = np.log(prices / prev_price)
+    frame["changed"] = same_product & (prices != prev_price)
+
+    # Волатильность и число изменений цены по товару
+    volatility = frame.groupby("url", sort=False).agg(
+        brand=("brand", "last"),
+        observations=("price", "size"),
+        min_price=("price", "min"),
+        max_price=("price", "max"),
+        mean_price=("price", "mean"),
+        volatility=("log_return", "std"),
+        changes=("changed", "sum"),
+    ).reset_index()
+    volatility["brand"] = brands[volatility["brand"]]
+    volatility["url"] = urls[volatility["url"]]
+
+    # Скачки цены только между непосредственно соседними сборами
+    moved = same_product & (prices != prev_price)
+    moved[1:] &= ranks[1:] == ranks[:-1] + 1
+    moves = pd.DataFrame({
+        "scrape_id": scrape_ids[ranks[moved]],
+        "url": urls[url_codes[moved]],
+        "prev_price": prev_price[moved],
+        "price": prices[moved],
+    })
+    moves["change"] = moves["price"] - moves["prev_price"]
+    moves["change_pct"] = moves["change"] / moves["prev_price"] * 100
+    ordered = moves.sort_values("change_pct", kind="stable")
+    moves = pd.concat([
+        ordered.groupby("scrape_id", sort=False).head(top_moves),
+        ordered.iloc[::-1].groupby("scrape_id", sort=False).head(top_moves),
+    ]).drop_duplicates(["scrape_id", "url"])
+
+    return {"brand_trends": brand_trends, "volatility": volatility, "moves": moves}
+
+
+def save_trends(db: DatabaseManager, trends: Dict[str, pd.DataFrame]) -> None:
+    """Полностью заменяет содержимое таблиц-роллапов одной транзакцией"""
+    computed_at = datetime.now().isoformat()
+    brand_trends = trends["brand_trends"]
+    volatility = trends["volatility"]
+    moves = trends["moves"]
+
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN")
+            cursor.execute("DELETE FROM brand_price_trends")
+            cursor.execute("DELETE FROM product_volatility")
+            cursor.execute("DELETE FROM price_moves")
+            cursor.executemany("""
+                INSERT INTO brand_price_trends
+                    (scrape_id, brand, timestamp, product_count, p10_price, median_price, p90_price)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, zip(
+                brand_trends["scrape_id"], brand_trends["brand"], brand_trends["timestamp"],
+                brand_trends["product_count"].tolist(), _to_int(brand_trends["p10"]),
+                _to_int(brand_trends["median"]), _to_int(brand_trends["p90"])
+            ))
+            cursor.executemany("""
+                INSERT INTO product_volatility
+                    (url, brand, observations, min_price, max_price, mean_price,
+                     volatility, changes, computed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, zip(
+                volatility["url"], volatility["brand"],
+                volatility["observations"].tolist(), _to_int(volatility["min_price"]),
+                _to_int(volatility["max_price"]), _to_int(volatility["mean_price"]),
+                volatility["volatility"].astype(object).where(volatility["volatility"].notna(), None),
+                volatility["changes"].tolist(), [computed_at] * len(volatility)
+            ))
+            cursor.executemany("""
+                INSERT INTO price_moves (scrape_id, url, prev_price, price, change, change_pct)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, zip(
+                moves["scrape_id"], moves["url"], _to_int(moves["prev_price"]),
+                _to_int(moves["price"]), _to_int(moves["change"]), moves["change_pct"].round(2).tolist()
+            ))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+
+def _to_int(series: pd.Series) -> list:
+    # Цены в БД хранятся целыми рублями, как и avg_price в analysis_results
+    return series.round().astype("int64").tolist()
+
+
+def refresh_trends(db: DatabaseManager = None, archive_dir: str = ARCHIVE_DIR) -> Dict[str, int]:
+    """Пересчитывает роллапы по всей истории. Возвращает число строк в каждом"""
+    db = db if db else DatabaseManager()
+    start = time.perf_counter()
+    df, scrapes = load_history(db, archive_dir=archive_dir)
+    if df.empty:
+        logger.info("История цен пуста, роллапы не пересчитаны")
+        return {}
+    loaded = time.perf_counter()
+    trends = compute_trends(df, scrapes)
+    computed = time.perf_counter()
+    save_trends(db, trends)
+    logger.info(f"Роллапы пересчитаны по {len(df)} строкам: загрузка {loaded - start:.1f} с, "
+                f"расчет {computed - loaded:.1f} с, запись {time.perf_counter() - computed:.1f} с")
+    return {name: len(frame) for name, frame in trends.items()}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Пересчет динамики цен: перцентили брендов, "
+                                                 "волатильность, крупнейшие скачки")
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR, help="Каталог Parquet-архива")
+    args = parser.parse_args()
+    counts = refresh_trends(archive_dir=args.archive_dir)
+    for name, count in counts.items():
+        print(f"{name}: {count} строк")
@@ -1,33 +1,38 @@
+import base64
 import json
-from pathlib import Path
-from datetime import datetime
-from typing import List, Dict
+import re
+from typing import Any, Tuple
+from urllib.parse import urlsplit
 
 
+def encode_cursor(sort_value: Any, row_id: int) -> str:
+    """Непрозрачный курсор keyset-пагинации: (значение сортировки, id) в base64"""
+    raw = json.dumps([sort_value, row_id], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
 
-def save_to_json(data: List[Dict], filename: str) -> None:
-    """
-    Сохраняет данные в JSON файл
-    :param data: Список словарей с данными о товарах
-    :param filename: Имя файла для сохранения
-    """
-    try:
 
-        Path("data").mkdir(exist_ok=True)
+def decode_cursor(cursor: str) -> Tuple[Any, int]:
+    """Разбирает курсор из encode_cursor; при порче - ValueError"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return sort_value, int(row_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Некорректный курсор: {cursor}") from e
 
 
-        filepath = Path("data") / filename
+MVIDEO_PRODUCT_URL = "https://www.mvideo.ru/products/{}"
+_PRODUCT_KEY_RE = re.compile(r"^[\w-]+$")
 
 
-        def json_serializer(obj):
-            if isinstance(obj, datetime):
-                return obj.isoformat()
-            raise TypeError(f"Type {type(obj)} not serializable")
+def product_key(url: str) -> str:
+    """Ключ товара - последний сегмент канонического URL mvideo.ru
+    (slug с артикулом), без параметров запроса"""
+    return urlsplit(url).path.rstrip('/').rsplit('/', 1)[-1]
 
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4, ensure_ascii=False, default=json_serializer)
 
-        print(f"Данные успешно сохранены в {filepath}")
-    except Exception as e:
-        print(f"Ошибка при сохранении в JSON: {e}")
-        raise
\ No newline at end of file
+def product_url(key: str) -> str:
+    """Канонический URL товара по ключу из product_key; при мусоре - ValueError"""
+    if not _PRODUCT_KEY_RE.match(key):
+        raise ValueError(f"Некорректный ключ товара: {key}")
+    return MVIDEO_PRODUCT_URL.format(key)
@@ -0,0 +1,163 @@
+import atexit
+import logging
+import queue
+import threading
+from typing import Dict, List, Optional, Sequence
+
+from scraper.database import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+
+class _Flush:
+    """Маркер в очереди: писатель выставляет событие, когда дошел до него"""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+_STOP = object()
+
+
+class WriteBehindQueue:
+    """
+    Отложенная запись в БД через единственный поток-писатель.
+    Продюсеры кладут пачки товаров и результаты анализа в очередь,
+    писатель забирает все накопившееся и коммитит одной транзакцией.
+    Очередь ограничена: при переполнении продюсер ждет (backpressure)
+    """
+
+    def __init__(self, db: DatabaseManager, max_pending: int = 64, max_group: int = 32):
+        self.db = db
+        self.max_group = max_group
+        self.committed_batches = 0
+        self.group_commits = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error: Optional[BaseException] = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit_products(self, products: List[Dict], scrape_id: str) -> int:
+        """Ставит пачку товаров в очередь. Возвращает число отброшенных
+        при проверке товаров (сама запись произойдет позже)"""
+        if not products:
+            logger.warning("Пустой список продуктов для сохранения")
+            return 0
+        rows, rejected = self.db._prepare_rows(products, scrape_id)
+        if rejected:
+            logger.warning(f"Пропущено {rejected} товаров без обязательных полей")
+        self.submit_rows(rows, scrape_id)
+        return rejected
+
+    def submit_rows(self, rows: List[tuple], scrape_id: str, pages: Sequence[tuple] = ()) -> None:
+        """Ставит в очередь уже проверенные строки (формат DatabaseManager._prepare_rows).
+        pages - отметки страниц, товары которых целиком в rows: они коммитятся
+        в той же транзакции (см. DatabaseManager._save_checkpoints)"""
+        self._put(("products", (rows, list(pages)), scrape_id))
+
+    def submit_analysis(self, analysis: Dict, scrape_id: str) -> None:
+        """Ставит результат анализа в очередь на upsert"""
+        self._put(("analysis", analysis, scrape_id))
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """Ждет, пока все поставленное до вызова будет закоммичено.
+        Пробрасывает ошибку записи, если она была"""
+        marker = _Flush()
+        self._queue.put(marker)
+        if not marker.done.wait(timeout):
+            raise TimeoutError("Очередь записи не сброшена за отведенное время")
+        self._raise_error()
+
+    def close(self) -> None:
+        """Сбрасывает очередь и останавливает поток-писатель"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+        atexit.unregister(self.close)
+        self._raise_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _put(self, item: tuple) -> None:
+        if self._closed:
+            raise RuntimeError("Очередь записи уже закрыта")
+        self._queue.put(item)
+
+    def _raise_error(self) -> None:
+        error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            group = [self._queue.get()]
+            # Забираем все, что успело накопиться, для группового коммита
+            while len(group) < self.max_group:
+                try:
+                    group.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            writes = [item for item in group if isinstance(item, tuple)]
+            try:
+                if writes:
+                    self._commit(writes)
+            except BaseException as e:
+                # Поток-писатель не должен умирать: иначе flush() и продюсеры
+                # на полной очереди ждут вечно. Ошибка уходит вызывающему
+                logger.error(f"Сбой потока записи: {e!r}")
+                self._error = e
+            finally:
+                for item in group:
+                    if isinstance(item, _Flush):
+                        item.done.set()
+                    elif item is _STOP:
+                        stop = True
+
+    def _commit(self, writes: List[tuple]) -> None:
+        try:
+            self._apply(writes)
+            self.group_commits += 1
+        except Exception as e:
+            # Одна плохая пачка (ошибка SQLite или строка не того формата)
+            # не должна терять соседние: пишем по одной
+            logger.error(f"Ошибка группового коммита ({len(writes)} пачек), пишем по одной: {e!r}")
+            for write in writes:
+                try:
+                    self._apply([write])
+                except Exception as item_error:
+                    logger.error(f"Пачка {write[0]} для {write[2]} не записана: {item_error!r}")
+                    self._error = item_error
+
+    def _apply(self, writes: List[tuple]) -> None:
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("BEGIN")
+                for kind, payload, scrape_id in writes:
+                    if kind == "products":
+                        rows, pages = payload
+                        if rows:
+                            self.db._write_rows(cursor, rows, scrape_id)
+                        if pages:
+                            self.db._save_checkpoints(cursor, scrape_id, pages)
+                    else:
+                        self.db._upsert_analysis(cursor, payload, scrape_id)
+                conn.commit()
+                self.committed_batches += len(writes)
+            except BaseException:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+        for scrape_id in {write[2] for write in writes if write[0] == "products"}:
+            self.db._notify_commit(scrape_id)